@@ -1,12 +1,82 @@
 """Entry point for python -m marviz."""
 
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
 from .app import MarvizApp
+from .config import MarvizConfig
+from .runtime import AgentRuntime, RuntimeClient, run_daemon, socket_is_live
+from .services.diagnostics import Diagnostics
 
 
 def main() -> None:
-    app = MarvizApp()
+    parser = argparse.ArgumentParser(prog="marviz")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="enable loop-lag watchdog and sampling profiler (same as MARVIZ_PROFILE=1)",
+    )
+    parser.add_argument(
+        "--socket", type=Path, help="daemon socket (default: MARVIZ_SOCKET or $XDG_RUNTIME_DIR/marviz.sock)"
+    )
+    parser.add_argument(
+        "--local", action="store_true", help="run agents in this process even if a daemon is running"
+    )
+    commands = parser.add_subparsers(dest="command")
+    daemon = commands.add_parser("daemon", help="run the agent runtime in the background for TUI clients")
+    daemon.add_argument("--stop", action="store_true", help="ask a running daemon to exit")
+    args = parser.parse_args()
+    if args.profile:
+        os.environ["MARVIZ_PROFILE"] = "1"
+
+    config = MarvizConfig.load()
+    socket_path = (args.socket or config.socket_path).expanduser()
+
+    if args.command == "daemon":
+        if args.stop:
+            sys.exit(asyncio.run(_stop_daemon(socket_path)))
+        if socket_is_live(socket_path):
+            sys.exit(f"a daemon is already listening on {socket_path}")
+        asyncio.run(_run_daemon(config, socket_path))
+        return
+
+    # Attach to a running daemon unless told otherwise
+    attach = not args.local and socket_is_live(socket_path)
+    app = MarvizApp(socket_path=socket_path if attach else None)
     app.run()
 
 
+async def _run_daemon(config: MarvizConfig, socket_path: Path) -> None:
+    diagnostics = None
+    if config.profile:
+        diagnostics = Diagnostics(
+            config.profile_dir,
+            lag_threshold=config.lag_threshold_ms / 1000,
+            sample_interval=config.profile_interval_ms / 1000,
+            trace_memory=config.trace_memory,
+        )
+        diagnostics.start()
+    print(f"marviz daemon listening on {socket_path}", flush=True)
+    try:
+        await run_daemon(AgentRuntime(config), socket_path)
+    finally:
+        if diagnostics is not None:
+            diagnostics.stop()
+
+
+async def _stop_daemon(socket_path: Path) -> int:
+    if not socket_is_live(socket_path):
+        print(f"no daemon listening on {socket_path}", file=sys.stderr)
+        return 1
+    client = RuntimeClient(socket_path)
+    await client.connect()
+    await client.shutdown()
+    await client.stop()
+    return 0
+
+
 if __name__ == "__main__":
     main()
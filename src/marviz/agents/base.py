@@ -1,56 +1,83 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import time
 from collections.abc import AsyncIterator
+from contextlib import aclosing
 
 from ..providers.base import BaseProvider
+from ..services.metrics import MetricsRecorder
+from .history import FILE_READ_TOOLS, FILE_WRITE_TOOLS, FilePayloadTracker
+from .streaming_args import SinkFactory
 from .types import AccumulatedToolCall, StreamChunk, ToolCallAccumulator
 
+# Sent after a cut-off answer when the provider cannot continue an assistant message itself
+CONTINUE_PROMPT = (
+    "Your previous response was cut off by a network error. Continue it exactly where it "
+    "stopped, without repeating anything or adding any preamble."
+)
+
 
 class BaseAgent:
     """Base agent with conversation history and streaming."""
 
+    role = "agent"  # metrics label
+    default_tools: list[dict] | None = None  # used when send() gets tools=None
+    stream_resumes = 2  # times a stream that fails after producing text is continued
+
     def __init__(self, provider: BaseProvider, system_prompt: str) -> None:
         self.provider = provider
+        self.system_prompt = system_prompt
         self.history: list[dict] = [{"role": "system", "content": system_prompt}]
         self.pending_tool_calls: list[AccumulatedToolCall] = []
+        self.file_payloads = FilePayloadTracker(self.history)
+        # tool_call_id -> (call, index of its assistant message, index in its tool_calls)
+        self._tool_calls_by_id: dict[str, tuple[AccumulatedToolCall, int, int]] = {}
+        self.metrics: MetricsRecorder | None = None
+        # tool name -> (argument, sink factory) for arguments streamed to a sink
+        self.streamed_arguments: dict[str, tuple[str, SinkFactory]] = {}
+        self._stop_reason: str | None = None
+        self._deadline: tuple[float, str] | None = None  # (time.monotonic(), reason)
+
+    @property
+    def worker_label(self) -> str:
+        """Worker name for metrics labels; empty for non-workers."""
+        return ""
+
+    def set_system_context(self, context: str) -> None:
+        """Append extra context (e.g. a repo map) to the system prompt."""
+        content = f"{self.system_prompt}\n\n{context}" if context else self.system_prompt
+        self.history[0] = {"role": "system", "content": content}
+
+    @property
+    def stopped(self) -> str | None:
+        """Why the agent was stopped (see ``stop``), until the next ``send``."""
+        return self._stop_reason
 
-    async def send(
+    def stop(self, reason: str, at: float | None = None) -> None:
+        """End streaming cleanly, now or once ``time.monotonic()`` reaches ``at``.
+
+        The turn ends after the chunk being handled; its text so far is kept
+        in history with a ``[truncated: reason]`` label, and any tool call
+        still streaming is dropped. Later turns stop at once until ``send``.
+        """
+        if at is None:
+            self._stop_reason = reason
+        else:
+            self._deadline = (at, reason)
+
+    def send(
         self,
         user_input: str,
         tools: list[dict] | None = None,
     ) -> AsyncIterator[StreamChunk]:
         """Send user input and stream back chunks. Updates history."""
+        self._stop_reason = None
+        self._deadline = None
+        self.file_payloads.start_turn()
         self.history.append({"role": "user", "content": user_input})
-        self.pending_tool_calls.clear()
-
-        full_response = ""
-        accumulator = ToolCallAccumulator()
-
-        async for chunk in self.provider.stream(self.history, tools=tools):
-            if chunk.type == "text":
-                full_response += chunk.content
-            elif chunk.type == "tool_call":
-                accumulator.feed(chunk)
-            yield chunk
-
-        # Build assistant message for history
-        if full_response or accumulator._calls:
-            msg: dict = {"role": "assistant", "content": full_response or None}
-            accumulated = accumulator.finalize()
-            if accumulated:
-                msg["tool_calls"] = [
-                    {
-                        "id": tc.id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.name,
-                            "arguments": __import__("json").dumps(tc.arguments),
-                        },
-                    }
-                    for tc in accumulated
-                ]
-                self.pending_tool_calls = accumulated
-            self.history.append(msg)
+        return self._stream_turn(tools if tools is not None else self.default_tools)
 
     def add_tool_result(self, tool_call_id: str, result: str) -> None:
         """Inject a tool result into the conversation history."""
@@ -61,24 +88,96 @@ class BaseAgent:
                 "content": result,
             }
         )
+        entry = self._tool_calls_by_id.pop(tool_call_id, None)
+        if entry is None:
+            return
+        tc, msg_index, call_index = entry
+        path = tc.arguments.get("path")
+        if not path:
+            return
+        if tc.name in FILE_READ_TOOLS:
+            self.file_payloads.track_read(len(self.history) - 1, path, result)
+        elif tc.name in FILE_WRITE_TOOLS and tc.sink is not None and not result.startswith("Error"):
+            # Streamed content was committed to disk; history only holds a reference to it
+            self.file_payloads.track_staged_write(
+                msg_index, call_index, path, tc.sink.hexdigest(), tc.sink.size
+            )
 
-    async def continue_after_tools(
+    def cancel_tool_calls(self, result: str) -> int:
+        """Answer every tool call still waiting for a result with ``result``; returns how many."""
+        waiting = list(self._tool_calls_by_id)
+        for tool_call_id in waiting:
+            self.add_tool_result(tool_call_id, result)
+        return len(waiting)
+
+    def continue_after_tools(
         self,
         tools: list[dict] | None = None,
     ) -> AsyncIterator[StreamChunk]:
         """Resume LLM generation after tool results have been added."""
+        return self._stream_turn(tools if tools is not None else self.default_tools)
+
+    async def _stream_turn(self, tools: list[dict] | None) -> AsyncIterator[StreamChunk]:
         self.pending_tool_calls.clear()
-        full_response = ""
-        accumulator = ToolCallAccumulator()
+        parts: list[str] = []
+        accumulator = ToolCallAccumulator(self.streamed_arguments)
 
-        async for chunk in self.provider.stream(self.history, tools=tools):
-            if chunk.type == "text":
-                full_response += chunk.content
-            elif chunk.type == "tool_call":
-                accumulator.feed(chunk)
-            yield chunk
+        timer = None
+        if self.metrics is not None:
+            model = getattr(self.provider, "model", "")
+            timer = self.metrics.start(self.role, self.worker_label, model)
+        on_chunk = timer.on_chunk if timer is not None else None
+        add_text = parts.append
+        completed = False
+        messages = self.history
+        resumes = 0
+        try:
+            while self._stop_reason is None:
+                interrupted: StreamChunk | None = None
+                stream = self.provider.stream(messages, tools=tools)
+                if self._deadline is not None:
+                    stream = self._until_deadline(stream, *self._deadline)
+                async with aclosing(stream):
+                    async for chunk in stream:
+                        if on_chunk is not None:
+                            on_chunk(chunk)
+                        if chunk.type == "text":
+                            add_text(chunk.content)
+                        elif chunk.type == "tool_call":
+                            accumulator.feed(chunk)
+                        elif (
+                            chunk.type == "error"
+                            and parts
+                            and not accumulator.has_calls
+                            and resumes < self.stream_resumes
+                        ):
+                            interrupted = chunk
+                            continue
+                        yield chunk
+                        if self._stop_reason is not None:
+                            break
+                if interrupted is None or self._stop_reason is not None:
+                    break
+                resumes += 1
+                yield StreamChunk(
+                    type="notice",
+                    content=f"{interrupted.content}; resuming ({resumes}/{self.stream_resumes})",
+                )
+                messages = self._continuation(parts)
+            if self._stop_reason is not None:
+                note = f"\n\n[truncated: {self._stop_reason}]"
+                add_text(note)
+                yield StreamChunk(type="text", content=note)
+            completed = True
+        finally:
+            if timer is not None:
+                timer.finish(cancelled=not completed)
+            if not completed or self._stop_reason is not None:
+                accumulator.discard()
 
-        if full_response or accumulator._calls:
+        # Build assistant message for history
+        full_response = "".join(parts)
+        if full_response or accumulator.has_calls:
             msg: dict = {"role": "assistant", "content": full_response or None}
             accumulated = accumulator.finalize()
             if accumulated:
@@ -88,10 +187,56 @@ class BaseAgent:
                         "type": "function",
                         "function": {
                             "name": tc.name,
-                            "arguments": __import__("json").dumps(tc.arguments),
+                            "arguments": json.dumps(tc.arguments),
                         },
                     }
                     for tc in accumulated
                 ]
                 self.pending_tool_calls = accumulated
             self.history.append(msg)
+            self._track_tool_calls(accumulated)
+
+    async def _until_deadline(
+        self, chunks: AsyncIterator[StreamChunk], at: float, reason: str
+    ) -> AsyncIterator[StreamChunk]:
+        """Pass ``chunks`` through until ``time.monotonic()`` reaches ``at``, then stop."""
+        async with aclosing(chunks):
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(anext(chunks), at - time.monotonic())
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    self._stop_reason = reason
+                    return
+                yield chunk
+
+    def _continuation(self, parts: list[str]) -> list[dict]:
+        """Messages asking the model to carry on from the partial answer in ``parts``.
+
+        With prefill the partial answer is the last message and the model
+        continues it token for token; trailing whitespace is dropped since
+        APIs reject it there (and ``parts`` is trimmed to match, so the
+        stitched answer has no doubled gap). Otherwise it is followed by an
+        explicit request to continue.
+        """
+        partial = "".join(parts)
+        if self.provider.supports_prefill:
+            partial = partial.rstrip()
+            parts[:] = [partial]
+            return [*self.history, {"role": "assistant", "content": partial}]
+        return [
+            *self.history,
+            {"role": "assistant", "content": partial},
+            {"role": "user", "content": CONTINUE_PROMPT},
+        ]
+
+    def _track_tool_calls(self, calls: list[AccumulatedToolCall]) -> None:
+        msg_index = len(self.history) - 1
+        for call_index, tc in enumerate(calls):
+            self._tool_calls_by_id[tc.id] = (tc, msg_index, call_index)
+            # Content streamed to a sink is tracked once it is committed (add_tool_result)
+            if tc.name in FILE_WRITE_TOOLS and tc.arguments.get("path") and not tc.sink:
+                self.file_payloads.track_write(
+                    msg_index, call_index, tc.arguments["path"], tc.arguments.get("content", "")
+                )
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+# Tools whose result is the content of the file at arguments["path"]
+FILE_READ_TOOLS = {"read_file"}
+# Tools whose arguments["content"] is the full new content of arguments["path"]
+FILE_WRITE_TOOLS = {"write_file"}
+
+
+@dataclass
+class _Payload:
+    """A file's content at one place in history."""
+
+    sha: str
+    size: int
+    msg_index: int
+    call_index: int | None  # index into tool_calls for writes, None for read results
+    full: bool = True  # False for a streamed write, whose content is already a reference
+
+
+def _size_kb(size: int) -> str:
+    return f"{size / 1024:.1f} KB"
+
+
+def _normalize(path: str) -> str:
+    try:
+        return str(Path(path).expanduser().resolve())
+    except (OSError, RuntimeError):
+        return path
+
+
+class FilePayloadTracker:
+    """Keeps only the latest full copy of each file in a conversation history.
+
+    Every read result and write_file argument is hashed as it enters
+    history and becomes the latest payload of its path. The copy it
+    supersedes is collapsed to a short reference to the message holding
+    the latest one. Copies after the latest user message are collapsed at
+    once; earlier ones are in the provider's cached prompt prefix (see
+    ``with_cache_breakpoints``), so they wait for ``start_turn`` and the
+    prefix changes at most once per user message.
+    """
+
+    def __init__(self, history: list[dict]) -> None:
+        self.history = history
+        self._latest: dict[str, _Payload] = {}
+        self._superseded: list[tuple[_Payload, str, _Payload]] = []  # (old, path, latest)
+        self._breakpoint = 0  # index of the latest user message
+        self.saved_chars = 0
+
+    def start_turn(self) -> None:
+        """Collapse every superseded copy; call before appending a new user message."""
+        for old, path, latest in self._superseded:
+            self._collapse(old, path, latest)
+        self._superseded.clear()
+        self._breakpoint = len(self.history)
+
+    def track_read(self, msg_index: int, path: str, content: str) -> None:
+        if content.startswith("Error"):
+            return
+        data = content.encode("utf-8")
+        sha = hashlib.sha256(data).hexdigest()
+        self._track(path, _Payload(sha, len(data), msg_index, None))
+
+    def track_write(self, msg_index: int, call_index: int, path: str, content: str) -> None:
+        data = content.encode("utf-8")
+        sha = hashlib.sha256(data).hexdigest()
+        self._track(path, _Payload(sha, len(data), msg_index, call_index))
+
+    def track_staged_write(
+        self, msg_index: int, call_index: int, path: str, sha: str, size: int
+    ) -> None:
+        """Track a committed write whose content was streamed to disk, not kept in history."""
+        self._track(path, _Payload(sha, size, msg_index, call_index, full=False))
+
+    def _track(self, path: str, new: _Payload) -> None:
+        key = _normalize(path)
+        old = self._latest.get(key)
+        if old is not None and old.full and not new.full and old.sha == new.sha:
+            return  # the earlier copy is still the latest content in full
+        self._latest[key] = new
+        if old is None or not old.full:
+            return
+        if old.msg_index > self._breakpoint:
+            self._collapse(old, path, new)
+        else:
+            self._superseded.append((old, path, new))
+
+    def _collapse(self, old: _Payload, path: str, latest: _Payload) -> None:
+        sha = old.sha[:12]
+        if old.sha == latest.sha:
+            note = f"unchanged, full copy in message {latest.msg_index}"
+        else:
+            note = f"superseded, see message {latest.msg_index}"
+        msg = self.history[old.msg_index]
+        if old.call_index is None:
+            placeholder = f"[{path}: {_size_kb(old.size)}, sha {sha}, {note}]"
+            self.saved_chars += len(msg["content"]) - len(placeholder)
+            msg["content"] = placeholder
+            return
+        call = msg["tool_calls"][old.call_index]
+        args = json.loads(call["function"]["arguments"])
+        before = len(args.get("content", ""))
+        args["content"] = f"[written, {_size_kb(old.size)}, sha {sha}, {note}]"
+        call["function"]["arguments"] = json.dumps(args)
+        self.saved_chars += before - len(args["content"])
+
+
+# Tool results of earlier tasks shorter than this are kept when a history is compacted
+_KEEP_RESULT_CHARS = 300
+
+
+def history_chars(history: list[dict]) -> int:
+    """Characters of message content and tool-call arguments in a history."""
+    total = 0
+    for msg in history:
+        total += len(msg.get("content") or "")
+        for call in msg.get("tool_calls") or ():
+            total += len(call["function"]["arguments"])
+    return total
+
+
+def compact_history(history: list[dict], max_chars: int) -> int:
+    """Shrink a history in place to about ``max_chars``; returns the characters removed.
+
+    Only messages before the latest user message are touched. Tool results
+    are elided first, oldest first, leaving each task and its answer; if
+    that is not enough, whole exchanges (a user message up to the next
+    one) are dropped from the start, keeping the system prompt.
+    """
+    size = history_chars(history)
+    before = size
+    if size <= max_chars:
+        return 0
+    users = [i for i, msg in enumerate(history) if msg["role"] == "user"]
+    if len(users) < 2:
+        return 0
+    for msg in history[: users[-1]]:
+        if size <= max_chars:
+            break
+        content = msg.get("content") or ""
+        if msg["role"] == "tool" and len(content) > _KEEP_RESULT_CHARS:
+            placeholder = f"[tool output of an earlier task elided, {len(content):,} chars]"
+            msg["content"] = placeholder
+            size -= len(content) - len(placeholder)
+    while size > max_chars and len(users) > 1:
+        start, end = users[0], users[1]
+        size -= history_chars(history[start:end])
+        del history[start:end]
+        users = [i - (end - start) for i in users[1:]]
+    return before - size
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from collections.abc import AsyncIterator
+from collections.abc import AsyncIterator, Callable
 
 from ..providers.base import BaseProvider
 from .base import BaseAgent
@@ -13,7 +13,14 @@ DELEGATE_TASK_TOOL = {
         "description": (
             "Delegate a self-contained sub-task to a worker agent. "
             "Each worker runs independently and streams its output to a dedicated panel. "
+            "Workers can read, search and inspect git history but not write files or run "
+            "commands; do those yourself. "
             "Use this when the user's request can be split into parallel sub-tasks. "
+            "For multi-stage work, give tasks a task_id and list the task_ids a task depends_on: "
+            "it starts as soon as those finish and receives their results. "
+            "Only results of tasks nothing depends on are returned to you. "
+            "A persistent worker keeps its conversation: a later delegate_task with the same "
+            "worker_name continues it with what it already read and concluded. "
             "Maximum 3 concurrent workers."
         ),
         "parameters": {
@@ -25,7 +32,44 @@ DELEGATE_TASK_TOOL = {
                 },
                 "worker_name": {
                     "type": "string",
-                    "description": "Short label for the worker panel (e.g. 'Analyzer', 'Coder').",
+                    "description": (
+                        "Short label for the worker panel (e.g. 'Analyzer', 'Coder'). "
+                        "Naming an existing persistent worker sends the task to it."
+                    ),
+                },
+                "persistent": {
+                    "type": "boolean",
+                    "description": (
+                        "Keep this worker's context after it answers, for follow-up tasks "
+                        "under the same worker_name. Still write self-contained tasks: an "
+                        "idle worker may have been dropped to save memory."
+                    ),
+                },
+                "task_id": {
+                    "type": "string",
+                    "description": "Name other tasks in this batch can depend on (e.g. 'analyze').",
+                },
+                "depends_on": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "task_ids of tasks in this batch whose results this task needs.",
+                },
+                "budget": {
+                    "type": "object",
+                    "description": (
+                        "Optional limits for this worker, within the configured ones. "
+                        "A worker that reaches one stops and returns its partial output, "
+                        "marked as truncated."
+                    ),
+                    "properties": {
+                        "max_tokens": {"type": "integer", "description": "Output tokens."},
+                        "max_seconds": {"type": "number", "description": "Wall-clock seconds."},
+                        "max_tool_steps": {
+                            "type": "integer",
+                            "description": "Rounds of tool calls.",
+                        },
+                        "max_dollars": {"type": "number", "description": "Spend in US dollars."},
+                    },
                 },
             },
             "required": ["task", "worker_name"],
@@ -39,7 +83,8 @@ WRITE_FILE_TOOL = {
         "name": "write_file",
         "description": (
             "Write content to a file. Creates the file and parent directories if they don't exist. "
-            "Overwrites the file if it already exists."
+            "Overwrites the file if it already exists. "
+            "To change part of an existing file, use edit_file instead."
         ),
         "parameters": {
             "type": "object",
@@ -58,6 +103,52 @@ WRITE_FILE_TOOL = {
     },
 }
 
+EDIT_FILE_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "edit_file",
+        "description": (
+            "Edit part of an existing file without resending it. Provide either 'edits' "
+            "(search/replace blocks) or 'diff' (a unified diff). Each search block must match "
+            "whole lines of the file; include enough surrounding lines to be unique. "
+            "Small whitespace or indentation differences are tolerated. "
+            "All edits are applied atomically, or none are."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "path": {
+                    "type": "string",
+                    "description": "File path (relative to working directory or absolute).",
+                },
+                "edits": {
+                    "type": "array",
+                    "description": "Search/replace blocks, applied together.",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "search": {
+                                "type": "string",
+                                "description": "Exact existing lines to replace.",
+                            },
+                            "replace": {
+                                "type": "string",
+                                "description": "New lines (empty string deletes the block).",
+                            },
+                        },
+                        "required": ["search", "replace"],
+                    },
+                },
+                "diff": {
+                    "type": "string",
+                    "description": "Unified diff with @@ hunk headers, as an alternative to edits.",
+                },
+            },
+            "required": ["path"],
+        },
+    },
+}
+
 READ_FILE_TOOL = {
     "type": "function",
     "function": {
@@ -76,12 +167,270 @@ READ_FILE_TOOL = {
     },
 }
 
-TOOLS = [DELEGATE_TASK_TOOL, WRITE_FILE_TOOL, READ_FILE_TOOL]
+READ_FILES_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "read_files",
+        "description": (
+            "Read several files in one call. Accepts paths and globs; the combined output "
+            "shares one size budget, so small files come back whole and large ones are cut. "
+            "Binary, duplicate and ignored files (e.g. node_modules, .git) are skipped."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "paths": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": (
+                        "File paths or globs such as 'src/**/*.py', most important first; "
+                        "files that do not fit the budget are dropped from the end."
+                    ),
+                },
+            },
+            "required": ["paths"],
+        },
+    },
+}
+
+RUN_COMMAND_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "run_command",
+        "description": (
+            "Run a shell command (tests, builds, linters, scripts) in the working directory "
+            "and get its exit code with the start and end of its output. "
+            "Commands are non-interactive: there is no stdin, and only a few environment "
+            "variables (PATH, HOME, locale, toolchains) are passed through."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "command": {
+                    "type": "string",
+                    "description": (
+                        "Command line for /bin/sh, e.g. 'python -m pytest -q tests/test_x.py'."
+                    ),
+                },
+                "timeout": {
+                    "type": "number",
+                    "description": (
+                        "Seconds before the command is killed (capped by the configured limit)."
+                    ),
+                },
+            },
+            "required": ["command"],
+        },
+    },
+}
+
+SEARCH_CODE_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "search_code",
+        "description": (
+            "Search the workspace for a literal string or regular expression. "
+            "Returns matching lines with surrounding context as 'path:line:text'. "
+            "Much cheaper than reading whole files to find where something is defined or used."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Text or regex to search for.",
+                },
+                "regex": {
+                    "type": "boolean",
+                    "description": "Treat query as a Python regular expression (default false).",
+                },
+                "glob": {
+                    "type": "string",
+                    "description": "Only search paths matching this glob (e.g. 'src/*.py').",
+                },
+                "ignore_case": {
+                    "type": "boolean",
+                    "description": "Case-insensitive matching (default false).",
+                },
+                "context": {
+                    "type": "integer",
+                    "description": "Lines of context around each match (default 2).",
+                },
+            },
+            "required": ["query"],
+        },
+    },
+}
+
+FIND_SYMBOL_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "find_symbol",
+        "description": (
+            "Look up class, function and method definitions by name. "
+            "Returns 'path:start-end kind signature' so you can read_file only the lines you need."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "name": {
+                    "type": "string",
+                    "description": (
+                        "Symbol name, 'Class.method', or a glob such as '*Agent.send'. "
+                        "Case-insensitive; prefix and substring matches are included."
+                    ),
+                },
+                "kind": {
+                    "type": "string",
+                    "description": "Optional kind filter: class, function, method, struct, type, ...",
+                },
+            },
+            "required": ["name"],
+        },
+    },
+}
+
+RETRIEVE_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "retrieve",
+        "description": (
+            "Find the workspace code most relevant to a natural-language question or keywords "
+            "(BM25 over ~40-line chunks). Returns 'path:start-end' headers with the chunk text. "
+            "Use this when you don't know which file or symbol to look at."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Question or keywords, e.g. 'where are tool results added to history'.",
+                },
+                "k": {
+                    "type": "integer",
+                    "description": "Number of chunks to return (default 5).",
+                },
+                "glob": {
+                    "type": "string",
+                    "description": "Optional path glob to restrict results, e.g. 'src/**/*.py'.",
+                },
+            },
+            "required": ["query"],
+        },
+    },
+}
+
+GIT_STATUS_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "git_status",
+        "description": (
+            "Show the current branch and which files are modified, staged or untracked "
+            "(git status --porcelain)."
+        ),
+        "parameters": {"type": "object", "properties": {}},
+    },
+}
+
+GIT_DIFF_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "git_diff",
+        "description": (
+            "Show uncommitted changes as a unified diff: only the changed lines with a little "
+            "context. Use this to review recent work instead of re-reading whole files."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "paths": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Limit the diff to these files or directories.",
+                },
+                "staged": {
+                    "type": "boolean",
+                    "description": "Show staged changes (index vs HEAD) instead of unstaged ones.",
+                },
+                "ref": {
+                    "type": "string",
+                    "description": "Compare the working tree with this commit, e.g. 'HEAD~3' or 'main'.",
+                },
+                "context": {
+                    "type": "integer",
+                    "description": "Context lines around each change (default 3).",
+                },
+                "max_hunks": {
+                    "type": "integer",
+                    "description": "Hunks shown per file before the rest are summarized (default 20).",
+                },
+            },
+        },
+    },
+}
+
+GIT_LOG_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "git_log",
+        "description": "List recent commits (hash, date, author, subject), optionally for one path.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "path": {"type": "string", "description": "Only commits touching this path."},
+                "max_count": {
+                    "type": "integer",
+                    "description": "Number of commits (default 20).",
+                },
+                "ref": {"type": "string", "description": "Start from this ref instead of HEAD."},
+            },
+        },
+    },
+}
+
+GIT_BLAME_RANGE_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "git_blame_range",
+        "description": "Show which commit last changed each line in a range of a file.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "path": {"type": "string", "description": "File path."},
+                "start_line": {"type": "integer", "description": "First line (1-based)."},
+                "end_line": {
+                    "type": "integer",
+                    "description": "Last line, inclusive (at most 400 lines are shown).",
+                },
+            },
+            "required": ["path", "start_line", "end_line"],
+        },
+    },
+}
+
+TOOLS = [
+    DELEGATE_TASK_TOOL,
+    WRITE_FILE_TOOL,
+    EDIT_FILE_TOOL,
+    READ_FILE_TOOL,
+    READ_FILES_TOOL,
+    SEARCH_CODE_TOOL,
+    FIND_SYMBOL_TOOL,
+    RETRIEVE_TOOL,
+    GIT_STATUS_TOOL,
+    GIT_DIFF_TOOL,
+    GIT_LOG_TOOL,
+    GIT_BLAME_RANGE_TOOL,
+    RUN_COMMAND_TOOL,
+]
 
 
 class MainAgent(BaseAgent):
     """Primary conversational agent for Marviz."""
 
+    role = "main"
+    default_tools = TOOLS
+
     SYSTEM_PROMPT = (
         "You are Marviz, an AI development assistant running inside a "
         "terminal environment. Be concise, helpful, and precise. "
@@ -91,32 +440,55 @@ class MainAgent(BaseAgent):
         "Delegate independent sub-tasks to worker agents (up to 3 parallel). "
         "Each worker executes in parallel and reports back. "
         "After all workers finish, summarize their combined results. "
-        "Only delegate when the request genuinely benefits from parallel work.\n\n"
+        "Only delegate when the request genuinely benefits from parallel work. "
+        "For staged work (e.g. analyze, then implement, then review), issue all stages at once "
+        "and chain them with task_id/depends_on instead of waiting between stages. "
+        "Give a quick lookup a small budget; a result marked [truncated: ...] hit its budget. "
+        "Make a worker persistent when you expect follow-up questions in the same area, "
+        "and send those follow-ups to it by worker_name.\n\n"
         "### write_file\n"
         "Write content to a file. Use this to create or overwrite files. "
         "You can combine with delegate_task: delegate sub-tasks first, "
         "then write the combined results to a file.\n\n"
+        "### edit_file\n"
+        "Change part of an existing file with search/replace blocks or a unified diff. "
+        "Always prefer this over write_file for modifying existing files: "
+        "only the changed lines need to be sent.\n\n"
         "### read_file\n"
         "Read the content of a file. Use this to inspect existing files.\n\n"
+        "### read_files\n"
+        "Read several files or globs at once within one size budget. "
+        "Prefer it over repeated read_file calls when you need more than one file.\n\n"
+        "### search_code\n"
+        "Search the workspace by literal or regex, optionally limited by a path glob. "
+        "Prefer this over read_file when looking for where something is defined or used.\n\n"
+        "### find_symbol\n"
+        "Look up where a class or function is defined, with its signature and line range.\n\n"
+        "### retrieve\n"
+        "Rank workspace code chunks by relevance to a question. "
+        "Use it before read_file when you are unsure where something lives.\n\n"
+        "### git_status, git_diff, git_log, git_blame_range\n"
+        "Inspect the repository: what changed, recent commits, who last touched some lines. "
+        "To review or fix recent work, start with git_diff rather than reading whole files.\n\n"
+        "### run_command\n"
+        "Run tests, builds or linters and see the exit code and the start and end of the output. "
+        "After changing code, run the relevant tests to check it; "
+        "narrow commands (one test file, -q) keep the output short.\n\n"
         "For simple questions, answer directly without using any tools."
     )
 
     def __init__(self, provider: BaseProvider) -> None:
         super().__init__(provider, self.SYSTEM_PROMPT)
+        # Returns snippets relevant to a user message, attached to it by send(); None = off
+        self.retrieve_context: Callable[[str], str] | None = None
 
-    async def send(
+    def send(
         self,
         user_input: str,
         tools: list[dict] | None = None,
     ) -> AsyncIterator[StreamChunk]:
-        effective_tools = tools if tools is not None else TOOLS
-        async for chunk in super().send(user_input, tools=effective_tools):
-            yield chunk
-
-    async def continue_after_tools(
-        self,
-        tools: list[dict] | None = None,
-    ) -> AsyncIterator[StreamChunk]:
-        effective_tools = tools if tools is not None else TOOLS
-        async for chunk in super().continue_after_tools(tools=effective_tools):
-            yield chunk
+        if self.retrieve_context is not None:
+            context = self.retrieve_context(user_input)
+            if context:
+                user_input = f"{user_input}\n\n## Possibly relevant code (auto-retrieved)\n\n{context}"
+        return super().send(user_input, tools)
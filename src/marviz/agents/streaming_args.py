@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import json
+import re
+from collections.abc import Callable
+from typing import Protocol
+
+_VALUE_STOP = re.compile(r'["\\]')
+_SIMPLE_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+
+class ArgumentSink(Protocol):
+    """Receives the decoded text of a streamed tool argument."""
+
+    size: int  # bytes written (UTF-8)
+
+    def write(self, text: str) -> None: ...
+
+    def close(self) -> None: ...
+
+    def discard(self) -> None: ...
+
+    def hexdigest(self) -> str: ...
+
+
+# Called when the streamed field starts, with the top-level string fields seen so far
+SinkFactory = Callable[[dict[str, str]], ArgumentSink]
+
+
+class StreamingArgumentDecoder:
+    """Incrementally decodes one top-level string field of a streamed JSON object.
+
+    Fragments of the tool-call arguments are fed as they arrive. The value
+    of ``field`` is unescaped on the fly and written to a sink, so it is
+    never held in memory; the rest of the object is kept with that value
+    emptied (see ``remainder``). Other top-level string values are decoded
+    into ``fields`` as they complete, so e.g. ``path`` is known when the
+    sink is opened if the model sends it first.
+    """
+
+    def __init__(self, field: str, open_sink: SinkFactory) -> None:
+        self.field = field
+        self.fields: dict[str, str] = {}
+        self.sink: ArgumentSink | None = None
+        self.complete = False  # the field's closing quote has been seen
+        self._open_sink = open_sink
+        self._rest: list[str] = []
+        self._in_value = False  # inside the streamed string
+        self._escape = ""  # partial escape sequence inside the streamed string
+        self._high = ""  # pending high surrogate
+        self._pending_value = False  # saw `"field":`, waiting for the opening quote
+        # Scanner state for everything outside the streamed value
+        self._depth = 0
+        self._in_str = False
+        self._str_escape = False
+        self._expect_key = False
+        self._is_key = False
+        self._token: list[str] = []  # chars of the current depth-1 string
+        self._key = ""
+
+    def remainder(self) -> str:
+        """The JSON text received so far, with the streamed value as ``""``."""
+        return "".join(self._rest)
+
+    def feed(self, fragment: str) -> None:
+        i, n = 0, len(fragment)
+        while i < n:
+            if self._in_value:
+                i = self._feed_value(fragment, i)
+                continue
+            c = fragment[i]
+            i += 1
+            if self._pending_value:
+                if c in " \t\r\n":
+                    self._rest.append(c)
+                    continue
+                self._pending_value = False
+                if c == '"':
+                    self._rest.append(c)
+                    self._in_value = True
+                    if self.sink is None:
+                        self.sink = self._open_sink(dict(self.fields))
+                    continue
+            self._scan(c)
+
+    def _scan(self, c: str) -> None:
+        self._rest.append(c)
+        if self._in_str:
+            if self._str_escape:
+                self._str_escape = False
+            elif c == "\\":
+                self._str_escape = True
+            elif c == '"':
+                self._in_str = False
+                self._end_string()
+                return
+            if self._depth == 1:
+                self._token.append(c)
+            return
+        if c == '"':
+            self._in_str = True
+            self._is_key = self._depth == 1 and self._expect_key
+            self._token = []
+        elif c in "{[":
+            self._depth += 1
+            self._expect_key = c == "{" and self._depth == 1
+        elif c in "}]":
+            self._depth -= 1
+        elif c == "," and self._depth == 1:
+            self._expect_key = True
+        elif c == ":" and self._depth == 1:
+            self._expect_key = False
+            if self._key == self.field and not self.complete:
+                self._pending_value = True
+
+    def _end_string(self) -> None:
+        if self._depth != 1:
+            return
+        raw = "".join(self._token)
+        try:
+            text = json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            text = raw
+        if self._is_key:
+            self._key = text
+        else:
+            self.fields[self._key] = text
+        self._token = []
+
+    def _feed_value(self, fragment: str, i: int) -> int:
+        n = len(fragment)
+        if self._escape:
+            while i < n and not self._escape_complete():
+                self._escape += fragment[i]
+                i += 1
+            if not self._escape_complete():
+                return i
+            self._emit_escape()
+            return i
+        match = _VALUE_STOP.search(fragment, i)
+        end = match.start() if match else n
+        if end > i:
+            self._emit(fragment[i:end])
+        if match is None:
+            return n
+        if fragment[end] == '"':
+            self._emit("")
+            self._in_value = False
+            self.complete = True
+            self._rest.append('"')
+            return end + 1
+        self._escape = "\\"
+        return end + 1
+
+    def _escape_complete(self) -> bool:
+        if len(self._escape) < 2:
+            return False
+        return self._escape[1] != "u" or len(self._escape) >= 6
+
+    def _emit_escape(self) -> None:
+        escape, self._escape = self._escape, ""
+        kind = escape[1]
+        if kind != "u":
+            self._emit(_SIMPLE_ESCAPES.get(kind, kind))
+            return
+        try:
+            code = int(escape[2:], 16)
+        except ValueError:
+            self._emit("\ufffd")
+            return
+        if 0xD800 <= code <= 0xDBFF:
+            self._flush_high()
+            self._high = chr(code)
+        elif 0xDC00 <= code <= 0xDFFF and self._high:
+            high, self._high = ord(self._high), ""
+            self._emit(chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00)))
+        else:
+            self._emit(chr(code) if not 0xDC00 <= code <= 0xDFFF else "\ufffd")
+
+    def _flush_high(self) -> None:
+        if self._high:
+            self._high = ""
+            if self.sink is not None:
+                self.sink.write("\ufffd")
+
+    def _emit(self, text: str) -> None:
+        self._flush_high()
+        if text and self.sink is not None:
+            self.sink.write(text)
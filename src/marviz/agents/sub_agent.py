@@ -2,16 +2,54 @@ from __future__ import annotations
 
 from ..providers.base import BaseProvider
 from .base import BaseAgent
+from .history import FilePayloadTracker, compact_history
+from .main_agent import (
+    FIND_SYMBOL_TOOL,
+    GIT_BLAME_RANGE_TOOL,
+    GIT_DIFF_TOOL,
+    GIT_LOG_TOOL,
+    GIT_STATUS_TOOL,
+    READ_FILE_TOOL,
+    READ_FILES_TOOL,
+    RETRIEVE_TOOL,
+    SEARCH_CODE_TOOL,
+)
+
+# Workers get read-only tools; writing files, running commands and delegation stay
+# with the main agent, whose actions the user sees in the chat
+WORKER_TOOLS = [
+    READ_FILE_TOOL,
+    READ_FILES_TOOL,
+    SEARCH_CODE_TOOL,
+    FIND_SYMBOL_TOOL,
+    RETRIEVE_TOOL,
+    GIT_STATUS_TOOL,
+    GIT_DIFF_TOOL,
+    GIT_LOG_TOOL,
+    GIT_BLAME_RANGE_TOOL,
+]
 
 
 class SubAgent(BaseAgent):
-    """Focused worker agent for a single delegated task."""
+    """Focused worker agent for a delegated task.
+
+    A persistent worker takes follow-up tasks with ``assign`` and keeps its
+    conversation between them, so it does not have to rediscover what it
+    already read; its unchanged history prefix also stays in the
+    provider's prompt cache.
+    """
+
+    role = "worker"
+    default_tools = WORKER_TOOLS
 
     SYSTEM_PROMPT = (
         "You are a focused worker agent inside the Marviz terminal environment. "
         "You have been assigned a specific task. Complete it thoroughly and concisely. "
         "Format your output for terminal readability. "
-        "Do not ask follow-up questions — just execute the task."
+        "Do not ask follow-up questions — just execute the task. "
+        "Use find_symbol, search_code and retrieve to locate relevant code "
+        "and read_file (or read_files for several at once) to inspect it. "
+        "Use git_diff to see what has changed recently."
     )
 
     def __init__(
@@ -25,3 +63,24 @@ class SubAgent(BaseAgent):
         self.agent_id = agent_id
         self.worker_name = worker_name
         self.task = task
+        self.tasks_done = 0
+
+    def assign(self, agent_id: str, task: str, max_history_chars: int) -> int:
+        """Take a follow-up task, keeping the conversation so far.
+
+        Superseded file copies are collapsed first, then the history is
+        compacted when it exceeds ``max_history_chars``; returns the number
+        of characters compaction removed.
+        """
+        self.agent_id = agent_id
+        self.task = task
+        self.file_payloads.start_turn()
+        removed = compact_history(self.history, max_history_chars)
+        if removed:
+            # Message indexes moved; earlier file payloads are no longer tracked
+            self.file_payloads = FilePayloadTracker(self.history)
+        return removed
+
+    @property
+    def worker_label(self) -> str:
+        return self.worker_name
@@ -1,15 +1,17 @@
 from __future__ import annotations
 
 import json
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from typing import Literal
 
+from .streaming_args import ArgumentSink, SinkFactory, StreamingArgumentDecoder
 
-@dataclass
+
+@dataclass(slots=True)
 class StreamChunk:
     """A single chunk from a streaming LLM response."""
 
-    type: Literal["text", "tool_call", "error"]
+    type: Literal["text", "tool_call", "error", "notice"]  # notice: informational, not content
     content: str = ""
     tool_name: str | None = None
     tool_args: str | None = None  # raw JSON fragment (accumulated externally)
@@ -32,13 +34,26 @@ class AccumulatedToolCall:
     id: str
     name: str
     arguments: dict
+    sink: ArgumentSink | None = None  # holds a streamed argument, see ToolCallAccumulator
 
 
 class ToolCallAccumulator:
-    """Collects streamed tool_call fragments and yields complete calls."""
+    """Collects streamed tool_call fragments and yields complete calls.
+
+    ``streamed`` maps tool name -> (argument, sink factory). That argument
+    is decoded while it streams and written to a sink instead of being
+    buffered; the finalized call carries the closed sink and the argument
+    is replaced by a short reference.
+    """
+
+    def __init__(self, streamed: dict[str, tuple[str, SinkFactory]] | None = None) -> None:
+        self._calls: dict[int, dict] = {}  # index -> {id, name, args, decoder}
+        self._streamed = streamed or {}
 
-    def __init__(self) -> None:
-        self._calls: dict[int, dict] = {}  # index -> {id, name, args_buffer}
+    @property
+    def has_calls(self) -> bool:
+        """Whether any tool call has been started since the last finalize or discard."""
+        return bool(self._calls)
 
     def feed(self, chunk: StreamChunk) -> None:
         """Feed a tool_call chunk. Fragments are keyed by tool_call_index."""
@@ -46,29 +61,58 @@ class ToolCallAccumulator:
             return
         idx = chunk.tool_call_index or 0
         if idx not in self._calls:
-            self._calls[idx] = {"id": None, "name": "", "args_buffer": ""}
+            self._calls[idx] = {"id": None, "name": "", "args": [], "decoder": None}
         entry = self._calls[idx]
         if chunk.tool_call_id:
             entry["id"] = chunk.tool_call_id
         if chunk.tool_name:
             entry["name"] = chunk.tool_name
-        if chunk.tool_args:
-            entry["args_buffer"] += chunk.tool_args
+        if not chunk.tool_args:
+            return
+        decoder = entry["decoder"]
+        if decoder is None and not entry["args"] and entry["name"] in self._streamed:
+            field_name, open_sink = self._streamed[entry["name"]]
+            decoder = entry["decoder"] = StreamingArgumentDecoder(field_name, open_sink)
+        if decoder is not None:
+            decoder.feed(chunk.tool_args)
+        else:
+            entry["args"].append(chunk.tool_args)
+
+    def discard(self) -> None:
+        """Drop collected fragments and discard any partially streamed arguments."""
+        for entry in self._calls.values():
+            decoder = entry["decoder"]
+            if decoder is not None and decoder.sink is not None:
+                decoder.sink.discard()
+        self._calls.clear()
 
     def finalize(self) -> list[AccumulatedToolCall]:
         """Parse all collected fragments into AccumulatedToolCall objects."""
         results: list[AccumulatedToolCall] = []
         for _idx in sorted(self._calls):
             entry = self._calls[_idx]
+            decoder: StreamingArgumentDecoder | None = entry["decoder"]
+            buffer = decoder.remainder() if decoder else "".join(entry["args"])
             try:
-                args = json.loads(entry["args_buffer"]) if entry["args_buffer"] else {}
+                args = json.loads(buffer) if buffer else {}
             except json.JSONDecodeError:
-                args = {"_raw": entry["args_buffer"]}
+                args = {"_raw": buffer}
+            sink = decoder.sink if decoder else None
+            if sink is not None:
+                if decoder.complete and "_raw" not in args:
+                    sink.close()
+                    args[decoder.field] = (
+                        f"[streamed to disk, {sink.size / 1024:.1f} KB, sha {sink.hexdigest()[:12]}]"
+                    )
+                else:
+                    sink.discard()
+                    sink = None
             results.append(
                 AccumulatedToolCall(
                     id=entry["id"] or f"call_{_idx}",
                     name=entry["name"],
                     arguments=args,
+                    sink=sink,
                 )
             )
         self._calls.clear()
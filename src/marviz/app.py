@@ -2,17 +2,58 @@ from pathlib import Path
 
 from textual.app import App
 
+from .config import MarvizConfig
+from .runtime import AgentRuntime, RuntimeClient
+from .services.diagnostics import Diagnostics
 from .ui.screens.main_screen import MainScreen
 
 CSS_PATH = Path(__file__).parent / "ui" / "styles" / "app.tcss"
 
 
 class MarvizApp(App):
-    """Marviz - MDIR-style Terminal AI Dev Environment."""
+    """Marviz - MDIR-style Terminal AI Dev Environment.
+
+    With ``socket_path`` the app is a client of a running ``marviz daemon``
+    and quitting only detaches; otherwise the agent runtime runs in-process,
+    either the given ``runtime`` or one built from the loaded config.
+    """
 
     TITLE = "Marviz"
     CSS_PATH = CSS_PATH
     SCREENS = {"main": MainScreen}
 
-    def on_mount(self) -> None:
+    def __init__(
+        self,
+        *args,
+        socket_path: Path | None = None,
+        runtime: AgentRuntime | None = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.socket_path = socket_path
+        self.diagnostics: Diagnostics | None = None
+        self.runtime: AgentRuntime | RuntimeClient | None = runtime
+
+    async def on_mount(self) -> None:
+        config = MarvizConfig.load()
+        if config.profile:
+            self.diagnostics = Diagnostics(
+                config.profile_dir,
+                lag_threshold=config.lag_threshold_ms / 1000,
+                sample_interval=config.profile_interval_ms / 1000,
+                trace_memory=config.trace_memory,
+            )
+            self.diagnostics.start()
+        if self.socket_path is not None:
+            self.sub_title = f"attached to {self.socket_path}"
+            self.runtime = RuntimeClient(self.socket_path, config.working_dir)
+        elif self.runtime is None:
+            self.runtime = AgentRuntime(config)
+        await self.runtime.start()
         self.push_screen("main")
+
+    async def on_unmount(self) -> None:
+        if self.runtime is not None:
+            await self.runtime.stop()
+        if self.diagnostics is not None:
+            self.diagnostics.stop()
@@ -5,20 +5,190 @@ from pathlib import Path
 from dotenv import load_dotenv
 
 
+# Environment variables passed to commands agents run (globs allowed); secrets are not
+RUN_ENV_ALLOWLIST = (
+    "PATH",
+    "HOME",
+    "USER",
+    "LOGNAME",
+    "SHELL",
+    "LANG",
+    "LANGUAGE",
+    "LC_*",
+    "TZ",
+    "TMPDIR",
+    "VIRTUAL_ENV",
+    "CONDA_PREFIX",
+    "PYTHONPATH",
+    "JAVA_HOME",
+    "GOPATH",
+    "GOROOT",
+    "CARGO_HOME",
+    "RUSTUP_HOME",
+    "NODE_PATH",
+    "NVM_DIR",
+)
+
+
+def default_socket_path() -> Path:
+    """Daemon socket: in $XDG_RUNTIME_DIR when set, else under ~/.cache/marviz."""
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "marviz.sock"
+    return Path.home() / ".cache" / "marviz" / "marviz.sock"
+
+
 @dataclass
 class MarvizConfig:
     """Application configuration loaded from environment."""
 
     default_model: str = "claude-sonnet-4-20250514"
+    api_base: str | None = None  # override the provider's endpoint (proxies, local servers)
     max_sub_agents: int = 3
     working_dir: Path = field(default_factory=Path.cwd)
+    chat_scrollback_lines: int = 5000
+    worker_scrollback_lines: int = 2000
+    terminal_scrollback_lines: int = 1000
+    index_refresh_seconds: float = 10.0
+    repo_map_tokens: int = 0  # 0 disables the repo map in system prompts
+    retrieval_tokens: int = 0  # budget for snippets attached to user messages; 0 = off
+    retrieval_top_k: int = 5
+    read_files_budget: int = 40_000  # combined chars returned by one read_files call
+    file_cache_mb: int = 64  # file contents shared by all agents' file tools; 0 = off
+    specialist_history_chars: int = 120_000  # a persistent worker's history is compacted above this
+    specialist_memory_chars: int = 2_000_000  # idle persistent workers, all sessions; LRU beyond
+    # Per-run budgets (see runtime.budget.Budget); 0 = unlimited. A worker's
+    # run is its whole task; a main agent's is one user turn including tool rounds.
+    worker_max_tokens: int = 8000
+    worker_max_seconds: float = 300.0
+    worker_max_tool_steps: int = 8
+    worker_max_dollars: float = 0.0
+    main_max_tokens: int = 0
+    main_max_seconds: float = 0.0
+    main_max_tool_steps: int = 0
+    main_max_dollars: float = 0.0
+    run_command_timeout: float = 120.0  # upper bound for one run_command call
+    run_command_concurrency: int = 2
+    run_command_env: tuple[str, ...] = RUN_ENV_ALLOWLIST
+    metrics_file: Path | None = None  # .jsonl (rotating) or .prom snapshot
+    trace_dir: Path = field(
+        default_factory=lambda: Path.home() / ".cache" / "marviz" / "traces"
+    )
+    stream_coalesce_ms: float = 0.0
+    stream_idle_timeout: float = 60.0  # seconds without a chunk before a stream counts as stalled
+    stream_first_chunk_timeout: float = 180.0
+    stream_resumes: int = 2  # continuations of an answer cut off mid-stream; 0 = off
+    http_pool: bool = True  # shared keep-alive connections, prewarmed at startup
+    http_keepalive_seconds: float = 120.0
+    socket_path: Path = field(default_factory=default_socket_path)
+    profile: bool = False
+    profile_dir: Path = field(
+        default_factory=lambda: Path.home() / ".cache" / "marviz" / "diagnostics"
+    )
+    lag_threshold_ms: float = 100.0
+    profile_interval_ms: float = 10.0
+    trace_memory: bool = False  # tracemalloc from startup (slow); else from the first /snapshot
 
     @classmethod
     def load(cls) -> "MarvizConfig":
         load_dotenv()
         return cls(
             default_model=os.getenv("MARVIZ_DEFAULT_MODEL", cls.default_model),
+            api_base=os.getenv("MARVIZ_API_BASE") or None,
             max_sub_agents=int(os.getenv("MARVIZ_MAX_SUB_AGENTS", str(cls.max_sub_agents))),
+            chat_scrollback_lines=int(
+                os.getenv("MARVIZ_CHAT_SCROLLBACK", str(cls.chat_scrollback_lines))
+            ),
+            worker_scrollback_lines=int(
+                os.getenv("MARVIZ_WORKER_SCROLLBACK", str(cls.worker_scrollback_lines))
+            ),
+            terminal_scrollback_lines=int(
+                os.getenv("MARVIZ_TERMINAL_SCROLLBACK", str(cls.terminal_scrollback_lines))
+            ),
+            index_refresh_seconds=float(
+                os.getenv("MARVIZ_INDEX_REFRESH", str(cls.index_refresh_seconds))
+            ),
+            repo_map_tokens=int(os.getenv("MARVIZ_REPO_MAP_TOKENS", str(cls.repo_map_tokens))),
+            retrieval_tokens=int(
+                os.getenv("MARVIZ_RETRIEVAL_TOKENS", str(cls.retrieval_tokens))
+            ),
+            retrieval_top_k=int(os.getenv("MARVIZ_RETRIEVAL_K", str(cls.retrieval_top_k))),
+            read_files_budget=int(
+                os.getenv("MARVIZ_READ_FILES_BUDGET", str(cls.read_files_budget))
+            ),
+            file_cache_mb=int(os.getenv("MARVIZ_FILE_CACHE_MB", str(cls.file_cache_mb))),
+            specialist_history_chars=int(
+                os.getenv("MARVIZ_SPECIALIST_HISTORY", str(cls.specialist_history_chars))
+            ),
+            specialist_memory_chars=int(
+                os.getenv("MARVIZ_SPECIALIST_MEMORY", str(cls.specialist_memory_chars))
+            ),
+            worker_max_tokens=int(
+                os.getenv("MARVIZ_WORKER_MAX_TOKENS", str(cls.worker_max_tokens))
+            ),
+            worker_max_seconds=float(
+                os.getenv("MARVIZ_WORKER_MAX_SECONDS", str(cls.worker_max_seconds))
+            ),
+            worker_max_tool_steps=int(
+                os.getenv("MARVIZ_WORKER_MAX_TOOL_STEPS", str(cls.worker_max_tool_steps))
+            ),
+            worker_max_dollars=float(
+                os.getenv("MARVIZ_WORKER_MAX_DOLLARS", str(cls.worker_max_dollars))
+            ),
+            main_max_tokens=int(os.getenv("MARVIZ_MAIN_MAX_TOKENS", str(cls.main_max_tokens))),
+            main_max_seconds=float(
+                os.getenv("MARVIZ_MAIN_MAX_SECONDS", str(cls.main_max_seconds))
+            ),
+            main_max_tool_steps=int(
+                os.getenv("MARVIZ_MAIN_MAX_TOOL_STEPS", str(cls.main_max_tool_steps))
+            ),
+            main_max_dollars=float(
+                os.getenv("MARVIZ_MAIN_MAX_DOLLARS", str(cls.main_max_dollars))
+            ),
+            run_command_timeout=float(
+                os.getenv("MARVIZ_RUN_TIMEOUT", str(cls.run_command_timeout))
+            ),
+            run_command_concurrency=int(
+                os.getenv("MARVIZ_RUN_CONCURRENCY", str(cls.run_command_concurrency))
+            ),
+            run_command_env=RUN_ENV_ALLOWLIST
+            + tuple(n.strip() for n in os.getenv("MARVIZ_RUN_ENV", "").split(",") if n.strip()),
+            metrics_file=Path(os.environ["MARVIZ_METRICS_FILE"]).expanduser()
+            if os.getenv("MARVIZ_METRICS_FILE")
+            else None,
+            trace_dir=Path(os.environ["MARVIZ_TRACE_DIR"]).expanduser()
+            if os.getenv("MARVIZ_TRACE_DIR")
+            else Path.home() / ".cache" / "marviz" / "traces",
+            socket_path=Path(os.environ["MARVIZ_SOCKET"]).expanduser()
+            if os.getenv("MARVIZ_SOCKET")
+            else default_socket_path(),
+            stream_coalesce_ms=float(
+                os.getenv("MARVIZ_STREAM_COALESCE_MS", str(cls.stream_coalesce_ms))
+            ),
+            stream_idle_timeout=float(
+                os.getenv("MARVIZ_STREAM_IDLE_TIMEOUT", str(cls.stream_idle_timeout))
+            ),
+            stream_first_chunk_timeout=float(
+                os.getenv(
+                    "MARVIZ_STREAM_FIRST_CHUNK_TIMEOUT", str(cls.stream_first_chunk_timeout)
+                )
+            ),
+            stream_resumes=int(os.getenv("MARVIZ_STREAM_RESUMES", str(cls.stream_resumes))),
+            http_pool=os.getenv("MARVIZ_HTTP_POOL", "1") not in ("", "0", "false"),
+            http_keepalive_seconds=float(
+                os.getenv("MARVIZ_HTTP_KEEPALIVE", str(cls.http_keepalive_seconds))
+            ),
+            profile=os.getenv("MARVIZ_PROFILE", "") not in ("", "0", "false"),
+            profile_dir=Path(os.environ["MARVIZ_PROFILE_DIR"]).expanduser()
+            if os.getenv("MARVIZ_PROFILE_DIR")
+            else Path.home() / ".cache" / "marviz" / "diagnostics",
+            lag_threshold_ms=float(
+                os.getenv("MARVIZ_LAG_THRESHOLD_MS", str(cls.lag_threshold_ms))
+            ),
+            profile_interval_ms=float(
+                os.getenv("MARVIZ_PROFILE_INTERVAL_MS", str(cls.profile_interval_ms))
+            ),
+            trace_memory=os.getenv("MARVIZ_TRACEMALLOC", "") not in ("", "0", "false"),
         )
 
     @staticmethod
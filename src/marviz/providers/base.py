@@ -1,14 +1,26 @@
 from __future__ import annotations
 
+import asyncio
+import time
 from abc import ABC, abstractmethod
 from collections.abc import AsyncIterator
+from typing import TypeVar
 
 from ..agents.types import StreamChunk
 
+T = TypeVar("T")
+
+
+class StreamStalled(TimeoutError):
+    """A provider stream produced nothing for longer than its idle timeout."""
+
 
 class BaseProvider(ABC):
     """Abstract base for LLM providers."""
 
+    # The API continues a trailing assistant message ("prefill") instead of answering anew
+    supports_prefill = False
+
     @abstractmethod
     async def stream(
         self,
@@ -17,3 +29,78 @@ class BaseProvider(ABC):
     ) -> AsyncIterator[StreamChunk]:
         """Yield streaming chunks from the LLM."""
         ...  # pragma: no cover
+
+    async def prewarm(self, connections: int = 1) -> int:
+        """Open connections ahead of the first request; returns how many were opened."""
+        return 0
+
+    def price(self) -> tuple[float, float] | None:
+        """Dollars per input and per output token, or None when unknown."""
+        return None
+
+
+async def idle_timeout(
+    items: AsyncIterator[T], idle: float, first: float | None = None
+) -> AsyncIterator[T]:
+    """Pass ``items`` through, raising ``StreamStalled`` when one takes too long.
+
+    ``first`` bounds the wait for the first item (time to first token is
+    usually much longer than the gaps between tokens), ``idle`` every wait
+    after that; 0 disables the respective check.
+    """
+    iterator = aiter(items)
+    timeout = idle if first is None else first
+    while True:
+        try:
+            if timeout > 0:
+                item = await asyncio.wait_for(anext(iterator), timeout)
+            else:
+                item = await anext(iterator)
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise StreamStalled(f"stream stalled: no data for {timeout:g}s") from None
+        yield item
+        timeout = idle
+
+
+async def coalesce_text(
+    chunks: AsyncIterator[StreamChunk], window: float
+) -> AsyncIterator[StreamChunk]:
+    """Merge adjacent text deltas that arrive within ``window`` seconds.
+
+    The first text delta is passed through immediately so time to first
+    token is unaffected. Buffered text is flushed when a delta arrives
+    after the window has elapsed, before any non-text chunk, and at the end
+    of the stream; the window is checked on arrival, so text can be held
+    back across a pause in the stream until the next chunk arrives.
+    """
+    if window <= 0:
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    clock = time.perf_counter
+    parts: list[str] = []
+    opened = 0.0
+    seen_text = False
+    async for chunk in chunks:
+        if chunk.type == "text":
+            if not seen_text:
+                seen_text = True
+                yield chunk
+                continue
+            now = clock()
+            if not parts:
+                opened = now
+            parts.append(chunk.content)
+            if now - opened >= window:
+                yield StreamChunk(type="text", content="".join(parts))
+                parts.clear()
+            continue
+        if parts:
+            yield StreamChunk(type="text", content="".join(parts))
+            parts.clear()
+        yield chunk
+    if parts:
+        yield StreamChunk(type="text", content="".join(parts))
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+import httpx
+
+# HTTP/2 needs the optional `h2` package (pip install "httpx[http2]")
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Unread body left when a stream is closed early is read off, within these
+# limits, so the connection can go back to the pool instead of being dropped
+_DRAIN_BYTES = 64 * 1024
+_DRAIN_SECONDS = 0.25
+
+
+def origin(url: str) -> str:
+    """scheme://host[:port] of ``url``; connections are pooled per origin."""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class _DrainingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream) -> None:
+        self._stream = stream
+        self._done = False
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        except GeneratorExit:
+            # The reader stopped early and dropped the iterator without closing the response
+            await self._drain()
+            raise
+        self._done = True
+
+    async def _drain(self) -> None:
+        if self._done:
+            return
+        self._done = True
+        drained = 0
+
+        async def read() -> None:
+            nonlocal drained
+            async for chunk in self._stream:
+                drained += len(chunk)
+                if drained > _DRAIN_BYTES:
+                    return
+
+        try:
+            await asyncio.wait_for(read(), _DRAIN_SECONDS)
+        except (asyncio.TimeoutError, httpx.HTTPError, OSError):
+            pass
+
+    async def aclose(self) -> None:
+        try:
+            await self._drain()
+        finally:
+            await self._stream.aclose()
+
+
+class _DrainingTransport(httpx.AsyncBaseTransport):
+    """Wraps a transport so early-closed streaming responses keep their connection.
+
+    SDKs stop reading an SSE stream at its final event and close the
+    response; over HTTP/1.1 any bytes still unread (the chunked-encoding
+    terminator, a trailing ``[DONE]``) would otherwise force the connection
+    closed.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self._transport.handle_async_request(request)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_DrainingStream(response.stream),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class ConnectionPool:
+    """Long-lived, keep-alive HTTP clients shared by every agent, one per endpoint.
+
+    Each endpoint origin gets one ``httpx.AsyncClient`` (HTTP/2 when ``h2``
+    is installed) whose connections are kept open for ``keepalive_expiry``
+    seconds between requests. ``prewarm`` opens connections ahead of the
+    first request so DNS, TCP and TLS setup happen while the user is typing.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 8,
+        keepalive_expiry: float = 120.0,
+        timeout: float = 600.0,
+    ) -> None:
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._last_used: dict[str, float] = {}
+        self._warming: dict[str, asyncio.Task] = {}
+
+    def client(self, endpoint: str) -> httpx.AsyncClient:
+        key = origin(endpoint)
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            )
+            transport = None
+            if not urllib.request.getproxies():  # an explicit transport would bypass proxy env vars
+                transport = _DrainingTransport(
+                    httpx.AsyncHTTPTransport(http2=HTTP2_AVAILABLE, limits=limits)
+                )
+            client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=limits,
+                transport=transport,
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                follow_redirects=True,
+                event_hooks={"response": [lambda _response: self._touch(key)]},
+            )
+            self._clients[key] = client
+        return client
+
+    async def _touch(self, key: str) -> None:
+        self._last_used[key] = time.monotonic()
+
+    def is_warm(self, endpoint: str) -> bool:
+        """True if a request to ``endpoint`` completed recently enough that its connections are still open."""
+        last = self._last_used.get(origin(endpoint))
+        return last is not None and time.monotonic() - last < self.keepalive_expiry * 0.8
+
+    async def prewarm(self, endpoint: str, connections: int = 1) -> int:
+        """Open up to ``connections`` keep-alive connections to ``endpoint``.
+
+        With HTTP/2 one connection carries all streams; with HTTP/1.1 each
+        concurrent request needs its own, so ``connections`` requests are
+        sent at once. Returns how many got a response. Concurrent calls for
+        the same endpoint share one attempt.
+        """
+        key = origin(endpoint)
+        task = self._warming.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._prewarm(key, connections))
+            self._warming[key] = task
+            task.add_done_callback(lambda _task: self._warming.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _prewarm(self, key: str, connections: int) -> int:
+        client = self.client(key)
+        count = 1 if HTTP2_AVAILABLE and key.startswith("https:") else connections
+        count = max(1, min(count, self.max_connections))
+
+        async def ping() -> bool:
+            try:
+                # Any status will do: only the connection matters
+                await client.head(key + "/", timeout=10.0)
+            except httpx.HTTPError:
+                return False
+            return True
+
+        results = await asyncio.gather(*(ping() for _ in range(count)))
+        return sum(results)
+
+    async def aclose(self) -> None:
+        for task in list(self._warming.values()):
+            task.cancel()
+        clients, self._clients = list(self._clients.values()), {}
+        await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
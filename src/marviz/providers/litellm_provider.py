@@ -1,25 +1,172 @@
 from __future__ import annotations
 
+import asyncio
+import os
 from collections.abc import AsyncIterator
 
+import httpx
 import litellm
+import openai
+from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler
 
 from ..agents.types import StreamChunk
-from .base import BaseProvider
+from .base import BaseProvider, StreamStalled, coalesce_text, idle_timeout
+from .http_pool import ConnectionPool
+
+# Where each provider's API lives when no api_base is configured
+_DEFAULT_ENDPOINTS = {
+    "anthropic": "https://api.anthropic.com",
+    "openai": "https://api.openai.com",
+    "gemini": "https://generativelanguage.googleapis.com",
+    "mistral": "https://api.mistral.ai",
+    "groq": "https://api.groq.com",
+    "deepseek": "https://api.deepseek.com",
+}
+
+# Providers whose litellm handlers wrap the OpenAI SDK; their `client` argument
+# is an SDK client, built here around the pooled HTTP client
+_OPENAI_SDK_PROVIDERS = {"openai", "text-completion-openai", "custom_openai"}
+_OPENAI_BASE_URL = "https://api.openai.com/v1"
+# Azure's SDK client needs deployment settings litellm resolves itself; it is not pooled
+_UNPOOLED_PROVIDERS = {"azure"}
+
+# Providers whose APIs continue a trailing assistant message
+_PREFILL_PROVIDERS = {"anthropic"}
+# Providers that only cache a prompt prefix up to explicit cache_control markers
+_CACHE_CONTROL_PROVIDERS = {"anthropic"}
+
+
+def _cache_marked(message: dict) -> dict:
+    content = message.get("content")
+    if isinstance(content, str) and content:
+        blocks = [{"type": "text", "text": content}]
+    elif isinstance(content, list) and content:
+        blocks = [*content[:-1], dict(content[-1])]
+    else:
+        return message
+    blocks[-1]["cache_control"] = {"type": "ephemeral"}
+    return {**message, "content": blocks}
+
+
+def with_cache_breakpoints(messages: list[dict]) -> list[dict]:
+    """A copy of ``messages`` marking the system prompt and latest user message as cacheable.
+
+    Every request of an agent repeats its history, so the provider can
+    serve that prefix from its prompt cache: a worker's tool rounds share
+    the prefix up to its task, and a persistent worker's follow-up task
+    shares everything before it.
+    """
+    marked = list(messages)
+    last_user = max((i for i, m in enumerate(marked) if m["role"] == "user"), default=None)
+    for i in {0, last_user} - {None}:
+        if marked[i]["role"] in ("system", "user"):
+            marked[i] = _cache_marked(marked[i])
+    return marked
 
 
 class LiteLLMProvider(BaseProvider):
-    """LiteLLM-backed provider with async streaming."""
+    """LiteLLM-backed provider with async streaming.
 
-    def __init__(self, model: str) -> None:
+    With ``coalesce_ms`` > 0, adjacent text deltas arriving within that
+    window are merged into one chunk (see ``coalesce_text``). With a
+    ``pool``, requests go over its long-lived connections to the model's
+    endpoint, which ``prewarm`` can open before the first message. A
+    stream that sends nothing for ``idle_timeout`` seconds (or
+    ``first_chunk_timeout`` before its first chunk) ends with an error
+    chunk instead of hanging.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        coalesce_ms: float = 0.0,
+        api_base: str | None = None,
+        pool: ConnectionPool | None = None,
+        idle_timeout: float = 0.0,
+        first_chunk_timeout: float = 0.0,
+    ) -> None:
         self.model = model
+        self.coalesce_ms = coalesce_ms
+        self.api_base = api_base
+        self.pool = pool
+        self.idle_timeout = idle_timeout
+        self.first_chunk_timeout = first_chunk_timeout
+        self.endpoint: str | None = None
+        self._llm_provider = ""
+        self._base_url: str | None = None  # for the OpenAI SDK
+        # (pooled HTTP client, the `client` argument wrapping it) of the last request
+        self._client: tuple[httpx.AsyncClient, AsyncHTTPHandler | openai.AsyncOpenAI] | None = None
+        self._price: tuple[float, float] | None = None
+        try:
+            _, self._llm_provider, _, resolved_base = litellm.get_llm_provider(
+                model, api_base=api_base
+            )
+            if self._llm_provider in _OPENAI_SDK_PROVIDERS:
+                self._base_url = resolved_base = (
+                    resolved_base or os.getenv("OPENAI_BASE_URL") or _OPENAI_BASE_URL
+                )
+            if self._llm_provider not in _UNPOOLED_PROVIDERS:
+                self.endpoint = resolved_base or _DEFAULT_ENDPOINTS.get(self._llm_provider)
+            self.supports_prefill = self._llm_provider in _PREFILL_PROVIDERS
+        except Exception:
+            pass  # unknown model: the error surfaces on the first request
+
+    async def prewarm(self, connections: int = 1) -> int:
+        """Open pooled connections to the model's endpoint unless they are already warm."""
+        if self.pool is None or self.endpoint is None or self.pool.is_warm(self.endpoint):
+            return 0
+        return await self.pool.prewarm(self.endpoint, connections)
+
+    def price(self) -> tuple[float, float] | None:
+        """Per-token prices from litellm's model cost map; None for unpriced models."""
+        if self._price is None:
+            try:
+                info = litellm.get_model_info(self.model)
+                self._price = (
+                    info.get("input_cost_per_token") or 0.0,
+                    info.get("output_cost_per_token") or 0.0,
+                )
+            except Exception:
+                self._price = (0.0, 0.0)
+        return self._price if any(self._price) else None
+
+    def _client_kwargs(self) -> dict:
+        """The pooled client for this request, passed per call (never via litellm globals)."""
+        if self.pool is None or self.endpoint is None:
+            return {}
+        client = self.pool.client(self.endpoint)
+        if self._client is None or self._client[0] is not client:
+            if self._llm_provider in _OPENAI_SDK_PROVIDERS:
+                wrapper = openai.AsyncOpenAI(
+                    # Resolved as litellm does; servers without auth ignore the placeholder
+                    api_key=litellm.api_key or os.getenv("OPENAI_API_KEY") or "none",
+                    base_url=self._base_url,
+                    http_client=client,
+                )
+            else:
+                wrapper = AsyncHTTPHandler()
+                wrapper.client = client
+            self._client = (client, wrapper)
+        return {"client": self._client[1]}
 
-    async def stream(
+    def stream(
         self,
         messages: list[dict],
         tools: list[dict] | None = None,
+    ) -> AsyncIterator[StreamChunk]:
+        chunks = self._stream(messages, tools)
+        if self.coalesce_ms > 0:
+            return coalesce_text(chunks, self.coalesce_ms / 1000)
+        return chunks
+
+    async def _stream(
+        self,
+        messages: list[dict],
+        tools: list[dict] | None,
     ) -> AsyncIterator[StreamChunk]:
         try:
+            if self._llm_provider in _CACHE_CONTROL_PROVIDERS:
+                messages = with_cache_breakpoints(messages)
             kwargs: dict = dict(
                 model=self.model,
                 messages=messages,
@@ -27,10 +174,21 @@ class LiteLLMProvider(BaseProvider):
             )
             if tools:
                 kwargs["tools"] = tools
+            if self.api_base:
+                kwargs["api_base"] = self.api_base
+            kwargs.update(self._client_kwargs())
 
-            response = await litellm.acompletion(**kwargs)
+            try:
+                response = await asyncio.wait_for(
+                    litellm.acompletion(**kwargs), self.first_chunk_timeout or None
+                )
+            except asyncio.TimeoutError:
+                raise StreamStalled(
+                    f"stream stalled: no response for {self.first_chunk_timeout:g}s"
+                ) from None
+            chunks = idle_timeout(response, self.idle_timeout, self.first_chunk_timeout)
 
-            async for chunk in response:
+            async for chunk in chunks:
                 delta = chunk.choices[0].delta
                 if delta.content:
                     yield StreamChunk(type="text", content=delta.content)
@@ -0,0 +1,12 @@
+from .agent_runtime import AgentRuntime, ChatSession
+from .client import RuntimeClient
+from .server import RuntimeServer, run_daemon, socket_is_live
+
+__all__ = [
+    "AgentRuntime",
+    "ChatSession",
+    "RuntimeClient",
+    "RuntimeServer",
+    "run_daemon",
+    "socket_is_live",
+]
@@ -0,0 +1,1099 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import time
+import uuid
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from ..agents.base import BaseAgent
+from ..agents.main_agent import MainAgent
+from ..agents.sub_agent import WORKER_TOOLS, SubAgent
+from ..agents.types import AccumulatedToolCall, StreamChunk
+from ..config import MarvizConfig
+from ..providers.base import BaseProvider
+from ..providers.http_pool import ConnectionPool
+from ..providers.litellm_provider import LiteLLMProvider
+from ..services.batch_read import format_batch, read_files, resolve_path
+from ..services.code_search import CodeSearchIndex, format_matches
+from ..services.command_runner import CommandRunner
+from ..services.file_cache import CacheStats, FileCache
+from ..services.file_edit import (
+    EditError,
+    Hunk,
+    StagedFile,
+    edit_file,
+    parse_unified_diff,
+)
+from ..services.git_tools import GitError, GitTools
+from ..services.metrics import MetricsRecorder, StreamMetrics
+from ..services.retrieval import RetrievalIndex, format_hits
+from ..services.symbol_index import SymbolIndex, format_symbols
+from ..services.tracing import Span, Tracer
+from .budget import Budget, BudgetMeter
+from .specialists import SpecialistPool
+from .task_graph import TaskGraph, TaskGraphError, TaskNode
+
+# Tools that are executed immediately (no sub-agent needed)
+_IMMEDIATE_TOOLS = {
+    "write_file",
+    "edit_file",
+    "read_file",
+    "read_files",
+    "search_code",
+    "find_symbol",
+    "retrieve",
+    "git_status",
+    "git_diff",
+    "git_log",
+    "git_blame_range",
+    "run_command",
+}
+
+# Tools a worker may call; anything else it names is refused, not run
+_WORKER_TOOL_NAMES = frozenset(tool["function"]["name"] for tool in WORKER_TOOLS)
+
+# Tool result for every call of a round past an agent's tool step budget
+_STEP_BUDGET_RESULT = (
+    "Error: tool step budget reached; this call was not run. "
+    "Answer now with what you have."
+)
+# Tool result for every call left unanswered when the user sends a new message
+_CANCELLED_RESULT = "Error: cancelled; the user sent a new message before this finished."
+
+# Events kept per session / worker for replay to clients that attach later
+_TRANSCRIPT_EVENTS = 2000
+_SESSION_REPLAY = {"user", "token", "finish", "error", "note", "tool_output"}
+_WORKER_REPLAY = {
+    "worker_started",
+    "worker_token",
+    "worker_tool",
+    "worker_output",
+    "worker_error",
+    "worker_finished",
+}
+# Streamed text events; consecutive ones are merged in transcripts
+_TEXT_EVENTS = {"token", "worker_token", "tool_output", "worker_output"}
+
+Listener = Callable[[dict], None]
+
+
+@dataclass
+class ChatSession:
+    """One chat: its own MainAgent, history and delegate bookkeeping."""
+
+    session_id: str
+    agent: MainAgent
+    label: str
+    pending_results: dict[str, str] = field(default_factory=dict)  # tool_call_id -> result
+    expected_tool_calls: list[AccumulatedToolCall] = field(default_factory=list)
+    task_graph: TaskGraph | None = None  # dependencies among the pending delegates
+    status: str = "Ready"
+    tokens: int = 0
+    titled: bool = False  # label taken from the first message
+    task: asyncio.Task | None = None
+    budget: BudgetMeter | None = None  # usage of the current user turn
+    trace: Span | None = None  # the current user turn
+    delegates_span: Span | None = None  # waiting on this turn's delegates
+    workers: dict[str, asyncio.Task] = field(default_factory=dict)  # tool_call_id -> running delegate
+    transcript: deque[dict] = field(default_factory=lambda: deque(maxlen=_TRANSCRIPT_EVENTS))
+
+
+class AgentRuntime:
+    """Owns sessions, agents, the provider, tool execution and sub-agent scheduling.
+
+    Everything the UI needs to show is reported as JSON-serializable event
+    dicts (``{"event": name, ...}``) to ``listeners``, so the same runtime
+    can drive a TUI in-process or clients over a socket (see ``RuntimeServer``).
+    Commands are plain method calls, or dicts passed to ``handle``.
+    """
+
+    def __init__(self, config: MarvizConfig, provider: BaseProvider | None = None) -> None:
+        """``provider`` replaces the LiteLLM provider for every agent (e.g. a stub in load tests)."""
+        self.config = config
+        # Shared by every session and worker
+        self._pool = (
+            ConnectionPool(
+                max_connections=config.max_sub_agents + 2,
+                keepalive_expiry=config.http_keepalive_seconds,
+            )
+            if config.http_pool
+            else None
+        )
+        self._needs_api_key = provider is None
+        self._provider = provider or LiteLLMProvider(
+            config.default_model,
+            config.stream_coalesce_ms,
+            config.api_base,
+            self._pool,
+            idle_timeout=config.stream_idle_timeout,
+            first_chunk_timeout=config.stream_first_chunk_timeout,
+        )
+        self._metrics = MetricsRecorder(config.metrics_file)
+        self._metrics.listeners.append(self._on_stream_metrics)
+        self._code_index = CodeSearchIndex(config.working_dir)
+        self._symbol_index = SymbolIndex()
+        self._code_index.listeners.append(self._symbol_index.on_file_changed)
+        self._retrieval_index = RetrievalIndex()
+        self._code_index.listeners.append(self._retrieval_index.on_file_changed)
+        self._git = GitTools(config.working_dir)
+        self._files = FileCache(config.file_cache_mb * 1024 * 1024)
+        self._commands = CommandRunner(
+            config.working_dir,
+            config.run_command_timeout,
+            config.run_command_env,
+            config.run_command_concurrency,
+        )
+        self._tracer = Tracer()
+        self._tracer.listeners.append(lambda span: self.emit("span", span=span))
+        self.listeners: list[Listener] = []
+        self._sessions: dict[str, ChatSession] = {}
+        self._session_numbers = itertools.count(1)
+        # Delegates waiting for a free worker slot, across all sessions, with the time queued
+        self._delegate_queue: deque[tuple[ChatSession, TaskNode, float]] = deque()
+        self._workers: dict[str, deque[dict]] = {}  # running agent_id -> transcript
+        self._worker_budgets: dict[str, BudgetMeter] = {}  # running agent_id -> usage
+        self._specialists = SpecialistPool(config.specialist_memory_chars)
+        self._tasks: set[asyncio.Task] = set()
+        self._progress_at = 0.0
+
+    # ── Lifecycle ──
+
+    async def start(self) -> None:
+        """Start background indexing; call from the loop the runtime runs on."""
+        self._spawn(self._build_code_index())
+        self._spawn(self._refresh_code_index())
+        self.prewarm()
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks) + [s.task for s in self._sessions.values() if s.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._pool is not None:
+            await self._pool.aclose()
+
+    def prewarm(self) -> None:
+        """Open provider connections in the background: one per worker plus the main agent."""
+        if self._pool is not None and MarvizConfig.has_api_key():
+            self._spawn(self._provider.prewarm(self.config.max_sub_agents + 1))
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    # ── Events ──
+
+    def emit(self, event: str, **fields) -> None:
+        message = {"event": event, **fields}
+        self._record(message)
+        for listener in list(self.listeners):
+            listener(message)
+
+    def _record(self, message: dict) -> None:
+        """Keep display events for replay, merging consecutive token events."""
+        event = message["event"]
+        if event in _SESSION_REPLAY:
+            session = self._sessions.get(message["session"])
+            transcript = session.transcript if session else None
+        elif event in _WORKER_REPLAY:
+            transcript = self._workers.get(message["agent_id"])
+        else:
+            return  # state events are replayed from current values instead
+        if transcript is None:
+            return
+        last = transcript[-1] if transcript else None
+        if last is not None and message["event"] in _TEXT_EVENTS and last["event"] == message["event"]:
+            last["text"] += message["text"]
+        else:
+            transcript.append(dict(message))
+
+    def attach(self, listener: Listener) -> None:
+        """Replay the current state to a new listener, then stream live events."""
+        listener({"event": "model", "name": self.config.default_model})
+        for session in self._sessions.values():
+            listener({"event": "session_opened", "session": session.session_id, "label": session.label})
+            for message in session.transcript:
+                listener(message)
+            listener({"event": "status", "session": session.session_id, "text": session.status})
+            listener({"event": "tokens", "session": session.session_id, "count": session.tokens})
+        for agent_id, transcript in self._workers.items():
+            for message in transcript:
+                listener(message)
+            meter = self._worker_budgets.get(agent_id)
+            if meter is not None:
+                listener({"event": "worker_budget", "agent_id": agent_id, "text": meter.summary()})
+        for span in self._tracer.spans():
+            listener({"event": "span", "span": span.to_event()})
+        listener({"event": "agents", "active": len(self._workers), "total": self.config.max_sub_agents})
+        listener(
+            {
+                "event": "attached",
+                "sessions": len(self._sessions),
+                "root": str(self.config.working_dir),
+            }
+        )
+        self.listeners.append(listener)
+
+    def detach(self, listener: Listener) -> None:
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def handle(self, command: dict) -> None:
+        """Run a protocol command (``{"op": ...}``)."""
+        op = command.get("op")
+        if op == "new_session":
+            self.new_session()
+        elif op == "close_session":
+            self.close_session(str(command.get("session", "")))
+        elif op == "prewarm":
+            self.prewarm()
+        elif op == "send":
+            self.send(str(command.get("session", "")), str(command.get("text", "")))
+
+    # ── Sessions ──
+
+    def new_session(self) -> str:
+        session_id = str(next(self._session_numbers))
+        agent = MainAgent(self._provider)
+        agent.metrics = self._metrics
+        agent.stream_resumes = self.config.stream_resumes
+        session = ChatSession(session_id, agent, f"Chat {session_id}")
+        agent.streamed_arguments["write_file"] = (
+            "content",
+            lambda fields: self._stage_write(session, fields),
+        )
+        self._sessions[session_id] = session
+        self._apply_repo_map(agent)
+        if self.config.retrieval_tokens:
+            agent.retrieve_context = self._retrieve_context
+        self.emit("session_opened", session=session_id, label=session.label)
+        if self._needs_api_key and not MarvizConfig.has_api_key():
+            self.emit(
+                "error",
+                session=session_id,
+                text="No API key found. Set ANTHROPIC_API_KEY (or other provider key) in .env",
+            )
+        return session_id
+
+    def close_session(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return
+        if session.task is not None:
+            session.task.cancel()
+        self._cancel_delegates(session)
+        self._tracer.end(session.trace, cancelled=True)
+        self._specialists.drop_session(session_id)
+        self.emit("session_closed", session=session_id)
+
+    def send(self, session_id: str, text: str) -> None:
+        session = self._sessions.get(session_id)
+        if session is None or not text:
+            return
+        self.emit("user", session=session_id, text=text)
+        if not session.titled:
+            session.titled = True
+            label = " ".join(text.split())
+            session.label = label[:16] + ("…" if len(label) > 16 else "")
+            self.emit("session_label", session=session_id, label=session.label)
+        self._run_agent(session, text)
+
+    def _set_status(self, session: ChatSession, text: str) -> None:
+        session.status = text
+        self.emit("status", session=session.session_id, text=text)
+
+    def _set_tokens(self, session: ChatSession, count: int) -> None:
+        session.tokens = count
+        self.emit("tokens", session=session.session_id, count=count)
+
+    # ── Code index ──
+
+    async def _build_code_index(self) -> None:
+        await asyncio.to_thread(self._code_index.build)
+        for session in list(self._sessions.values()):
+            self._apply_repo_map(session.agent)
+
+    async def _refresh_code_index(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.index_refresh_seconds)
+            if self._code_index.ready:
+                await asyncio.to_thread(self._code_index.refresh)
+
+    def _apply_repo_map(self, agent: BaseAgent) -> None:
+        """Prefix an agent's system prompt with the ranked repo map, if enabled.
+
+        A main agent only gets it before its first turn so the prompt
+        prefix (and any provider-side cache of it) stays stable afterwards.
+        """
+        if not self.config.repo_map_tokens or not self._code_index.ready:
+            return
+        if isinstance(agent, MainAgent) and len(agent.history) > 1:
+            return
+        repo_map = self._symbol_index.repo_map(self.config.repo_map_tokens)
+        if repo_map:
+            agent.set_system_context(f"## Repository map\n\n{repo_map}")
+
+    def _on_stream_metrics(self, metrics: StreamMetrics, finished: bool) -> None:
+        self.emit(
+            "latency",
+            label=metrics.worker or metrics.role,
+            ttft=metrics.ttft,
+            tokens_per_second=metrics.tokens_per_second if finished else None,
+            max_gap=metrics.max_gap if finished else None,
+        )
+
+    # ── Main agent ──
+
+    def _run_agent(self, session: ChatSession, text: str) -> None:
+        self._interrupt(session)
+        stream = session.agent.send(text)
+        session.budget = self._start_budget(session.agent, Budget.for_role(self.config, "main"))
+        self._tracer.end(session.trace, cancelled=True)
+        session.trace = self._tracer.begin("turn", "turn", session.label, text=text[:80])
+        self._start_turn(session, stream, "Thinking...", "respond")
+
+    def _start_turn(
+        self,
+        session: ChatSession,
+        stream: AsyncIterator[StreamChunk],
+        status_text: str,
+        phase: str,
+    ) -> None:
+        # A new turn replaces one still running in the same session
+        running = session.task
+        if running is not None and not running.done() and running is not asyncio.current_task():
+            running.cancel()
+        session.task = asyncio.get_running_loop().create_task(
+            self._agent_turn(session, stream, status_text, phase)
+        )
+
+    def _interrupt(self, session: ChatSession) -> None:
+        """Stop the work still running for a session's previous message.
+
+        The running turn and the session's delegates are cancelled, and
+        every tool call of the agent still waiting for a result gets one
+        (a finished delegate's own, else a cancellation note), so history
+        never has an unanswered call and nothing late is appended to it.
+        """
+        running = session.task
+        if running is not None and not running.done() and running is not asyncio.current_task():
+            running.cancel()
+        for tc in session.expected_tool_calls:
+            session.agent.add_tool_result(
+                tc.id, session.pending_results.get(tc.id, _CANCELLED_RESULT)
+            )
+        self._cancel_delegates(session)
+        session.agent.cancel_tool_calls(_CANCELLED_RESULT)
+
+    async def _agent_turn(
+        self,
+        session: ChatSession,
+        stream: AsyncIterator[StreamChunk],
+        status_text: str,
+        phase: str,
+    ) -> None:
+        """Stream one main-agent turn to the session's clients.
+
+        ``phase`` names the span of this stream in the turn's trace:
+        respond, continue (after tools) or synthesize (after delegates).
+        """
+        sid = session.session_id
+        agent = session.agent
+        meter = session.budget
+        turn = session.trace
+        span = self._tracer.begin(phase, "stream", session.label, turn)
+        self._set_status(session, status_text)
+        token_count = 0
+
+        try:
+            if meter is not None:
+                self._meter_call(agent, meter)
+            async for chunk in stream:
+                if chunk.type == "text":
+                    self.emit("token", session=sid, text=chunk.content)
+                    token_count += len(chunk.content) // 4
+                    if meter is not None:
+                        self._meter_output(agent, meter, chunk.content)
+                elif chunk.type == "tool_call":
+                    if meter is not None:
+                        self._meter_output(agent, meter, chunk.tool_args or "")
+                elif chunk.type == "error":
+                    self.emit("error", session=sid, text=chunk.content)
+                elif chunk.type == "notice":
+                    self._set_status(session, chunk.content)
+        except asyncio.CancelledError:
+            self._tracer.end(span, cancelled=True)
+            self._tracer.end(turn, cancelled=True)
+            self.emit("finish", session=sid)
+            self._set_status(session, "Ready")
+            raise
+        self._tracer.end(span, tokens=token_count)
+
+        self.emit("finish", session=sid)
+        self._set_tokens(session, token_count)
+
+        if session.agent.pending_tool_calls:
+            try:
+                await self._process_pending_tools(session)
+            except asyncio.CancelledError:
+                self._tracer.end(turn, cancelled=True)
+                raise
+            return
+
+        self._tracer.end(turn)
+        self._set_status(session, "Ready")
+        session.pending_results.clear()
+
+    # ── Tool processing ──
+
+    async def _process_pending_tools(self, session: ChatSession) -> None:
+        """Route pending tool calls: immediate tools execute now, delegates spawn sub-agents."""
+        tool_calls = list(session.agent.pending_tool_calls)
+        if self._refuse_over_budget(session.agent, session.budget, tool_calls):
+            self.emit("note", session=session.session_id, text="[budget] tool step budget reached")
+            self._continue_agent(session)
+            return
+
+        immediate_calls = [tc for tc in tool_calls if tc.name in _IMMEDIATE_TOOLS]
+        delegate_calls = [tc for tc in tool_calls if tc.name == "delegate_task"]
+
+        # Execute immediate tools (file ops) right away
+        wrote_file = False
+        sid = session.session_id
+        if immediate_calls:
+            with self._tracer.span("tools", "tools", session.label, session.trace) as tools_span:
+                for tc in immediate_calls:
+                    summary = self._tool_summary(tc)
+                    self.emit("note", session=sid, text=f"[tool] {tc.name}: {summary}")
+                    with self._tracer.span(
+                        tc.name, "tool", session.label, tools_span, summary=summary
+                    ) as tool_span:
+                        result = await self._run_tool(
+                            tc,
+                            lambda text: self.emit("tool_output", session=sid, text=text),
+                            tool_span,
+                        )
+                    session.agent.add_tool_result(tc.id, result)
+                    if tc.name in ("write_file", "edit_file", "run_command"):
+                        wrote_file = True
+
+        if wrote_file:
+            self.emit("files_changed")
+
+        if delegate_calls:
+            self._set_status(session, f"Delegating {len(delegate_calls)} task(s)...")
+            session.delegates_span = self._tracer.begin(
+                "delegates", "delegates", session.label, session.trace, count=len(delegate_calls)
+            )
+            self._dispatch_sub_agents(session, delegate_calls)
+            # _continue_agent will be called when all sub-agents finish
+        else:
+            # Only immediate tools — continue agent right away
+            self._continue_agent(session)
+
+    async def _run_tool(
+        self,
+        tc: AccumulatedToolCall,
+        on_output: Callable[[str], None] | None = None,
+        span: Span | None = None,
+    ) -> str:
+        """Execute a non-delegate tool; processes, searches and batch reads run off the loop.
+
+        ``on_output`` receives run_command's output as it arrives. The
+        tool's file-cache hits and misses are added to ``span``'s args.
+        """
+        if tc.name.startswith("git_"):
+            return await self._tool_git(tc.name, tc.arguments)
+        if tc.name == "run_command":
+            return await self._tool_run_command(tc.arguments, on_output)
+        if tc.name == "search_code":
+            # A regex scan over every indexed file can take a while
+            return await asyncio.to_thread(self._tool_search_code, tc.arguments)
+        stats = CacheStats()
+        if tc.name == "read_files":
+            # Waits on a thread pool reading the batch
+            result = await asyncio.to_thread(self._tool_read_files, tc.arguments, stats)
+        else:
+            result = self._execute_tool(tc, stats)
+        if span is not None and (stats.hits or stats.misses):
+            span.args.update(
+                cache_hits=stats.hits, cache_misses=stats.misses, cache_saved=stats.saved_bytes
+            )
+        return result
+
+    def _execute_tool(self, tc: AccumulatedToolCall, stats: CacheStats | None = None) -> str:
+        """Execute a non-delegate tool and return the result string."""
+        if tc.name == "write_file":
+            return self._tool_write_file(tc.arguments, tc.sink)
+        elif tc.name == "edit_file":
+            return self._tool_edit_file(tc.arguments, stats)
+        elif tc.name == "read_file":
+            return self._tool_read_file(tc.arguments, stats)
+        elif tc.name == "find_symbol":
+            return self._tool_find_symbol(tc.arguments)
+        elif tc.name == "retrieve":
+            return self._tool_retrieve(tc.arguments)
+        return f"Unknown tool: {tc.name}"
+
+    def _resolve(self, path: str) -> Path:
+        """Where a file tool's ``path`` points: relative paths are in the working directory."""
+        return resolve_path(path, self.config.working_dir)
+
+    def _tool_write_file(self, args: dict, staged: StagedFile | None = None) -> str:
+        path_str = args.get("path", "")
+        if not path_str:
+            if staged is not None:
+                staged.discard()
+            return "Error: path is required"
+        try:
+            p = self._resolve(path_str)
+            if staged is not None:
+                staged.commit(p)
+                chars = staged.chars
+                self._files.invalidate(p)
+            else:
+                content = args.get("content", "")
+                p.parent.mkdir(parents=True, exist_ok=True)
+                p.write_text(content, encoding="utf-8")
+                chars = len(content)
+                self._files.store(p, content)
+            self._code_index.update_path(p)
+            return f"Wrote {chars} chars to {p}"
+        except Exception as e:
+            if staged is not None:
+                staged.discard()
+            return f"Error writing file: {e}"
+
+    def _stage_write(self, session: ChatSession, fields: dict[str, str]) -> StagedFile:
+        """Sink for write_file content streamed by a main agent.
+
+        Staged next to the target when its directory exists, so the commit
+        is a plain rename; otherwise in the working directory.
+        """
+        path = fields.get("path", "")
+        directory = self._resolve(path).parent if path else self.config.working_dir
+        if not directory.is_dir():
+            directory = self.config.working_dir
+        label = Path(path).name if path else "file"
+        self._progress_at = 0.0
+
+        def progress(staged: StagedFile) -> None:
+            now = time.monotonic()
+            if now - self._progress_at >= 0.1:
+                self._progress_at = now
+                self._set_status(session, f"Writing {label}: {staged.size / 1024:.0f} KB")
+
+        return StagedFile(directory, on_progress=progress)
+
+    def _tool_edit_file(self, args: dict, stats: CacheStats | None = None) -> str:
+        path_str = args.get("path", "")
+        if not path_str:
+            return "Error: path is required"
+        try:
+            if args.get("diff"):
+                hunks = parse_unified_diff(args["diff"])
+            else:
+                hunks = [
+                    Hunk(e.get("search", ""), e.get("replace", ""))
+                    for e in args.get("edits") or []
+                ]
+            if not hunks:
+                return "Error: provide edits or diff"
+            p = self._resolve(path_str)
+            result = edit_file(p, hunks, self._files, stats)
+            self._code_index.update_path(p)
+        except EditError as e:
+            return f"Error: edit not applied, {e}"
+        except Exception as e:
+            return f"Error editing file: {e}"
+        summary = f"Edited {p}: {len(hunks)} hunk(s), +{result.added} -{result.removed} lines"
+        if result.fuzzy:
+            summary += " (" + "; ".join(result.fuzzy) + ")"
+        return summary
+
+    def _tool_read_file(self, args: dict, stats: CacheStats | None = None) -> str:
+        path_str = args.get("path", "")
+        if not path_str:
+            return "Error: path is required"
+        try:
+            p = self._resolve(path_str)
+            cached = self._files.read(p, stats)
+            if cached.lossy:
+                p.read_text(encoding="utf-8")  # raises the decode error
+            text = cached.text
+            if "\r" in text:  # universal newlines, as read_text would
+                text = text.replace("\r\n", "\n").replace("\r", "\n")
+            if len(text) > 10_000:
+                return text[:10_000] + f"\n... (truncated, {len(text)} chars total)"
+            return text
+        except Exception as e:
+            return f"Error reading file: {e}"
+
+    def _tool_read_files(self, args: dict, stats: CacheStats | None = None) -> str:
+        paths = args.get("paths") or []
+        if isinstance(paths, str):
+            paths = [paths]
+        if not paths:
+            return "Error: paths is required"
+        try:
+            batch = read_files(
+                [str(p) for p in paths],
+                self.config.working_dir,
+                self.config.read_files_budget,
+                cache=self._files,
+                stats=stats,
+            )
+        except Exception as e:
+            return f"Error reading files: {e}"
+        return format_batch(batch)
+
+    async def _tool_git(self, name: str, args: dict) -> str:
+        try:
+            if name == "git_status":
+                return await self._git.status()
+            if name == "git_diff":
+                paths = args.get("paths") or []
+                return await self._git.diff(
+                    [paths] if isinstance(paths, str) else [str(p) for p in paths],
+                    staged=bool(args.get("staged", False)),
+                    ref=args.get("ref") or None,
+                    context=int(args.get("context", 3)),
+                    max_hunks=int(args.get("max_hunks", 20)),
+                )
+            if name == "git_log":
+                return await self._git.log(
+                    args.get("path") or None, int(args.get("max_count", 20)), args.get("ref") or None
+                )
+            if name == "git_blame_range":
+                if not args.get("path"):
+                    return "Error: path is required"
+                return await self._git.blame_range(
+                    args["path"], int(args.get("start_line", 1)), int(args.get("end_line", 1))
+                )
+        except GitError as e:
+            return f"Error: {e}"
+        except (TypeError, ValueError) as e:
+            return f"Error: invalid arguments: {e}"
+        return f"Unknown tool: {name}"
+
+    async def _tool_run_command(
+        self, args: dict, on_output: Callable[[str], None] | None = None
+    ) -> str:
+        command = str(args.get("command") or "").strip()
+        if not command:
+            return "Error: command is required"
+        try:
+            timeout = float(args.get("timeout") or 0)
+        except (TypeError, ValueError):
+            timeout = 0.0
+        try:
+            result = await self._commands.run(command, timeout, on_output)
+        except OSError as e:
+            return f"Error running command: {e}"
+        finally:
+            self._forget_workspace_state()
+        if on_output is not None:
+            on_output(f"[{result.status}]\n")
+        return result.excerpt()
+
+    def _forget_workspace_state(self) -> None:
+        """A command may have changed any file: drop cached contents and git results, re-index."""
+        self._files.clear()
+        self._git.clear_cache()
+        if self._code_index.ready:
+            self._spawn(asyncio.to_thread(self._code_index.refresh))
+
+    def _tool_search_code(self, args: dict) -> str:
+        query = args.get("query", "")
+        if not query:
+            return "Error: query is required"
+        if not self._code_index.ready:
+            return "Error: code index is still building, try again shortly"
+        try:
+            matches = self._code_index.search(
+                query,
+                regex=bool(args.get("regex", False)),
+                glob=args.get("glob") or None,
+                ignore_case=bool(args.get("ignore_case", False)),
+                context=int(args.get("context", 2)),
+            )
+        except Exception as e:
+            return f"Error searching code: {e}"
+        return format_matches(matches)
+
+    def _tool_find_symbol(self, args: dict) -> str:
+        name = args.get("name", "")
+        if not name:
+            return "Error: name is required"
+        if not self._code_index.ready:
+            return "Error: symbol index is still building, try again shortly"
+        return format_symbols(self._symbol_index.find(name, kind=args.get("kind") or None))
+
+    def _tool_retrieve(self, args: dict) -> str:
+        query = args.get("query", "")
+        if not query:
+            return "Error: query is required"
+        if not self._code_index.ready:
+            return "Error: retrieval index is still building, try again shortly"
+        try:
+            k = max(1, min(int(args.get("k", 5)), 20))
+        except (TypeError, ValueError):
+            k = 5
+        return format_hits(self._retrieval_index.search(query, k, glob=args.get("glob") or None))
+
+    def _retrieve_context(self, text: str) -> str:
+        """Top-k snippets for a user message, within the configured token budget."""
+        if not self._code_index.ready:
+            return ""
+        hits = self._retrieval_index.search(text, self.config.retrieval_top_k)
+        return format_hits(hits, self.config.retrieval_tokens) if hits else ""
+
+    @staticmethod
+    def _tool_summary(tc: AccumulatedToolCall) -> str:
+        if tc.name in ("write_file", "edit_file"):
+            return tc.arguments.get("path", "?")
+        elif tc.name == "read_file":
+            return tc.arguments.get("path", "?")
+        elif tc.name == "read_files":
+            paths = tc.arguments.get("paths") or []
+            return ", ".join(paths) if isinstance(paths, list) else str(paths)
+        elif tc.name == "search_code":
+            return tc.arguments.get("query", "?")
+        elif tc.name == "git_diff":
+            paths = tc.arguments.get("paths") or []
+            return (", ".join(paths) if isinstance(paths, list) else str(paths)) or "working tree"
+        elif tc.name == "git_log":
+            return tc.arguments.get("path") or "HEAD"
+        elif tc.name == "git_blame_range":
+            args = tc.arguments
+            return f"{args.get('path', '?')}:{args.get('start_line', '?')}-{args.get('end_line', '?')}"
+        elif tc.name == "git_status":
+            return "working tree"
+        elif tc.name == "find_symbol":
+            return tc.arguments.get("name", "?")
+        elif tc.name == "retrieve":
+            return tc.arguments.get("query", "?")
+        elif tc.name == "run_command":
+            return str(tc.arguments.get("command", "?"))[:80]
+        return str(tc.arguments)[:80]
+
+    # ── Budgets ──
+
+    def _start_budget(self, agent: BaseAgent, budget: Budget) -> BudgetMeter:
+        """Meter a run of ``agent``; call after ``send``, which clears the agent's deadline."""
+        meter = BudgetMeter(budget, self._provider.price())
+        if meter.deadline is not None:
+            agent.stop(f"time budget of {budget.max_seconds:g}s reached", at=meter.deadline)
+        return meter
+
+    @staticmethod
+    def _meter_call(agent: BaseAgent, meter: BudgetMeter) -> None:
+        """Count the prompt of the provider call about to start; stop if it spends the budget."""
+        meter.start_call(agent.history)
+        reason = meter.exceeded()
+        if reason and agent.stopped is None:
+            agent.stop(reason)
+
+    @staticmethod
+    def _meter_output(agent: BaseAgent, meter: BudgetMeter, text: str) -> None:
+        if agent.stopped is not None:
+            return  # the truncation label
+        meter.add_output(text)
+        reason = meter.exceeded()
+        if reason:
+            agent.stop(reason)
+
+    @staticmethod
+    def _refuse_over_budget(
+        agent: BaseAgent, meter: BudgetMeter | None, tool_calls: list[AccumulatedToolCall]
+    ) -> bool:
+        """Count a round of tool calls; past the step budget, answer them with an error instead.
+
+        The first round over budget asks the model to answer with what it
+        has; if it calls tools again, its next turn is stopped.
+        """
+        over = meter.tool_step() if meter is not None else 0
+        if not over:
+            return False
+        for tc in tool_calls:
+            agent.add_tool_result(tc.id, _STEP_BUDGET_RESULT)
+        if over > 1:
+            agent.stop(f"tool step budget of {meter.budget.max_tool_steps} reached")
+        return True
+
+    def _report_budget(self, agent_id: str, meter: BudgetMeter) -> None:
+        self.emit("worker_budget", agent_id=agent_id, text=meter.summary())
+
+    # ── Sub-agent delegation ──
+
+    def _dispatch_sub_agents(
+        self, session: ChatSession, tool_calls: list[AccumulatedToolCall]
+    ) -> None:
+        """Schedule a session's delegate_task calls on the shared worker pool.
+
+        Tasks without dependencies are queued at once; the rest are queued
+        by ``_queue_ready_tasks`` as their dependencies complete.
+        """
+        session.expected_tool_calls = list(tool_calls)
+        session.pending_results.clear()
+        try:
+            session.task_graph = TaskGraph(tool_calls)
+        except TaskGraphError as exc:
+            session.task_graph = None
+            for tc in tool_calls:
+                session.pending_results[tc.id] = f"Error: {exc}"
+            self._check_all_completed(session)
+            return
+        self._queue_ready_tasks(session)
+
+    def _queue_ready_tasks(self, session: ChatSession) -> None:
+        graph = session.task_graph
+        if graph is not None:
+            now = self._tracer.now()
+            self._delegate_queue.extend((session, node, now) for node in graph.ready())
+        self._start_queued_delegates()
+
+    def _start_queued_delegates(self) -> None:
+        """Start queued delegates, oldest first, while worker slots are free.
+
+        A task for a persistent worker goes to that worker, keeping its
+        context, and waits while the worker is busy with another task.
+        """
+        waiting: list[tuple[ChatSession, TaskNode, float]] = []
+        while self._delegate_queue and len(self._workers) < self.config.max_sub_agents:
+            item = self._delegate_queue.popleft()
+            session, node, queued_at = item
+            tc = node.tool_call
+            key = (session.session_id, tc.arguments.get("worker_name", "Worker"))
+            persistent = tc.arguments.get("persistent") is True or key in self._specialists
+            if persistent and self._specialists.busy(*key):
+                waiting.append(item)
+                continue
+            agent_id = f"sub-{uuid.uuid4().hex[:8]}"
+            task = session.task_graph.prompt(node)
+            sub_agent = self._specialists.checkout(*key) if persistent else None
+            resumed = sub_agent is not None
+            if sub_agent is not None:
+                compacted = sub_agent.assign(
+                    agent_id, task, self.config.specialist_history_chars
+                )
+            else:
+                sub_agent = SubAgent(
+                    provider=self._provider, agent_id=agent_id, worker_name=key[1], task=task
+                )
+                sub_agent.metrics = self._metrics
+                sub_agent.stream_resumes = self.config.stream_resumes
+                self._apply_repo_map(sub_agent)
+            self._workers[sub_agent.agent_id] = deque(maxlen=_TRANSCRIPT_EVENTS)
+            self.emit(
+                "worker_started",
+                agent_id=sub_agent.agent_id,
+                name=sub_agent.worker_name,
+                session=session.session_id,
+            )
+            if resumed:
+                summary = f"continuing after {sub_agent.tasks_done} earlier task(s)"
+                if compacted:
+                    summary += f", history compacted by {compacted:,} chars"
+                self.emit("worker_tool", agent_id=agent_id, name="context", summary=summary)
+            budget = Budget.for_role(self.config, "worker").narrowed(tc.arguments.get("budget"))
+            track = f"{sub_agent.worker_name} ({sub_agent.agent_id})"
+            if self._tracer.now() - queued_at > 0.001:
+                self._tracer.end(
+                    self._tracer.begin(
+                        "queued", "queued", track, session.delegates_span, start=queued_at
+                    )
+                )
+            span = self._tracer.begin(
+                sub_agent.worker_name,
+                "worker",
+                track,
+                session.delegates_span,
+                task=node.name,
+                resumed=resumed,
+            )
+            session.workers[tc.id] = self._spawn(
+                self._run_sub_agent(
+                    sub_agent, session.session_id, tc.id, budget, span, persistent
+                )
+            )
+        self._delegate_queue.extendleft(reversed(waiting))
+        self.emit("agents", active=len(self._workers), total=self.config.max_sub_agents)
+
+    async def _run_sub_agent(
+        self,
+        agent: SubAgent,
+        session_id: str,
+        tool_call_id: str,
+        budget: Budget,
+        span: Span,
+        persistent: bool = False,
+    ) -> None:
+        """Run a sub-agent within its budget and stream its output as worker events.
+
+        A persistent worker goes back to the pool afterwards, unless it
+        failed (its history may end in an unanswered tool call).
+        """
+        agent_id = agent.agent_id
+        parts: list[str] = []
+        failed = False
+        phase = "respond"
+
+        try:
+            stream = agent.send(agent.task)
+            meter = self._worker_budgets[agent_id] = self._start_budget(agent, budget)
+            while True:
+                self._meter_call(agent, meter)
+                step = self._tracer.begin(phase, "stream", span.track, span)
+                async for chunk in stream:
+                    if chunk.type == "text":
+                        parts.append(chunk.content)
+                        self.emit("worker_token", agent_id=agent_id, text=chunk.content)
+                        self._meter_output(agent, meter, chunk.content)
+                    elif chunk.type == "tool_call":
+                        self._meter_output(agent, meter, chunk.tool_args or "")
+                    elif chunk.type == "error":
+                        self.emit("worker_error", agent_id=agent_id, text=chunk.content)
+                        parts.append(f"\nERROR: {chunk.content}")
+                        failed = True
+                    if meter.should_report():
+                        self._report_budget(agent_id, meter)
+                self._tracer.end(step)
+
+                if not agent.pending_tool_calls:
+                    break
+                if self._refuse_over_budget(agent, meter, agent.pending_tool_calls):
+                    self.emit(
+                        "worker_tool", agent_id=agent_id, name="budget", summary="tool steps used up"
+                    )
+                else:
+                    for tc in agent.pending_tool_calls:
+                        self.emit(
+                            "worker_tool",
+                            agent_id=agent_id,
+                            name=tc.name,
+                            summary=self._tool_summary(tc),
+                        )
+                        if tc.name not in _WORKER_TOOL_NAMES:
+                            agent.add_tool_result(
+                                tc.id, f"Error: {tc.name} is not available to workers"
+                            )
+                            continue
+                        with self._tracer.span(
+                            tc.name, "tool", span.track, span, summary=self._tool_summary(tc)
+                        ) as tool_span:
+                            result = await self._run_tool(
+                                tc,
+                                lambda text: self.emit("worker_output", agent_id=agent_id, text=text),
+                                tool_span,
+                            )
+                        agent.add_tool_result(tc.id, result)
+                self._report_budget(agent_id, meter)
+                stream = agent.continue_after_tools()
+                phase = "continue"
+
+            self._report_budget(agent_id, meter)
+            self.emit("worker_finished", agent_id=agent_id, name=agent.worker_name)
+
+        except asyncio.CancelledError:
+            self._end_worker_spans(span, cancelled=True)
+            if persistent:
+                self._specialists.release(session_id, agent.worker_name, None)
+            self.emit("worker_error", agent_id=agent_id, text="cancelled")
+            self._release_worker(agent_id)
+            raise
+        except Exception as exc:
+            parts = [f"Error: {exc}"]
+            failed = True
+            self.emit("worker_error", agent_id=agent_id, text=str(exc))
+        full_response = "".join(parts)
+        self._end_worker_spans(span, failed=failed, truncated=agent.stopped)
+        if persistent:
+            keep = not failed and session_id in self._sessions
+            agent.tasks_done += keep
+            self._specialists.release(session_id, agent.worker_name, agent if keep else None)
+
+        self._on_sub_agent_completed(
+            agent_id, session_id, tool_call_id, full_response or "(no output)", failed
+        )
+
+    def _end_worker_spans(self, span: Span, **args) -> None:
+        """End a worker's span and any step of it left open by an error."""
+        for open_span in self._tracer.spans():
+            if open_span.parent_id == span.span_id:
+                self._tracer.end(open_span)
+        self._tracer.end(span, **args)
+
+    def _on_sub_agent_completed(
+        self, agent_id: str, session_id: str, tool_call_id: str, result: str, failed: bool = False
+    ) -> None:
+        """Handle sub-agent completion: record the result, start dependents, check if all done."""
+        self._release_worker(agent_id)
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.workers.pop(tool_call_id, None)
+        graph = session.task_graph if session is not None else None
+        if graph is None or tool_call_id not in graph:  # session closed or moved on
+            self._start_queued_delegates()
+            return
+        skipped = graph.complete(tool_call_id, result, failed)
+        for node in (graph.node(tool_call_id), *skipped):
+            session.pending_results[node.tool_call.id] = node.result or ""
+        self._queue_ready_tasks(session)
+        self._check_all_completed(session)
+
+    def _release_worker(self, agent_id: str) -> None:
+        self._workers.pop(agent_id, None)
+        self._worker_budgets.pop(agent_id, None)
+        self.emit("worker_released", agent_id=agent_id)
+
+    def _cancel_delegates(self, session: ChatSession) -> None:
+        """Unqueue a session's waiting delegates, cancel its running ones and forget them all."""
+        self._tracer.end(session.delegates_span, cancelled=True)
+        session.delegates_span = None
+        self._delegate_queue = deque(
+            item for item in self._delegate_queue if item[0] is not session
+        )
+        for task in session.workers.values():
+            task.cancel()
+            # The slot is free once the worker has unwound
+            task.add_done_callback(lambda _task: self._start_queued_delegates())
+        session.workers.clear()
+        session.expected_tool_calls.clear()
+        session.pending_results.clear()
+        session.task_graph = None
+
+    def _check_all_completed(self, session: ChatSession) -> None:
+        """If all expected delegate calls have results, hand them over and continue.
+
+        Results consumed by a dependent task are replaced by a short note, so
+        only the final stage of a pipeline reaches the main agent's context.
+        """
+        expected_ids = {tc.id for tc in session.expected_tool_calls}
+        if expected_ids and expected_ids <= set(session.pending_results.keys()):
+            self._tracer.end(session.delegates_span)
+            session.delegates_span = None
+            graph = session.task_graph
+            with self._tracer.span("handoff", "handoff", session.label, session.trace):
+                for tc in session.expected_tool_calls:
+                    result = session.pending_results[tc.id]
+                    if graph is not None:
+                        result = graph.handoff(graph.node(tc.id))
+                    session.agent.add_tool_result(tc.id, result)
+            session.expected_tool_calls.clear()
+            session.task_graph = None
+            self._continue_agent(session, "synthesize")
+
+    # ── Continue after tools ──
+
+    def _continue_agent(self, session: ChatSession, phase: str = "continue") -> None:
+        """Resume a session's MainAgent after tool results are in."""
+        self._start_turn(
+            session, session.agent.continue_after_tools(), "Synthesizing...", phase
+        )
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, fields
+
+from ..agents.history import history_chars
+from ..config import MarvizConfig
+
+# Seconds between budget updates sent to the UI while an agent streams
+_REPORT_INTERVAL = 0.25
+
+
+@dataclass(frozen=True)
+class Budget:
+    """Limits for one agent run (a worker's task, or a main-agent turn); 0 = unlimited."""
+
+    max_tokens: int = 0  # output tokens, estimated as chars / 4
+    max_seconds: float = 0.0
+    max_tool_steps: int = 0  # rounds of tool calls
+    max_dollars: float = 0.0
+
+    @classmethod
+    def for_role(cls, config: MarvizConfig, role: str) -> Budget:
+        """The configured budget for ``role`` ("main" or "worker")."""
+        return cls(
+            getattr(config, f"{role}_max_tokens"),
+            getattr(config, f"{role}_max_seconds"),
+            getattr(config, f"{role}_max_tool_steps"),
+            getattr(config, f"{role}_max_dollars"),
+        )
+
+    def narrowed(self, limits: object) -> Budget:
+        """This budget tightened by a delegate call's ``budget`` argument.
+
+        A requested limit replaces an unlimited one and otherwise only
+        applies when it is lower; malformed values are ignored.
+        """
+        if not isinstance(limits, dict):
+            return self
+        values = {}
+        for f in fields(self):
+            current = getattr(self, f.name)
+            value = limits.get(f.name)
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                values[f.name] = current
+                continue
+            value = type(current)(value)
+            values[f.name] = min(current, value) if current else value
+        return Budget(**values)
+
+
+def _tokens(n: int) -> str:
+    return f"{n / 1000:.1f}k" if n >= 1000 else str(n)
+
+
+def _dollars(d: float) -> str:
+    return f"${d:.2f}" if d >= 0.01 or not d else f"${d:.4f}"
+
+
+def _seconds(s: float) -> str:
+    return f"{int(s) // 60}:{int(s) % 60:02d}"
+
+
+class BudgetMeter:
+    """Live usage of one agent run against its ``Budget``.
+
+    Output is counted as it streams; input tokens are estimated from the
+    messages each provider call is sent. Dollars need the model's prices
+    (``BaseProvider.price``); without them the dollar limit is not enforced.
+    """
+
+    def __init__(self, budget: Budget, price: tuple[float, float] | None = None) -> None:
+        self.budget = budget
+        self.price = price
+        self.started = time.monotonic()
+        self.tool_steps = 0
+        self._input_tokens = 0
+        self._output_chars = 0
+        self._reported_at = 0.0
+
+    @property
+    def tokens(self) -> int:
+        return self._output_chars // 4
+
+    @property
+    def seconds(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def dollars(self) -> float:
+        if self.price is None:
+            return 0.0
+        return self._input_tokens * self.price[0] + self.tokens * self.price[1]
+
+    @property
+    def deadline(self) -> float | None:
+        """``time.monotonic()`` at which the time budget runs out."""
+        return self.started + self.budget.max_seconds if self.budget.max_seconds else None
+
+    def start_call(self, messages: list[dict]) -> None:
+        if self.price is not None:  # input is only counted toward dollars
+            self._input_tokens += history_chars(messages) // 4
+
+    def add_output(self, text: str) -> None:
+        self._output_chars += len(text)
+
+    def tool_step(self) -> int:
+        """Count a round of tool calls; returns how many rounds past the step budget it is."""
+        self.tool_steps += 1
+        if not self.budget.max_tool_steps:
+            return 0
+        return max(0, self.tool_steps - self.budget.max_tool_steps)
+
+    def exceeded(self) -> str | None:
+        """Which token, time or dollar limit has been reached, if any."""
+        b = self.budget
+        if b.max_tokens and self.tokens >= b.max_tokens:
+            return f"output budget of {b.max_tokens:,} tokens reached"
+        if b.max_seconds and self.seconds >= b.max_seconds:
+            return f"time budget of {b.max_seconds:g}s reached"
+        if b.max_dollars and self.price is not None and self.dollars >= b.max_dollars:
+            return f"cost budget of {_dollars(b.max_dollars)} reached"
+        return None
+
+    def should_report(self) -> bool:
+        """Rate-limits live updates: true at most every _REPORT_INTERVAL seconds."""
+        now = time.monotonic()
+        if now - self._reported_at < _REPORT_INTERVAL:
+            return False
+        self._reported_at = now
+        return True
+
+    def summary(self) -> str:
+        """Usage for a panel header, e.g. ``1.2k/4.0k tok · 0:35/2:00 · 3/8 steps · $0.02``."""
+        b = self.budget
+        tokens = _tokens(self.tokens) + (f"/{_tokens(b.max_tokens)}" if b.max_tokens else "")
+        parts = [f"{tokens} tok", _seconds(self.seconds)]
+        if b.max_seconds:
+            parts[-1] += f"/{_seconds(b.max_seconds)}"
+        if b.max_tool_steps:
+            parts.append(f"{min(self.tool_steps, b.max_tool_steps)}/{b.max_tool_steps} steps")
+        if self.price is not None:
+            limit = f"/{_dollars(b.max_dollars)}" if b.max_dollars else ""
+            parts.append(_dollars(self.dollars) + limit)
+        return " · ".join(parts)
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+from .agent_runtime import Listener
+from .protocol import MAX_LINE, decode, encode
+
+
+class RuntimeClient:
+    """Talks to a ``RuntimeServer``; mirrors the command API of ``AgentRuntime``.
+
+    Events from the daemon are delivered to ``listeners`` on the loop that
+    called ``connect``. A lost connection is reported as a
+    ``{"event": "disconnected"}`` event. ``root`` is the directory the
+    client works in; the daemon refuses to attach it when its own differs.
+    """
+
+    def __init__(self, path: Path, root: Path | None = None) -> None:
+        self.path = path
+        self.root = root
+        self.listeners: list[Listener] = []
+        self._writer: asyncio.StreamWriter | None = None
+        self._reader_task: asyncio.Task | None = None
+
+    async def connect(self) -> None:
+        reader, self._writer = await asyncio.open_unix_connection(str(self.path), limit=MAX_LINE)
+        self._reader_task = asyncio.get_running_loop().create_task(self._read(reader))
+
+    async def start(self) -> None:
+        await self.connect()
+
+    async def stop(self) -> None:
+        """Detach; the daemon and its sessions keep running."""
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+
+    def attach(self, listener: Listener) -> None:
+        self.listeners.append(listener)
+        if self.root is None:
+            self._send({"op": "attach"})
+        else:
+            self._send({"op": "attach", "root": str(self.root)})
+
+    def detach(self, listener: Listener) -> None:
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def new_session(self) -> None:
+        self._send({"op": "new_session"})
+
+    def close_session(self, session_id: str) -> None:
+        self._send({"op": "close_session", "session": session_id})
+
+    def send(self, session_id: str, text: str) -> None:
+        self._send({"op": "send", "session": session_id, "text": text})
+
+    def prewarm(self) -> None:
+        self._send({"op": "prewarm"})
+
+    async def shutdown(self) -> None:
+        """Ask the daemon to exit."""
+        self._send({"op": "shutdown"})
+        if self._writer is not None:
+            await self._writer.drain()
+
+    def _send(self, message: dict) -> None:
+        if self._writer is not None and not self._writer.is_closing():
+            self._writer.write(encode(message))
+
+    async def _read(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while line := await reader.readline():
+                message = decode(line)
+                if message is not None:
+                    for listener in list(self.listeners):
+                        listener(message)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        for listener in list(self.listeners):
+            listener({"event": "disconnected"})
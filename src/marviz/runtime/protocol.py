@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+import json
+
+# Longest accepted protocol line; a written file's content never travels as one event
+MAX_LINE = 16 * 1024 * 1024
+
+
+def encode(message: dict) -> bytes:
+    """One protocol message: compact JSON terminated by a newline."""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def decode(line: bytes) -> dict | None:
+    try:
+        message = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return message if isinstance(message, dict) else None
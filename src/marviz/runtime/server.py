@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+import signal
+import socket
+from pathlib import Path
+
+from .agent_runtime import AgentRuntime
+from .protocol import MAX_LINE, decode, encode
+
+# A client this far behind on output is dropped; it can reattach and replay
+_MAX_CLIENT_BUFFER = 8 * 1024 * 1024
+
+
+def socket_is_live(path: Path) -> bool:
+    """True if something accepts connections on the Unix socket at ``path``."""
+    if not path.exists():
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        probe.settimeout(0.5)
+        try:
+            probe.connect(str(path))
+        except OSError:
+            return False
+    return True
+
+
+class RuntimeServer:
+    """Serves an ``AgentRuntime`` to TUI clients over a Unix socket.
+
+    The protocol is newline-delimited JSON in both directions. A client
+    sends ``{"op": "attach", "root": "/its/cwd"}`` to receive a replay of
+    the current sessions followed by live events, then commands such as
+    ``{"op": "send", "session": "1", "text": "..."}``. Any number of clients
+    may attach; each sees every session's events. The agents work in the
+    daemon's directory, so a client started in another one is refused with
+    an ``attach_refused`` event naming the daemon's root, and disconnected.
+    """
+
+    def __init__(self, runtime: AgentRuntime, path: Path) -> None:
+        self.runtime = runtime
+        self.path = path
+        self._server: asyncio.AbstractServer | None = None
+        self._clients: set[asyncio.StreamWriter] = set()
+        self._stopped = asyncio.Event()
+
+    async def start(self) -> None:
+        if socket_is_live(self.path):
+            raise RuntimeError(f"a daemon is already listening on {self.path}")
+        # Only the owner may reach the socket: the daemon runs commands and writes files
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        with contextlib.suppress(FileNotFoundError):
+            self.path.unlink()  # stale socket from a daemon that died
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(str(self.path))
+            # Restricted before listening, so no connection is accepted with looser permissions
+            os.chmod(self.path, 0o600)
+            self._server = await asyncio.start_unix_server(
+                self._serve_client, sock=sock, limit=MAX_LINE
+            )
+        except BaseException:
+            sock.close()
+            raise
+
+    def request_stop(self) -> None:
+        self._stopped.set()
+
+    async def serve_forever(self) -> None:
+        await self._stopped.wait()
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._clients):
+                writer.close()
+            await self._server.wait_closed()
+        with contextlib.suppress(FileNotFoundError):
+            self.path.unlink()
+        self._stopped.set()
+
+    async def _serve_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        def send(message: dict) -> None:
+            if writer.is_closing():
+                return
+            if writer.transport.get_write_buffer_size() > _MAX_CLIENT_BUFFER:
+                writer.close()
+                return
+            writer.write(encode(message))
+
+        attached = False
+        self._clients.add(writer)
+        try:
+            while line := await reader.readline():
+                command = decode(line)
+                if command is None:
+                    continue
+                op = command.get("op")
+                if op == "attach" and not attached:
+                    refusal = self._refuse_attach(command.get("root"))
+                    if refusal is not None:
+                        send(refusal)
+                        await writer.drain()
+                        break
+                    attached = True
+                    self.runtime.attach(send)
+                elif op == "shutdown":
+                    self.request_stop()
+                else:
+                    self.runtime.handle(command)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self._clients.discard(writer)
+            self.runtime.detach(send)
+            writer.close()
+
+
+    def _refuse_attach(self, root: str | None) -> dict | None:
+        """The refusal for a client working in ``root``, or None if it may attach."""
+        workspace = self.runtime.config.working_dir.resolve()
+        if root is None or Path(root).resolve() == workspace:
+            return None
+        return {
+            "event": "attach_refused",
+            "root": str(workspace),
+            "text": (
+                f"The marviz daemon works in {workspace}, not in {root}. "
+                "Start marviz there, or use --local to run agents here."
+            ),
+        }
+
+
+async def run_daemon(runtime: AgentRuntime, path: Path) -> None:
+    """Serve ``runtime`` on ``path`` until SIGINT/SIGTERM or a shutdown command."""
+    server = RuntimeServer(runtime, path)
+    await runtime.start()
+    await server.start()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, server.request_stop)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.stop()
+        await runtime.stop()
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+
+from ..agents.history import history_chars
+from ..agents.sub_agent import SubAgent
+
+
+class SpecialistPool:
+    """Persistent workers of each session, by name, kept while idle.
+
+    A worker is checked out while it runs a task and released afterwards.
+    Idle workers count against ``max_chars`` (the size of their histories)
+    and the least recently used ones are evicted when it is exceeded;
+    running workers are never evicted. Names are case-insensitive.
+    """
+
+    def __init__(self, max_chars: int) -> None:
+        self.max_chars = max_chars
+        self._idle: OrderedDict[tuple[str, str], tuple[SubAgent, int]] = OrderedDict()
+        self._busy: set[tuple[str, str]] = set()
+        self._chars = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _key(session_id: str, name: str) -> tuple[str, str]:
+        return session_id, name.strip().lower()
+
+    @property
+    def chars(self) -> int:
+        """History size of the idle workers."""
+        return self._chars
+
+    def __contains__(self, key: tuple[str, str]) -> bool:
+        key = self._key(*key)
+        return key in self._idle or key in self._busy
+
+    def busy(self, session_id: str, name: str) -> bool:
+        return self._key(session_id, name) in self._busy
+
+    def checkout(self, session_id: str, name: str) -> SubAgent | None:
+        """Mark the worker busy; returns it when one is idle (None starts a new one)."""
+        key = self._key(session_id, name)
+        self._busy.add(key)
+        entry = self._idle.pop(key, None)
+        if entry is None:
+            return None
+        self._chars -= entry[1]
+        return entry[0]
+
+    def release(self, session_id: str, name: str, agent: SubAgent | None) -> None:
+        """Return a checked-out worker; None (e.g. after a failure) forgets it."""
+        key = self._key(session_id, name)
+        self._busy.discard(key)
+        if agent is None:
+            return
+        size = history_chars(agent.history)
+        self._idle[key] = (agent, size)
+        self._chars += size
+        while self._chars > self.max_chars and self._idle:
+            _, (_, evicted_size) = self._idle.popitem(last=False)
+            self._chars -= evicted_size
+            self.evicted += 1
+
+    def drop_session(self, session_id: str) -> None:
+        for key in [k for k in self._idle if k[0] == session_id]:
+            self._chars -= self._idle.pop(key)[1]
+        self._busy = {k for k in self._busy if k[0] != session_id}
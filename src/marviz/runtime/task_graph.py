@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+from ..agents.types import AccumulatedToolCall
+
+# Upstream results longer than this are cut before being handed to a dependent task
+_MAX_UPSTREAM_CHARS = 20_000
+
+
+class TaskGraphError(ValueError):
+    """The delegate_task calls of one turn do not form a valid DAG."""
+
+
+@dataclass
+class TaskNode:
+    """One delegate_task call and its place in the graph."""
+
+    tool_call: AccumulatedToolCall
+    name: str  # task_id given by the model, or the tool call id
+    depends_on: list[str] = field(default_factory=list)  # names
+    dependents: list[str] = field(default_factory=list)  # names
+    started: bool = False
+    result: str | None = None
+    failed: bool = False
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+
+class TaskGraph:
+    """Dependency graph of the delegate_task calls issued in one assistant turn.
+
+    Each call may name itself with ``task_id`` and list the ``task_id``s it
+    ``depends_on``. ``ready`` hands out tasks whose dependencies have all
+    succeeded; ``complete`` records a result and fails every task that
+    transitively depends on a failed one, so the batch always finishes.
+    """
+
+    def __init__(self, tool_calls: list[AccumulatedToolCall]) -> None:
+        self.nodes: dict[str, TaskNode] = {}
+        self._by_call: dict[str, str] = {}  # tool call id -> name
+        for tc in tool_calls:
+            name = str(tc.arguments.get("task_id") or tc.id)
+            if name in self.nodes:
+                raise TaskGraphError(f"duplicate task_id '{name}'")
+            depends_on = tc.arguments.get("depends_on") or []
+            if isinstance(depends_on, str):
+                depends_on = [depends_on]
+            self.nodes[name] = TaskNode(tc, name, [str(d) for d in depends_on])
+            self._by_call[tc.id] = name
+        for node in self.nodes.values():
+            for dep in node.depends_on:
+                if dep not in self.nodes:
+                    raise TaskGraphError(f"task '{node.name}' depends on unknown task_id '{dep}'")
+                if dep == node.name:
+                    raise TaskGraphError(f"task '{node.name}' depends on itself")
+                self.nodes[dep].dependents.append(node.name)
+        self._check_acyclic()
+
+    def _check_acyclic(self) -> None:
+        remaining = {name: len(node.depends_on) for name, node in self.nodes.items()}
+        ready = [name for name, count in remaining.items() if count == 0]
+        while ready:
+            name = ready.pop()
+            del remaining[name]
+            for dependent in self.nodes[name].dependents:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        if remaining:
+            raise TaskGraphError(f"dependency cycle among tasks {', '.join(sorted(remaining))}")
+
+    def __contains__(self, tool_call_id: str) -> bool:
+        return tool_call_id in self._by_call
+
+    def node(self, tool_call_id: str) -> TaskNode:
+        return self.nodes[self._by_call[tool_call_id]]
+
+    def ready(self) -> list[TaskNode]:
+        """Mark and return every task that can start now."""
+        ready = []
+        for node in self.nodes.values():
+            if node.started or node.done:
+                continue
+            if all(self.nodes[dep].done and not self.nodes[dep].failed for dep in node.depends_on):
+                node.started = True
+                ready.append(node)
+        return ready
+
+    def complete(self, tool_call_id: str, result: str, failed: bool = False) -> list[TaskNode]:
+        """Record a task's result; returns the tasks skipped because of it."""
+        node = self.node(tool_call_id)
+        node.result = result
+        node.failed = failed
+        skipped: list[TaskNode] = []
+        if failed:
+            self._skip_dependents(node, skipped)
+        return skipped
+
+    def _skip_dependents(self, node: TaskNode, skipped: list[TaskNode]) -> None:
+        for name in node.dependents:
+            dependent = self.nodes[name]
+            if dependent.done:
+                continue
+            dependent.result = f"Error: not run because task '{node.name}' failed"
+            dependent.failed = True
+            skipped.append(dependent)
+            self._skip_dependents(dependent, skipped)
+
+    def handoff(self, node: TaskNode) -> str:
+        """What the main agent gets for a task: its result, unless a dependent consumed it."""
+        consumers = [name for name in node.dependents if self.nodes[name].started]
+        if node.failed or not consumers:
+            return node.result or ""
+        return f"(intermediate result, passed to {', '.join(consumers)})"
+
+    def prompt(self, node: TaskNode) -> str:
+        """The worker's task text, followed by the results of its dependencies."""
+        task = node.tool_call.arguments.get("task", "")
+        if not node.depends_on:
+            return task
+        sections = [task, "", "## Results of the tasks this one depends on"]
+        for name in node.depends_on:
+            upstream = self.nodes[name]
+            result = upstream.result or ""
+            if len(result) > _MAX_UPSTREAM_CHARS:
+                result = result[:_MAX_UPSTREAM_CHARS] + "\n... (truncated)"
+            worker = upstream.tool_call.arguments.get("worker_name", "Worker")
+            sections += ["", f"### {name} ({worker})", result]
+        return "\n".join(sections)
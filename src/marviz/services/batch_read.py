@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .code_search import IGNORED_DIRS, MAX_FILE_BYTES
+from .file_cache import CacheStats, FileCache
+
+# Files a glob may expand to before the rest are listed as not read
+MAX_GLOB_FILES = 200
+# Smallest share of the budget worth giving a file; with less, lower-ranked files are dropped
+_MIN_SHARE = 1_000
+_GLOB_CHARS = frozenset("*?[")
+
+
+@dataclass
+class FileContent:
+    """One file of a batch read; ``text`` is cut to the file's share of the budget."""
+
+    path: str  # as displayed: relative to the root when inside it
+    text: str
+    chars: int  # full length
+    lines: int
+
+    @property
+    def truncated(self) -> bool:
+        return len(self.text) < self.chars
+
+
+@dataclass
+class BatchRead:
+    files: list[FileContent] = field(default_factory=list)
+    skipped: list[tuple[str, str]] = field(default_factory=list)  # (path, reason)
+    over_budget: list[str] = field(default_factory=list)
+
+
+def _is_ignored(rel: Path) -> bool:
+    return any(part in IGNORED_DIRS or part.startswith(".") for part in rel.parts[:-1])
+
+
+def _display(path: Path, root: Path) -> str:
+    try:
+        return str(path.relative_to(root))
+    except ValueError:
+        return str(path)
+
+
+def resolve_path(path: str, root: Path) -> Path:
+    """``path`` with ``~`` expanded, taken relative to ``root`` unless absolute."""
+    resolved = Path(path).expanduser()
+    return resolved if resolved.is_absolute() else root / resolved
+
+
+def expand_paths(patterns: list[str], root: Path) -> tuple[list[Path], list[tuple[str, str]]]:
+    """Resolve paths and globs (relative to ``root``) in order, dropping duplicates.
+
+    Files a glob matches inside ignored or hidden directories are left out;
+    a path named explicitly is always kept.
+    """
+    paths: list[Path] = []
+    skipped: list[tuple[str, str]] = []
+    seen: set[Path] = set()
+
+    def add(path: Path) -> None:
+        resolved = path.resolve()
+        if resolved in seen:
+            skipped.append((_display(path, root), "duplicate"))
+            return
+        seen.add(resolved)
+        paths.append(path)
+
+    for pattern in patterns:
+        pattern = os.path.expanduser(pattern)
+        if not _GLOB_CHARS.intersection(pattern):
+            add(resolve_path(pattern, root))
+            continue
+        base, glob = (Path("/"), pattern.lstrip("/")) if os.path.isabs(pattern) else (root, pattern)
+        matches = ignored = 0
+        for path in sorted(base.glob(glob)):
+            if not path.is_file():
+                continue
+            if _is_ignored(path.relative_to(base)):
+                ignored += 1
+                continue
+            if matches == MAX_GLOB_FILES:
+                skipped.append((pattern, f"more than {MAX_GLOB_FILES} matches, rest not read"))
+                break
+            matches += 1
+            add(path)
+        if not matches:
+            skipped.append((pattern, "only ignored files match" if ignored else "no matches"))
+    return paths, skipped
+
+
+def _read(
+    path: Path, cache: FileCache | None = None, stats: CacheStats | None = None
+) -> tuple[str | None, str]:
+    """``(text, "")``, or ``(None, reason)`` for a file that is skipped."""
+    try:
+        size = path.stat().st_size
+        if size > MAX_FILE_BYTES:
+            return None, f"too large ({size // 1024} KB)"
+        if cache is not None:
+            cached = cache.read(path, stats)
+            return (None, "binary") if cached.binary else (cached.text, "")
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return None, "not found"
+    except OSError as e:
+        return None, f"unreadable: {e.strerror or e}"
+    if b"\0" in data[:8192]:
+        return None, "binary"
+    return data.decode("utf-8", errors="replace"), ""
+
+
+def _shares(sizes: list[int], budget: int) -> list[int]:
+    """Split ``budget`` so small files fit whole and large ones get equal cuts."""
+    shares = [0] * len(sizes)
+    remaining = budget
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    for n, i in enumerate(order):
+        fair = remaining // (len(order) - n)
+        shares[i] = min(sizes[i], fair)
+        remaining -= shares[i]
+    return shares
+
+
+def _cut(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    end = text.rfind("\n", 0, limit)
+    return text[: end + 1 if end > limit // 2 else limit]
+
+
+def read_files(
+    patterns: list[str],
+    root: Path,
+    budget: int = 40_000,
+    max_workers: int = 8,
+    cache: FileCache | None = None,
+    stats: CacheStats | None = None,
+) -> BatchRead:
+    """Read files and globs concurrently, fitting their combined text into ``budget`` chars.
+
+    Binary, oversized, missing and duplicate files are skipped; so is a file
+    whose content is identical to one already read. Files are ranked in
+    request order: when the budget cannot give every file a useful share,
+    the lowest-ranked are listed as over budget instead of being read, and
+    the rest share it so small files come through whole and large ones are
+    cut at a line boundary. Files are read through ``cache`` when one is given.
+    """
+    result = BatchRead()
+    paths, result.skipped = expand_paths(patterns, root)
+    keep = max(1, budget // _MIN_SHARE)
+    if len(paths) > keep:
+        result.over_budget = [_display(p, root) for p in paths[keep:]]
+        paths = paths[:keep]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(paths)))) as pool:
+        reads = list(pool.map(lambda path: _read(path, cache, stats), paths))
+
+    readable: list[tuple[str, str]] = []
+    digests: dict[str, str] = {}
+    for path, (text, reason) in zip(paths, reads):
+        name = _display(path, root)
+        if text is None:
+            result.skipped.append((name, reason))
+            continue
+        digest = hashlib.sha1(text.encode("utf-8", errors="replace")).hexdigest()
+        if digest in digests:
+            result.skipped.append((name, f"same content as {digests[digest]}"))
+            continue
+        digests[digest] = name
+        readable.append((name, text))
+
+    shares = _shares([len(text) for _, text in readable], budget)
+    for (name, text), share in zip(readable, shares):
+        result.files.append(FileContent(name, _cut(text, share), len(text), len(text.splitlines())))
+    return result
+
+
+def format_batch(batch: BatchRead) -> str:
+    """Render files under ``=== path ===`` headers, followed by what was skipped."""
+    out: list[str] = []
+    for f in batch.files:
+        note = (
+            f"truncated: first {len(f.text):,} of {f.chars:,} chars"
+            if f.truncated
+            else f"{f.lines} lines"
+        )
+        out.append(f"=== {f.path} ({note}) ===\n{f.text}")
+    if batch.skipped:
+        out.append("Skipped: " + ", ".join(f"{path} ({reason})" for path, reason in batch.skipped))
+    if batch.over_budget:
+        out.append(
+            "Not read, over the size budget (request them separately): "
+            + ", ".join(batch.over_budget)
+        )
+    return "\n\n".join(out) if out else "No files read."
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import fnmatch
+import os
+import re
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+try:  # CPython's undocumented regex parser; only used to prefilter searches
+    import re._parser as _re_parser
+except ImportError:
+    _re_parser = None
+
+IGNORED_DIRS = {
+    ".git",
+    ".hg",
+    ".svn",
+    "__pycache__",
+    "node_modules",
+    ".venv",
+    "venv",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".ruff_cache",
+    ".tox",
+    ".nox",
+    "dist",
+    "build",
+}
+MAX_FILE_BYTES = 1_000_000
+
+
+@dataclass
+class _IndexedFile:
+    """Text and trigram set of one indexed file."""
+
+    mtime_ns: int
+    size: int
+    text: str
+    trigrams: frozenset[str] = field(repr=False)
+
+
+@dataclass
+class SearchMatch:
+    """A matching line with its surrounding context."""
+
+    path: str
+    line: int  # 1-based
+    text: str
+    before: list[str]
+    after: list[str]
+
+
+def iter_workspace_files(root: Path):
+    """Yield text-file candidates under root, skipping ignored and hidden dirs."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [
+            d for d in dirnames if d not in IGNORED_DIRS and not d.startswith(".")
+        ]
+        for name in filenames:
+            yield Path(dirpath) / name
+
+
+def _read_text(path: Path, stat: os.stat_result) -> str | None:
+    """Read a file as UTF-8 text, or None if it is too large or binary."""
+    if stat.st_size > MAX_FILE_BYTES:
+        return None
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return None
+    if b"\0" in data[:8192]:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+def _trigrams(text: str) -> frozenset[str]:
+    text = text.lower()
+    return frozenset(text[i : i + 3] for i in range(len(text) - 2))
+
+
+def required_literals(pattern: str) -> list[str]:
+    """Extract literal runs that every match of a regex must contain.
+
+    Only top-level literal sequences are considered; anything else
+    (groups, repeats, alternations, classes) breaks a run. Returns no
+    literals (a full scan) when the private parser is missing or changed.
+    """
+    if _re_parser is None:
+        return []
+    literals: list[str] = []
+    run: list[str] = []
+    try:
+        for op, arg in _re_parser.parse(pattern):
+            if op is _re_parser.LITERAL:
+                run.append(chr(arg))
+                continue
+            if len(run) >= 3:
+                literals.append("".join(run))
+            run = []
+    except Exception:  # invalid pattern, or parser internals not as expected
+        return []
+    if len(run) >= 3:
+        literals.append("".join(run))
+    return literals
+
+
+class CodeSearchIndex:
+    """In-memory trigram index over the text files of a workspace.
+
+    ``build`` and ``refresh`` are meant to run off the event loop; queries
+    take a short lock and only scan files whose trigrams cover the query.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root.resolve()
+        self._files: dict[str, _IndexedFile] = {}
+        self._postings: dict[str, set[str]] = {}
+        self._skipped: dict[str, tuple[int, int]] = {}  # binary/oversized files
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.ready = False
+        # Called as listener(rel_path, text) on change, text=None on removal
+        self.listeners: list[Callable[[str, str | None], None]] = []
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    # ── Indexing ──
+
+    def build(self) -> None:
+        """Index every text file under root."""
+        self.refresh()
+        self.ready = True
+
+    def refresh(self) -> int:
+        """Re-index files whose (mtime, size) changed and drop deleted ones.
+
+        Returns the number of files updated. Concurrent calls are skipped.
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return 0
+        try:
+            seen: set[str] = set()
+            updated = 0
+            for path in iter_workspace_files(self.root):
+                rel = path.relative_to(self.root).as_posix()
+                seen.add(rel)
+                if self._update(path, rel):
+                    updated += 1
+            for rel in set(self._files) - seen:
+                with self._lock:
+                    self._remove(rel)
+                self._notify(rel, None)
+                updated += 1
+            for rel in set(self._skipped) - seen:
+                del self._skipped[rel]
+            return updated
+        finally:
+            self._refresh_lock.release()
+
+    def update_path(self, path: Path) -> None:
+        """Re-index a single file right away, e.g. after a tool wrote it."""
+        path = path if path.is_absolute() else self.root / path
+        try:
+            rel = path.resolve().relative_to(self.root).as_posix()
+        except ValueError:
+            return  # outside the workspace
+        if path.is_file():
+            self._update(path, rel)
+        else:
+            with self._lock:
+                self._remove(rel)
+            self._notify(rel, None)
+
+    def _update(self, path: Path, rel: str) -> bool:
+        try:
+            stat = path.stat()
+        except OSError:
+            return False
+        key = (stat.st_mtime_ns, stat.st_size)
+        current = self._files.get(rel)
+        if current and (current.mtime_ns, current.size) == key:
+            return False
+        if self._skipped.get(rel) == key:
+            return False
+        text = _read_text(path, stat)
+        if text is None:
+            self._skipped[rel] = key
+        else:
+            self._skipped.pop(rel, None)
+        entry = (
+            _IndexedFile(stat.st_mtime_ns, stat.st_size, text, _trigrams(text))
+            if text is not None
+            else None
+        )
+        with self._lock:
+            self._remove(rel)
+            if entry is not None:
+                self._files[rel] = entry
+                for tri in entry.trigrams:
+                    self._postings.setdefault(tri, set()).add(rel)
+        self._notify(rel, text)
+        return True
+
+    def _notify(self, rel: str, text: str | None) -> None:
+        for listener in self.listeners:
+            listener(rel, text)
+
+    def _remove(self, rel: str) -> None:
+        entry = self._files.pop(rel, None)
+        if entry is None:
+            return
+        for tri in entry.trigrams:
+            paths = self._postings.get(tri)
+            if paths is not None:
+                paths.discard(rel)
+                if not paths:
+                    del self._postings[tri]
+
+    # ── Querying ──
+
+    def _candidates(self, literals: list[str]) -> list[str]:
+        grams = {lit.lower()[i : i + 3] for lit in literals for i in range(len(lit) - 2)}
+        if not grams:
+            return sorted(self._files)
+        postings = sorted((self._postings.get(g, set()) for g in grams), key=len)
+        result = set(postings[0])
+        for paths in postings[1:]:
+            result &= paths
+            if not result:
+                break
+        return sorted(result)
+
+    def search(
+        self,
+        query: str,
+        *,
+        regex: bool = False,
+        glob: str | None = None,
+        ignore_case: bool = False,
+        context: int = 2,
+        max_results: int = 50,
+    ) -> list[SearchMatch]:
+        """Find lines matching a literal or regex query.
+
+        The lock is held only to pick the candidate files; the scan runs on
+        that snapshot, so updates and other searches are not held up by it.
+        """
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        pattern = re.compile(query if regex else re.escape(query), flags)
+        literals = required_literals(query) if regex else [query]
+
+        with self._lock:
+            candidates = [
+                (rel, self._files[rel].text)
+                for rel in self._candidates(literals)
+                if not glob or fnmatch.fnmatch(rel, glob)
+            ]
+
+        matches: list[SearchMatch] = []
+        for rel, text in candidates:
+            lines: list[str] | None = None
+            line_no, pos, last_line = 0, 0, -1
+            for m in pattern.finditer(text):
+                line_no += text.count("\n", pos, m.start())
+                pos = m.start()
+                if line_no == last_line:
+                    continue
+                last_line = line_no
+                if lines is None:
+                    lines = text.split("\n")
+                matches.append(
+                    SearchMatch(
+                        path=rel,
+                        line=line_no + 1,
+                        text=lines[line_no] if line_no < len(lines) else "",
+                        before=lines[max(0, line_no - context) : line_no],
+                        after=lines[line_no + 1 : line_no + 1 + context],
+                    )
+                )
+                if len(matches) >= max_results:
+                    return matches
+        return matches
+
+
+def format_matches(matches: list[SearchMatch], max_chars: int = 10_000) -> str:
+    """Render matches grep-style: ``path:line:`` for hits, ``path-line-`` for context."""
+    if not matches:
+        return "No matches."
+    out: list[str] = []
+    size = 0
+    for m in matches:
+        block = [f"{m.path}-{m.line - len(m.before) + i}-{t}" for i, t in enumerate(m.before)]
+        block.append(f"{m.path}:{m.line}:{m.text}")
+        block += [f"{m.path}-{m.line + 1 + i}-{t}" for i, t in enumerate(m.after)]
+        chunk = "\n".join(block)
+        if size + len(chunk) > max_chars:
+            out.append(f"... (output truncated, {len(matches)} matches total)")
+            break
+        out.append(chunk)
+        size += len(chunk)
+    return "\n--\n".join(out)
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import asyncio
+import codecs
+import fnmatch
+import os
+import signal
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+# Characters of output kept from the start and the end of a command for the model
+HEAD_CHARS = 3_000
+TAIL_CHARS = 5_000
+# Characters streamed live to the UI per command; the rest only counts toward the excerpt
+_LIVE_CHARS = 200_000
+# Longest unterminated line held back before it is streamed anyway
+_MAX_PARTIAL = 8_192
+_KILL_GRACE = 2.0
+# Commands run non-interactively and without colour codes in their output
+_FIXED_ENV = {
+    "CI": "1",
+    "NO_COLOR": "1",
+    "TERM": "dumb",
+    "PAGER": "cat",
+    "GIT_PAGER": "cat",
+    "GIT_TERMINAL_PROMPT": "0",
+}
+
+
+@dataclass
+class CommandResult:
+    command: str
+    exit_code: int | None  # None when the command was killed
+    seconds: float
+    head: str
+    tail: str
+    chars: int  # total output
+    lines: int
+    timed_out: bool = False
+
+    @property
+    def omitted(self) -> int:
+        return self.chars - len(self.head) - len(self.tail)
+
+    @property
+    def status(self) -> str:
+        if self.timed_out:
+            return f"timed out after {self.seconds:.0f}s and was killed"
+        return f"exit code {self.exit_code} ({self.seconds:.1f}s)"
+
+    def excerpt(self) -> str:
+        """Exit status and the head and tail of the output, for the model."""
+        out = [f"$ {self.command}", self.status]
+        if self.head:
+            out.append(self.head.rstrip("\n"))
+        if self.omitted > 0:
+            out.append(f"... ({self.omitted:,} chars omitted of {self.lines:,} lines) ...")
+        if self.tail:
+            out.append(self.tail.rstrip("\n"))
+        if not self.chars:
+            out.append("(no output)")
+        return "\n".join(out)
+
+
+class _Excerpt:
+    """Bounded capture of a stream: its first HEAD_CHARS and last TAIL_CHARS."""
+
+    def __init__(self) -> None:
+        self.head: list[str] = []
+        self.head_chars = 0
+        self.tail: deque[str] = deque()
+        self.tail_chars = 0
+        self.chars = 0
+        self.lines = 0
+
+    def feed(self, text: str) -> None:
+        self.chars += len(text)
+        self.lines += text.count("\n")
+        room = HEAD_CHARS - self.head_chars
+        if room > 0:
+            self.head.append(text[:room])
+            self.head_chars += len(self.head[-1])
+            text = text[room:]
+        if not text:
+            return
+        self.tail.append(text)
+        self.tail_chars += len(text)
+        while self.tail_chars - len(self.tail[0]) >= TAIL_CHARS:
+            self.tail_chars -= len(self.tail.popleft())
+
+    def text(self) -> tuple[str, str]:
+        tail = "".join(self.tail)[-TAIL_CHARS:]
+        if self.tail_chars > TAIL_CHARS:
+            # Start the tail at a line boundary when one is near
+            cut = tail.find("\n")
+            if 0 <= cut < 200:
+                tail = tail[cut + 1 :]
+        return "".join(self.head), tail
+
+
+def command_env(allowlist: tuple[str, ...] | list[str]) -> dict[str, str]:
+    """The caller's environment filtered to names matching ``allowlist`` (globs allowed)."""
+    env = {
+        name: value
+        for name, value in os.environ.items()
+        if any(fnmatch.fnmatchcase(name, pattern) for pattern in allowlist)
+    }
+    env.update(_FIXED_ENV)
+    return env
+
+
+class CommandRunner:
+    """Runs agent shell commands in the workspace without blocking the event loop.
+
+    Each command gets ``/bin/sh -c`` in ``root``, no stdin, an environment
+    reduced to ``env_allowlist`` (so API keys and tokens stay out of it)
+    and its own process group, which is killed when the command times out
+    or its caller is cancelled. At most ``max_concurrent`` commands run at
+    once; the rest wait their turn. Output (stdout and stderr, merged) is
+    streamed in whole lines to ``on_output`` up to _LIVE_CHARS, and only
+    its head and tail are kept.
+
+    That is all that is enforced: this is not a sandbox. A command runs as
+    the user, can read and write anything the user can (not just ``root``)
+    and has full network access.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        timeout: float = 120.0,
+        env_allowlist: tuple[str, ...] | list[str] = (),
+        max_concurrent: int = 2,
+    ) -> None:
+        self.root = root
+        self.timeout = timeout
+        self.env_allowlist = tuple(env_allowlist)
+        self._slots = asyncio.Semaphore(max(1, max_concurrent))
+
+    async def run(
+        self,
+        command: str,
+        timeout: float | None = None,
+        on_output: Callable[[str], None] | None = None,
+    ) -> CommandResult:
+        """Run ``command``; ``timeout`` can shorten the configured one, not extend it."""
+        limit = min(timeout, self.timeout) if timeout and timeout > 0 else self.timeout
+        async with self._slots:
+            return await self._run(command, limit, on_output)
+
+    async def _run(
+        self, command: str, timeout: float, on_output: Callable[[str], None] | None
+    ) -> CommandResult:
+        start = time.monotonic()
+        proc = await asyncio.create_subprocess_exec(
+            "/bin/sh",
+            "-c",
+            command,
+            cwd=self.root,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env=command_env(self.env_allowlist),
+            start_new_session=True,
+        )
+        excerpt = _Excerpt()
+        timed_out = False
+        try:
+            await asyncio.wait_for(self._pump(proc, excerpt, on_output), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            await self._kill(proc)
+        except BaseException:
+            await self._kill(proc)
+            raise
+        head, tail = excerpt.text()
+        return CommandResult(
+            command,
+            None if timed_out else proc.returncode,
+            time.monotonic() - start,
+            head,
+            tail,
+            excerpt.chars,
+            excerpt.lines,
+            timed_out,
+        )
+
+    @staticmethod
+    async def _pump(
+        proc: asyncio.subprocess.Process,
+        excerpt: _Excerpt,
+        on_output: Callable[[str], None] | None,
+    ) -> None:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        partial = ""  # text after the last newline, held back from on_output
+        live = _LIVE_CHARS if on_output is not None else 0
+        while chunk := await proc.stdout.read(65536):
+            text = decoder.decode(chunk)
+            excerpt.feed(text)
+            if live <= 0:
+                continue
+            partial += text
+            end = partial.rfind("\n") + 1
+            if not end and len(partial) > _MAX_PARTIAL:
+                end = len(partial)  # no newline in sight (e.g. \r progress bars)
+            if end:
+                lines, partial = partial[:end], partial[end:]
+                if len(lines) > live:
+                    lines = lines[:live] + "\n... (live output stopped; see the excerpt)\n"
+                live -= len(lines)
+                on_output(lines)
+        text = decoder.decode(b"", final=True)
+        excerpt.feed(text)
+        if live > 0 and partial + text:
+            on_output(partial + text)
+        await proc.wait()
+
+    @staticmethod
+    async def _kill(proc: asyncio.subprocess.Process) -> None:
+        """Terminate the command's process group, then kill it if it lingers."""
+        if proc.returncode is not None:
+            return
+        for sig, grace in ((signal.SIGTERM, _KILL_GRACE), (signal.SIGKILL, None)):
+            try:
+                os.killpg(proc.pid, sig)
+            except ProcessLookupError:
+                return
+            try:
+                await asyncio.wait_for(asyncio.shield(proc.wait()), grace)
+                return
+            except asyncio.TimeoutError:
+                continue
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import FrameType
+
+
+def _short_path(filename: str) -> str:
+    parts = Path(filename).parts
+    return "/".join(parts[-2:]) if len(parts) > 1 else filename
+
+
+def collapse_stack(frame: FrameType | None) -> str:
+    """Render a frame chain root-first as a collapsed-stack line (flamegraph.pl format)."""
+    names: list[str] = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def write_collapsed(path: Path, stacks: Counter[str]) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+@dataclass
+class LagEvent:
+    """One stretch of time during which the event loop did not run."""
+
+    started_at: float  # wall clock
+    lag: float = 0.0  # seconds blocked
+    stacks: Counter[str] = field(default_factory=Counter)
+
+
+class LoopLagMonitor:
+    """Watchdog thread that samples the loop thread's stack while the loop is blocked.
+
+    A heartbeat task stamps the time every ``heartbeat`` seconds. If the stamp
+    goes stale by more than ``threshold``, the watchdog records the loop
+    thread's stack on every check until the loop runs again; each such
+    episode becomes one ``LagEvent`` appended to ``log_path``.
+    """
+
+    def __init__(
+        self,
+        log_path: Path,
+        threshold: float = 0.1,
+        heartbeat: float = 0.02,
+        keep: int = 100,
+    ) -> None:
+        self.log_path = log_path
+        self.threshold = threshold
+        self.heartbeat = heartbeat
+        self.keep = keep
+        self.events: list[LagEvent] = []
+        self._beat = time.perf_counter()
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start monitoring; must be called from the event loop thread."""
+        self._loop_thread = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="marviz-lag-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            self._beat = time.perf_counter()
+            await asyncio.sleep(self.heartbeat)
+
+    def _watch(self) -> None:
+        event: LagEvent | None = None
+        event_beat = 0.0
+        while not self._stop.wait(self.heartbeat):
+            beat = self._beat
+            stale = time.perf_counter() - beat - self.heartbeat
+            if stale > self.threshold:
+                if event is None or beat != event_beat:
+                    self._flush(event)
+                    event, event_beat = LagEvent(started_at=time.time() - stale), beat
+                event.lag = stale
+                frame = sys._current_frames().get(self._loop_thread)
+                event.stacks[collapse_stack(frame)] += 1
+            elif event is not None:
+                self._flush(event)
+                event = None
+        self._flush(event)
+
+    def _flush(self, event: LagEvent | None) -> None:
+        if event is None:
+            return
+        self.events.append(event)
+        del self.events[: -self.keep]
+        try:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.log_path.open("a", encoding="utf-8") as f:
+                stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(event.started_at))
+                f.write(f"{stamp} loop blocked {event.lag * 1000:.0f}ms\n")
+                for stack, count in event.stacks.most_common(3):
+                    f.write(f"  {count}x {stack}\n")
+        except OSError:
+            pass
+
+
+class SamplingProfiler:
+    """Samples every thread's stack at a fixed interval into collapsed-stack counts."""
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="marviz-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                thread = names.get(ident, str(ident))
+                stack = f"{thread};{collapse_stack(frame)}"
+                with self._lock:
+                    self.stacks[stack] += 1
+            self.samples += 1
+
+    def dump(self, path: Path) -> Path:
+        with self._lock:
+            stacks = Counter(self.stacks)
+        return write_collapsed(path, stacks)
+
+
+class Diagnostics:
+    """Opt-in diagnostics: loop-lag watchdog, sampling profiler, tracemalloc snapshots.
+
+    tracemalloc slows every allocation down, which would skew the lag and
+    profiler numbers, so it only runs from startup with ``trace_memory``;
+    otherwise the first ``snapshot_memory`` call starts it.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        lag_threshold: float = 0.1,
+        sample_interval: float = 0.01,
+        trace_memory: bool = False,
+    ) -> None:
+        self.directory = directory
+        self.trace_memory = trace_memory
+        pid = os.getpid()
+        self.lag_monitor = LoopLagMonitor(directory / f"lag-{pid}.log", threshold=lag_threshold)
+        self.profiler = SamplingProfiler(sample_interval)
+
+    def start(self) -> None:
+        """Start all monitors; must be called from the event loop thread."""
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(16)
+        self.lag_monitor.start()
+        self.profiler.start()
+
+    def stop(self) -> None:
+        self.lag_monitor.stop()
+        self.profiler.stop()
+        self.dump_profile()
+
+    def _stamped(self, stem: str, suffix: str) -> Path:
+        return self.directory / f"{stem}-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}{suffix}"
+
+    def dump_profile(self) -> Path:
+        """Write the collected samples as collapsed stacks (for flamegraph.pl / speedscope)."""
+        return self.profiler.dump(self._stamped("profile", ".collapsed"))
+
+    def snapshot_memory(self, top: int = 30) -> Path | None:
+        """Dump a tracemalloc snapshot plus a text summary of the top allocation sites.
+
+        Returns None, after starting tracemalloc, when it was not tracing yet:
+        allocations are only seen from then on.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(16)
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        path = self._stamped("tracemalloc", ".snapshot")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        snapshot.dump(str(path))
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"traced: {current / 1e6:.1f} MB current, {peak / 1e6:.1f} MB peak"]
+        lines += [str(stat) for stat in snapshot.statistics("lineno")[:top]]
+        summary = path.with_suffix(".txt")
+        summary.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return summary
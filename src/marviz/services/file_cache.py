@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+# Files larger than this share of the cache are read but not kept
+_MAX_ENTRY_SHARE = 8
+
+
+@dataclass
+class CacheStats:
+    """Reads served from the cache (hits) and from disk (misses)."""
+
+    hits: int = 0
+    misses: int = 0
+    saved_bytes: int = 0  # bytes not read from disk thanks to hits
+
+    def add(self, hit: bool, size: int) -> None:
+        if hit:
+            self.hits += 1
+            self.saved_bytes += size
+        else:
+            self.misses += 1
+
+
+@dataclass(frozen=True)
+class CachedFile:
+    """A file's content decoded as UTF-8 (invalid bytes replaced)."""
+
+    text: str
+    size: int  # bytes on disk
+    binary: bool  # NUL bytes near the start
+    lossy: bool  # not valid UTF-8; ``text`` has replacement characters
+
+
+def _key(path: Path) -> str:
+    return os.path.abspath(os.path.expanduser(path))
+
+
+def _version(stat: os.stat_result) -> tuple[int, int, int]:
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class FileCache:
+    """Decoded file contents shared by every agent's file tools.
+
+    Entries are keyed by absolute path and checked against the file's
+    (mtime, size, inode) on every read, so a file changed behind the
+    cache's back is read again. Writes through the tools update the cache
+    in place (``store``). Entries are evicted least recently used first
+    once their total size passes ``max_bytes``; 0 disables caching.
+    Safe to use from worker threads.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[tuple[int, int, int], CachedFile]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = CacheStats()  # since startup
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        """Bytes of the cached files."""
+        return self._bytes
+
+    def read(self, path: Path, stats: CacheStats | None = None) -> CachedFile:
+        """The content of ``path``, from the cache when the file is unchanged.
+
+        Raises ``OSError`` like a plain read. ``stats``, when given, counts
+        this read as a hit or a miss in addition to the cache's own stats.
+        """
+        key = _key(path)
+        version = _version(os.stat(key))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self._count(True, entry[1].size, stats)
+                return entry[1]
+        with open(key, "rb") as f:
+            data = f.read()
+        binary = b"\0" in data[:8192]
+        try:
+            text, lossy = data.decode("utf-8"), False
+        except UnicodeDecodeError:
+            text, lossy = data.decode("utf-8", errors="replace"), True
+        cached = CachedFile(text, len(data), binary, lossy)
+        with self._lock:
+            self._count(False, cached.size, stats)
+            # Stored under the version seen before reading: a write during the read changes
+            # the mtime, so the next read misses instead of serving the stale text
+            self._put(key, version, cached)
+        return cached
+
+    def store(self, path: Path, text: str) -> None:
+        """Write-through: record ``text`` as the content just written to ``path``."""
+        key = _key(path)
+        try:
+            version = _version(os.stat(key))
+        except OSError:
+            self.invalidate(path)
+            return
+        data_size = len(text.encode("utf-8"))
+        if data_size != version[1]:  # not what is on disk (e.g. newline translation)
+            self.invalidate(path)
+            return
+        with self._lock:
+            self._put(key, version, CachedFile(text, data_size, "\0" in text[:8192], False))
+
+    def invalidate(self, path: Path) -> None:
+        with self._lock:
+            entry = self._entries.pop(_key(path), None)
+            if entry is not None:
+                self._bytes -= entry[1].size
+
+    def clear(self) -> None:
+        """Drop every entry, e.g. after a command that may have changed any file."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _count(self, hit: bool, size: int, stats: CacheStats | None) -> None:
+        self.stats.add(hit, size)
+        if stats is not None:
+            stats.add(hit, size)
+
+    def _put(self, key: str, version: tuple[int, int, int], cached: CachedFile) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1].size
+        if cached.size > self.max_bytes // _MAX_ENTRY_SHARE:
+            return
+        self._entries[key] = (version, cached)
+        self._bytes += cached.size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
@@ -0,0 +1,373 @@
+from __future__ import annotations
+
+import difflib
+import errno
+import hashlib
+import os
+import re
+import secrets
+import shutil
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+from .file_cache import CacheStats, FileCache
+
+# Minimum similarity for the last-resort fuzzy window match
+FUZZY_THRESHOLD = 0.85
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+\d+(?:,\d+)? @@")
+
+
+class EditError(ValueError):
+    """An edit could not be applied unambiguously."""
+
+
+@dataclass
+class Hunk:
+    """Replace the lines of ``search`` with ``replace``.
+
+    ``hint`` is an optional 0-based line number used to pick between
+    several equally good matches (e.g. from a unified diff header). An
+    empty ``search`` inserts ``replace`` before line ``hint``.
+    """
+
+    search: str
+    replace: str
+    hint: int | None = None
+
+
+@dataclass
+class EditResult:
+    text: str
+    added: int
+    removed: int
+    fuzzy: list[str]  # notes for hunks that needed non-exact matching
+
+
+def _split(text: str) -> list[str]:
+    return text.split("\n")
+
+
+def _block_lines(block: str) -> list[str]:
+    """Lines of a search or replace block; only its final line terminator is dropped.
+
+    Blank lines at either end are part of the block: ``"a\n\n"`` is the
+    line ``a`` followed by an empty line, and ``""`` is no lines at all.
+    """
+    if not block:
+        return []
+    return _split(block[:-1] if block.endswith("\n") else block)
+
+
+def _pick(candidates: list[int], hint: int | None, what: str) -> int:
+    if len(candidates) == 1:
+        return candidates[0]
+    if hint is None:
+        raise EditError(f"{what} matches {len(candidates)} places; add more context")
+    return min(candidates, key=lambda i: abs(i - hint))
+
+
+def _find_lines(
+    lines: list[str], needle: list[str], hint: int | None, key
+) -> int | None:
+    keyed = [key(line) for line in lines]
+    target = [key(line) for line in needle]
+    n = len(target)
+    candidates = [i for i in range(len(keyed) - n + 1) if keyed[i : i + n] == target]
+    if not candidates:
+        return None
+    return _pick(candidates, hint, "search block")
+
+
+def _reindent(replace: list[str], found: list[str], search: list[str]) -> list[str]:
+    """Shift replacement lines by the indentation delta between file and search block."""
+
+    def indent(line: str) -> str:
+        return line[: len(line) - len(line.lstrip())]
+
+    first = next((i for i, line in enumerate(search) if line.strip()), None)
+    if first is None:
+        return replace
+    have, want = indent(search[first]), indent(found[first])
+    if have == want:
+        return replace
+    out = []
+    for line in replace:
+        if line.startswith(have):
+            out.append(want + line[len(have) :])
+        else:
+            out.append(line)
+    return out
+
+
+def _insertion_point(lines: list[str], hint: int | None) -> int:
+    """Where an insertion with no search block goes: before line ``hint``, at most the end."""
+    end = len(lines) - 1 if lines[-1] == "" else len(lines)  # after the final newline
+    if hint is None:
+        if end:
+            raise EditError("search block is empty; add context or a diff line number")
+        return 0
+    return max(0, min(hint, end))
+
+
+def _locate(lines: list[str], hunk: Hunk) -> tuple[int, int, list[str], str | None]:
+    """Return (start, length, replacement_lines, fuzzy_note) for a hunk."""
+    search = _block_lines(hunk.search)
+    replace = _block_lines(hunk.replace)
+    if not search:
+        return _insertion_point(lines, hunk.hint), 0, replace, None
+    n = len(search)
+
+    start = _find_lines(lines, search, hunk.hint, lambda s: s)
+    if start is not None:
+        return start, n, replace, None
+    start = _find_lines(lines, search, hunk.hint, str.rstrip)
+    if start is not None:
+        return start, n, replace, "ignored trailing whitespace"
+    start = _find_lines(lines, search, hunk.hint, str.strip)
+    if start is not None:
+        found = lines[start : start + n]
+        return start, n, _reindent(replace, found, search), "ignored indentation"
+
+    # Last resort: most similar window of the same height
+    target = "\n".join(s.strip() for s in search)
+    best, best_ratio = None, 0.0
+    for i in range(len(lines) - n + 1):
+        window = "\n".join(s.strip() for s in lines[i : i + n])
+        matcher = difflib.SequenceMatcher(None, target, window, autojunk=False)
+        if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+            continue
+        ratio = matcher.ratio()
+        if ratio > best_ratio or (
+            ratio == best_ratio and hunk.hint is not None and best is not None
+            and abs(i - hunk.hint) < abs(best - hunk.hint)
+        ):
+            best, best_ratio = i, ratio
+    if best is None or best_ratio < FUZZY_THRESHOLD:
+        preview = search[0].strip()[:60] if search else ""
+        raise EditError(f"search block not found: {preview!r}")
+    found = lines[best : best + n]
+    return best, n, _reindent(replace, found, search), f"fuzzy match {best_ratio:.0%}"
+
+
+def apply_hunks(text: str, hunks: list[Hunk]) -> EditResult:
+    """Apply search/replace hunks to text. All hunks must apply or none do."""
+    lines = _split(text)
+    spans: list[tuple[int, int, list[str]]] = []
+    fuzzy: list[str] = []
+    for number, hunk in enumerate(hunks, 1):
+        if not hunk.search and not hunk.replace:
+            raise EditError(f"hunk {number}: search and replace blocks are empty")
+        try:
+            start, length, replacement, note = _locate(lines, hunk)
+        except EditError as e:
+            raise EditError(f"hunk {number}: {e}") from None
+        if note:
+            fuzzy.append(f"hunk {number} at line {start + 1}: {note}")
+        spans.append((start, length, replacement))
+
+    spans.sort(key=lambda span: span[0])
+    for (a_start, a_len, _), (b_start, _b_len, _) in zip(spans, spans[1:]):
+        if a_start + a_len > b_start:
+            raise EditError("hunks overlap")
+
+    added = removed = 0
+    for start, length, replacement in reversed(spans):
+        lines[start : start + length] = replacement
+        added += len(replacement)
+        removed += length
+    result = "\n".join(lines)
+    if result == text and any(
+        _block_lines(h.search) != _block_lines(h.replace) for h in hunks
+    ):
+        raise EditError(
+            "edit matched but would leave the file unchanged; check whitespace and blank lines"
+        )
+    return EditResult(result, added, removed, fuzzy)
+
+
+def parse_unified_diff(diff: str) -> list[Hunk]:
+    """Turn unified-diff hunks into search/replace hunks (file headers are ignored)."""
+    hunks: list[Hunk] = []
+    old: list[str] | None = None
+    new: list[str] = []
+    hint: int | None = None
+
+    def block(lines: list[str]) -> str:
+        return "".join(line + "\n" for line in lines)
+
+    def flush() -> None:
+        if old is not None and (old or new):
+            hunks.append(Hunk(block(old), block(new), hint))
+
+    lines = diff.split("\n")
+    if lines[-1] == "":
+        lines.pop()  # the diff's own final newline, not a blank context line
+    for line in lines:
+        header = _HUNK_HEADER.match(line)
+        if header:
+            flush()
+            old, new = [], []
+            # A hunk without old lines ("-5,0") inserts after line 5, i.e. before 0-based line 5
+            start = int(header.group(1))
+            hint = start if header.group(2) == "0" else max(start - 1, 0)
+            continue
+        if old is None or line.startswith(("---", "+++")):
+            continue
+        if line.startswith("-"):
+            old.append(line[1:])
+        elif line.startswith("+"):
+            new.append(line[1:])
+        elif line.startswith(" ") or line == "":
+            old.append(line[1:])
+            new.append(line[1:])
+        # "\ No newline at end of file" and other markers are ignored
+    flush()
+    if not hunks:
+        raise EditError("no hunks found in diff")
+    return hunks
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """Write text via a temp file in the same directory and rename over the target."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = _create_temp(path.parent, f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        _copy_mode(tmp, path)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _create_temp(directory: Path, prefix: str) -> tuple[int, str]:
+    """Like ``tempfile.mkstemp``, but created with mode 0o666 so the kernel applies the umask.
+
+    A temp file renamed over a path that did not exist keeps this mode, so
+    it ends up with the permissions any newly created file would get.
+    """
+    for _ in range(100):
+        tmp = os.path.join(directory, f"{prefix}{secrets.token_hex(4)}.tmp")
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            continue
+        return fd, tmp
+    raise FileExistsError(errno.EEXIST, "no usable temporary file name found")
+
+
+def _copy_mode(tmp: str, path: Path) -> None:
+    """Give ``tmp`` the mode of the file it replaces; a new file keeps its own."""
+    try:
+        mode = path.stat().st_mode & 0o7777
+    except FileNotFoundError:
+        return
+    os.chmod(tmp, mode)
+
+
+class StagedFile:
+    """A file written incrementally to a temp file and committed atomically.
+
+    Text is encoded and written as it arrives, so memory stays flat; size
+    and SHA-256 are tracked on the way. ``commit`` renames the temp file
+    over the target; ``discard`` deletes it.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        on_progress: Callable[[StagedFile], None] | None = None,
+    ) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        fd, self.tmp_path = _create_temp(directory, ".marviz-")
+        self._file = os.fdopen(fd, "wb")
+        self._sha = hashlib.sha256()
+        self.size = 0
+        self.chars = 0
+        self.on_progress = on_progress
+        self.done = False
+
+    def write(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self._file.write(data)
+        self._sha.update(data)
+        self.size += len(data)
+        self.chars += len(text)
+        if self.on_progress is not None:
+            self.on_progress(self)
+
+    def hexdigest(self) -> str:
+        return self._sha.hexdigest()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+    def discard(self) -> None:
+        self.close()
+        if not self.done:
+            self.done = True
+            try:
+                os.unlink(self.tmp_path)
+            except OSError:
+                pass
+
+    def commit(self, path: Path) -> None:
+        """Atomically replace ``path`` with the staged content."""
+        if self.done:
+            raise ValueError("staged file already committed or discarded")
+        self.close()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _copy_mode(self.tmp_path, path)
+        try:
+            os.replace(self.tmp_path, path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # Staged on another filesystem: copy next to the target, then rename
+            fd, tmp = _create_temp(path.parent, f".{path.name}.")
+            os.close(fd)
+            try:
+                shutil.copyfile(self.tmp_path, tmp)
+                _copy_mode(tmp, path)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            os.unlink(self.tmp_path)
+        self.done = True
+
+
+def edit_file(
+    path: Path,
+    hunks: list[Hunk],
+    cache: FileCache | None = None,
+    stats: CacheStats | None = None,
+) -> EditResult:
+    """Apply hunks to a file on disk and write the result atomically.
+
+    With a ``cache``, the file is read through it and the result written through it.
+    """
+    if cache is None:
+        original = path.read_bytes().decode("utf-8")
+    else:
+        cached = cache.read(path, stats)
+        if cached.lossy:
+            raise EditError("the file is not valid UTF-8")
+        original = cached.text
+    crlf = "\r\n" in original
+    text = original.replace("\r\n", "\n") if crlf else original
+    result = apply_hunks(text, hunks)
+    if crlf:
+        result.text = result.text.replace("\n", "\r\n")
+    if result.text != original:
+        atomic_write_text(path, result.text)
+        if cache is not None:
+            cache.store(path, result.text)
+    return result
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import shutil
+from collections import OrderedDict
+from pathlib import Path
+
+# Characters of git output handed to the model per call
+MAX_OUTPUT_CHARS = 20_000
+# Bytes read from git before the rest is dropped (and the process killed)
+_MAX_READ_BYTES = 2_000_000
+_TIMEOUT = 30.0
+_CACHE_ENTRIES = 64
+_MAX_BLAME_LINES = 400
+# Never let a read-only command take the index lock or refresh the index file
+_GIT_ENV = {
+    "GIT_OPTIONAL_LOCKS": "0",
+    "GIT_PAGER": "cat",
+    "GIT_TERMINAL_PROMPT": "0",
+    "LC_ALL": "C",
+}
+
+
+class GitError(RuntimeError):
+    """git is missing, the workspace is not a repository, or a command failed."""
+
+
+def _cap(text: str, what: str) -> str:
+    if len(text) <= MAX_OUTPUT_CHARS:
+        return text
+    end = text.rfind("\n", 0, MAX_OUTPUT_CHARS)
+    return text[: end if end > 0 else MAX_OUTPUT_CHARS] + (
+        f"\n... (output truncated at {MAX_OUTPUT_CHARS:,} of {len(text):,} chars; {what})"
+    )
+
+
+def limit_hunks(diff: str, max_hunks: int) -> str:
+    """Keep the first ``max_hunks`` hunks of each file in a unified diff."""
+    out: list[str] = []
+    hunks = dropped = 0
+
+    def note() -> None:
+        if dropped:
+            out.append(f"... ({dropped} more hunk{'s' if dropped > 1 else ''} in this file)")
+
+    for line in diff.split("\n"):
+        if line.startswith("diff --git "):
+            note()
+            hunks = dropped = 0
+        elif line.startswith("@@"):
+            hunks += 1
+            if hunks > max_hunks:
+                dropped += 1
+        if hunks <= max_hunks:
+            out.append(line)
+    note()
+    return "\n".join(out)
+
+
+def _stat_key(path: Path) -> tuple[int, int, int] | None:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class GitTools:
+    """Read-only git queries for the agents, run without blocking the event loop.
+
+    Results are cached under the repository state they depend on: the
+    HEAD, ref and index files (by stat), the stat of the paths asked
+    about, and for diffs against the working tree, its status (see
+    ``_worktree``), so changes made by commands or outside the app are
+    seen. ``git_status`` always runs; log, blame and staged diffs repeated
+    in an unchanged repository cost no process at all.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self._git = shutil.which("git")
+        self._dirs: tuple[Path, Path] | None = None  # (git dir, common dir)
+        self._cache: OrderedDict[tuple, str] = OrderedDict()
+
+    # ── Commands ──
+
+    async def status(self) -> str:
+        out = await self._run("status", "--porcelain=v1", "--branch", "--untracked-files=normal")
+        lines = out.rstrip("\n").split("\n")
+        if len(lines) == 1:
+            lines.append("(working tree clean)")
+        return _cap("\n".join(lines), "too many changed files; use git_diff with paths")
+
+    async def diff(
+        self,
+        paths: list[str] | None = None,
+        staged: bool = False,
+        ref: str | None = None,
+        context: int = 3,
+        max_hunks: int = 20,
+    ) -> str:
+        args = ["diff", "--no-color", "--no-ext-diff", f"--unified={max(0, min(context, 20))}"]
+        if staged:
+            args.append("--cached")
+        if ref:
+            self._check_ref(ref)
+            args.append(ref)
+        args.append("--")
+        args += paths or []
+        out = await self._cached(tuple(args), worktree=not staged, paths=paths or ())
+        if not out.strip():
+            return "No differences."
+        out = limit_hunks(out.rstrip("\n"), max(1, max_hunks))
+        return _cap(out, "narrow it with paths or max_hunks")
+
+    async def log(
+        self, path: str | None = None, max_count: int = 20, ref: str | None = None
+    ) -> str:
+        args = [
+            "log",
+            f"--max-count={max(1, min(max_count, 200))}",
+            "--date=short",
+            "--format=%h %ad %an%d  %s",
+        ]
+        if ref:
+            self._check_ref(ref)
+            args.append(ref)
+        args.append("--")
+        if path:
+            args.append(path)
+        out = await self._cached(tuple(args), worktree=False)
+        return _cap(out.rstrip("\n") or "No commits.", "lower max_count")
+
+    async def blame_range(self, path: str, start: int, end: int) -> str:
+        start = max(1, start)
+        end = max(start, min(end, start + _MAX_BLAME_LINES - 1))
+        args = ("blame", "--date=short", "-L", f"{start},{end}", "--", path)
+        out = await self._cached(args, worktree=False, paths=(path,))
+        return _cap(out.rstrip("\n"), "ask for a smaller range")
+
+    def clear_cache(self) -> None:
+        """Forget cached output, e.g. after a command that may have run git itself."""
+        self._cache.clear()
+
+    # ── Plumbing ──
+
+    @staticmethod
+    def _check_ref(ref: str) -> None:
+        if ref.startswith("-"):
+            raise GitError(f"invalid ref '{ref}'")
+
+    async def _cached(self, args: tuple[str, ...], worktree: bool, paths=()) -> str:
+        key = (args, await self._state(worktree, paths))
+        out = self._cache.get(key)
+        if out is not None:
+            self._cache.move_to_end(key)
+            return out
+        out = await self._run(*args)
+        self._cache[key] = out
+        if len(self._cache) > _CACHE_ENTRIES:
+            self._cache.popitem(last=False)
+        return out
+
+    async def _state(self, worktree: bool, paths) -> tuple:
+        """HEAD and the stat of the files a query depends on; ``worktree`` adds its status."""
+        git_dir, common_dir = await self._git_dirs()
+        files = [git_dir / "HEAD", git_dir / "index", common_dir / "packed-refs"]
+        try:
+            head = (git_dir / "HEAD").read_text().strip()
+        except OSError:
+            head = ""
+        if head.startswith("ref: "):
+            files.append(common_dir / head[5:])
+        files += [self.root / p for p in paths]
+        state: list = [head, await self._worktree() if worktree else None]
+        state += [_stat_key(path) for path in files]
+        return tuple(state)
+
+    async def _worktree(self) -> tuple:
+        """Which files differ from the index, and the stat of each of them.
+
+        A file edited again after it was first changed keeps its status
+        line but not its stat, so the pair changes whenever a diff against
+        the working tree could.
+        """
+        out = await self._run("status", "--porcelain=v1", "-z", "--untracked-files=normal")
+        entries = [entry for entry in out.split("\0") if entry]
+        # "XY path" entries; a rename's source follows as a bare path
+        paths = [entry[3:] if entry[2:3] == " " else entry for entry in entries]
+        return out, tuple(_stat_key(self.root / p) for p in paths)
+
+    async def _git_dirs(self) -> tuple[Path, Path]:
+        if self._dirs is None:
+            out = await self._run("rev-parse", "--absolute-git-dir", "--git-common-dir")
+            git_dir, common_dir = out.strip().split("\n")
+            common = Path(common_dir)
+            self._dirs = (Path(git_dir), common if common.is_absolute() else self.root / common)
+        return self._dirs
+
+    async def _run(self, *args: str) -> str:
+        if self._git is None:
+            raise GitError("git is not installed")
+        proc = await asyncio.create_subprocess_exec(
+            self._git,
+            *args,
+            cwd=self.root,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env={**os.environ, **_GIT_ENV},
+        )
+        try:
+            stdout, stderr, truncated = await asyncio.wait_for(self._read(proc), _TIMEOUT)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise GitError(f"git {args[0]} timed out after {_TIMEOUT:.0f}s") from None
+        if proc.returncode != 0 and not truncated:
+            message = stderr.decode("utf-8", errors="replace").strip()
+            if "not a git repository" in message:
+                raise GitError("not a git repository")
+            raise GitError(message.splitlines()[0] if message else f"git {args[0]} failed")
+        return stdout.decode("utf-8", errors="replace")
+
+    @staticmethod
+    async def _read(proc: asyncio.subprocess.Process) -> tuple[bytes, bytes, bool]:
+        """Read stdout up to _MAX_READ_BYTES, killing git if it has more to say."""
+        stderr_task = asyncio.ensure_future(proc.stderr.read())
+        chunks: list[bytes] = []
+        size = 0
+        truncated = False
+        while chunk := await proc.stdout.read(65536):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= _MAX_READ_BYTES:
+                truncated = True
+                proc.kill()
+                break
+        stderr = await stderr_task
+        await proc.wait()
+        return b"".join(chunks), stderr, truncated
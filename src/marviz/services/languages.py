@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+# File extension -> language name, as used by tree-sitter and the editor's highlighting
+EXT_TO_LANGUAGE: dict[str, str | None] = {
+    ".py": "python",
+    ".js": "javascript",
+    ".ts": "typescript",
+    ".jsx": "javascript",
+    ".tsx": "typescript",
+    ".html": "html",
+    ".css": "css",
+    ".json": "json",
+    ".md": "markdown",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+    ".toml": "toml",
+    ".rs": "rust",
+    ".go": "go",
+    ".sh": "bash",
+    ".bash": "bash",
+    ".sql": "sql",
+    ".xml": "xml",
+}
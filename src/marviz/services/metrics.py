@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import json
+import time
+from bisect import bisect_left
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from .file_edit import atomic_write_text
+
+# Upper bounds (seconds) of the inter-chunk gap histogram buckets; the last is +Inf
+GAP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+@dataclass
+class StreamMetrics:
+    """Timing of one provider.stream call."""
+
+    role: str
+    worker: str
+    model: str
+    started_at: float  # wall clock, for the log
+    ttft: float | None = None  # seconds to first text/tool chunk
+    duration: float = 0.0
+    chunks: int = 0
+    output_chars: int = 0
+    gap_buckets: list[int] = field(default_factory=lambda: [0] * (len(GAP_BUCKETS) + 1))
+    max_gap: float = 0.0
+    gap_sum: float = 0.0
+    error: bool = False
+    cancelled: bool = False
+
+    @property
+    def output_tokens(self) -> int:
+        return self.output_chars // 4  # same estimate as the status bar
+
+    @property
+    def tokens_per_second(self) -> float:
+        generating = self.duration - (self.ttft or 0.0)
+        return self.output_tokens / generating if generating > 0 else 0.0
+
+    def to_record(self) -> dict:
+        record = asdict(self)
+        record["output_tokens"] = self.output_tokens
+        record["tokens_per_second"] = round(self.tokens_per_second, 2)
+        return record
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class StreamTimer:
+    """Measures a single stream; feed every chunk, then call ``finish``."""
+
+    def __init__(self, recorder: MetricsRecorder, metrics: StreamMetrics) -> None:
+        self._recorder = recorder
+        self.metrics = metrics
+        self._start = time.perf_counter()
+        self._last: float | None = None
+        self._done = False
+
+    def on_chunk(self, chunk) -> None:
+        now = time.perf_counter()
+        m = self.metrics
+        m.chunks += 1
+        if chunk.type == "error":
+            m.error = True
+            return
+        if chunk.type == "text":
+            m.output_chars += len(chunk.content)
+        elif chunk.tool_args:
+            m.output_chars += len(chunk.tool_args)
+        if self._last is None:
+            m.ttft = now - self._start
+            self._recorder.notify_first_token(m)
+        else:
+            gap = now - self._last
+            m.gap_buckets[bisect_left(GAP_BUCKETS, gap)] += 1
+            m.max_gap = max(m.max_gap, gap)
+            m.gap_sum += gap
+        self._last = now
+
+    def finish(self, cancelled: bool = False) -> StreamMetrics:
+        if not self._done:
+            self._done = True
+            self.metrics.duration = time.perf_counter() - self._start
+            self.metrics.cancelled = cancelled
+            self._recorder.record(self.metrics)
+        return self.metrics
+
+
+class MetricsRecorder:
+    """Collects stream metrics, notifies listeners and persists them.
+
+    ``path`` ending in ``.prom`` is rewritten as a Prometheus text snapshot
+    of cumulative counters; any other path gets one JSON line per stream,
+    rotated at ``max_bytes`` keeping ``backups`` old files.
+    """
+
+    def __init__(
+        self,
+        path: Path | None = None,
+        max_bytes: int = 5_000_000,
+        backups: int = 3,
+        keep: int = 200,
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.keep = keep
+        self.recent: list[StreamMetrics] = []
+        self.listeners: list[Callable[[StreamMetrics, bool], None]] = []  # (metrics, finished)
+        self._totals: dict[tuple[str, str, str], dict] = {}
+
+    def start(self, role: str, worker: str, model: str) -> StreamTimer:
+        return StreamTimer(self, StreamMetrics(role, worker, model, time.time()))
+
+    def notify_first_token(self, metrics: StreamMetrics) -> None:
+        for listener in self.listeners:
+            listener(metrics, False)
+
+    def record(self, metrics: StreamMetrics) -> None:
+        self.recent.append(metrics)
+        del self.recent[: -self.keep]
+        self._accumulate(metrics)
+        for listener in self.listeners:
+            listener(metrics, True)
+        if self.path is None:
+            return
+        try:
+            if self.path.suffix == ".prom":
+                atomic_write_text(self.path, self.prometheus_text())
+            else:
+                self._append_jsonl(metrics.to_record())
+        except OSError:
+            pass  # metrics must never break a stream
+
+    def _accumulate(self, m: StreamMetrics) -> None:
+        key = (m.role, m.worker, m.model)
+        t = self._totals.setdefault(
+            key,
+            {
+                "streams": 0,
+                "errors": 0,
+                "ttft_sum": 0.0,
+                "ttft_count": 0,
+                "duration_sum": 0.0,
+                "output_tokens": 0,
+                "gaps": [0] * (len(GAP_BUCKETS) + 1),
+                "gap_sum": 0.0,
+            },
+        )
+        t["streams"] += 1
+        t["errors"] += int(m.error)
+        if m.ttft is not None:
+            t["ttft_sum"] += m.ttft
+            t["ttft_count"] += 1
+        t["duration_sum"] += m.duration
+        t["output_tokens"] += m.output_tokens
+        t["gaps"] = [a + b for a, b in zip(t["gaps"], m.gap_buckets)]
+        t["gap_sum"] += m.gap_sum
+
+    def _append_jsonl(self, record: dict) -> None:
+        path = self.path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists() and path.stat().st_size >= self.max_bytes:
+            for i in range(self.backups - 1, 0, -1):
+                older = path.with_name(f"{path.name}.{i}")
+                if older.exists():
+                    older.replace(path.with_name(f"{path.name}.{i + 1}"))
+            path.replace(path.with_name(f"{path.name}.1"))
+        with path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def prometheus_text(self) -> str:
+        """Render cumulative totals in the Prometheus text exposition format."""
+        lines = [
+            "# TYPE marviz_streams_total counter",
+            "# TYPE marviz_stream_errors_total counter",
+            "# TYPE marviz_stream_ttft_seconds summary",
+            "# TYPE marviz_stream_duration_seconds summary",
+            "# TYPE marviz_output_tokens_total counter",
+            "# TYPE marviz_chunk_gap_seconds histogram",
+        ]
+        for (role, worker, model), t in sorted(self._totals.items()):
+            labels = ",".join(
+                f'{name}="{_escape_label(value)}"'
+                for name, value in (("role", role), ("worker", worker), ("model", model))
+            )
+            lines += [
+                f"marviz_streams_total{{{labels}}} {t['streams']}",
+                f"marviz_stream_errors_total{{{labels}}} {t['errors']}",
+                f"marviz_stream_ttft_seconds_sum{{{labels}}} {t['ttft_sum']:.6f}",
+                f"marviz_stream_ttft_seconds_count{{{labels}}} {t['ttft_count']}",
+                f"marviz_stream_duration_seconds_sum{{{labels}}} {t['duration_sum']:.6f}",
+                f"marviz_stream_duration_seconds_count{{{labels}}} {t['streams']}",
+                f"marviz_output_tokens_total{{{labels}}} {t['output_tokens']}",
+            ]
+            cumulative = 0
+            for bound, count in zip((*GAP_BUCKETS, "+Inf"), t["gaps"]):
+                cumulative += count
+                lines.append(f'marviz_chunk_gap_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"marviz_chunk_gap_seconds_sum{{{labels}}} {t['gap_sum']:.6f}")
+            lines.append(f"marviz_chunk_gap_seconds_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
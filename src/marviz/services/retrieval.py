@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import fnmatch
+import heapq
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # scoring falls back to pure Python
+    np = None
+
+# Target chunk size; a chunk ends early at a blank line within the last _CHUNK_SLACK lines
+_CHUNK_LINES = 40
+_CHUNK_SLACK = 12
+_WORD = re.compile(r"[A-Za-z0-9_]+")
+_SUBWORD = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+# Common in questions, rare in code, so they would otherwise get a high idf
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me of on or "
+    "our should so that the this to was we what when where which who why will with "
+    "you".split()
+)
+
+
+@lru_cache(maxsize=65536)
+def _word_tokens(word: str) -> tuple[str, ...]:
+    lower = word.lower()
+    tokens = [lower] if len(lower) > 1 else []
+    parts = [p.lower() for piece in word.split("_") for p in _SUBWORD.findall(piece)]
+    if len(parts) > 1:
+        tokens.extend(p for p in parts if len(p) > 1)
+    return tuple(tokens)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased identifiers plus their snake_case/camelCase parts."""
+    return [token for word in _WORD.findall(text) for token in _word_tokens(word)]
+
+
+def term_counts(text: str) -> Counter[str]:
+    counts: Counter[str] = Counter()
+    for word, n in Counter(_WORD.findall(text)).items():
+        for token in _word_tokens(word):
+            counts[token] += n
+    return counts
+
+
+def chunk_lines(text: str) -> list[tuple[int, int, str]]:
+    """Split text into ``(start_line, end_line, text)`` chunks of about _CHUNK_LINES lines."""
+    lines = text.split("\n")
+    chunks: list[tuple[int, int, str]] = []
+    start = 0
+    while start < len(lines):
+        end = min(start + _CHUNK_LINES, len(lines))
+        if end < len(lines):
+            for i in range(end - 1, end - _CHUNK_SLACK, -1):
+                if not lines[i].strip():
+                    end = i + 1
+                    break
+        body = "\n".join(lines[start:end])
+        if body.strip():
+            chunks.append((start + 1, end, body))
+        start = end
+    return chunks
+
+
+@dataclass(frozen=True)
+class RetrievalHit:
+    """A chunk of a workspace file that matched a query."""
+
+    path: str
+    start_line: int  # 1-based, inclusive
+    end_line: int
+    score: float
+    text: str
+
+
+@dataclass
+class _Chunk:
+    path: str
+    start_line: int
+    end_line: int
+    text: str
+    terms: array  # term ids ('i')
+    counts: array  # term frequencies ('f'), parallel to terms
+
+
+class RetrievalIndex:
+    """Okapi BM25 over line chunks of workspace files, updated file by file.
+
+    Fed by ``CodeSearchIndex`` listeners like ``SymbolIndex``. Postings are
+    append-only typed arrays per term (chunk ids and term frequencies),
+    scored with NumPy when it is installed. Removed chunks are tombstoned
+    by a zero length and dropped when the index compacts itself.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self._term_ids: dict[str, int] = {}
+        self._postings: list[tuple[array, array]] = []  # term id -> (chunk ids, tfs)
+        self._df = array("i")  # term id -> live chunks containing it
+        self._chunks: list[_Chunk | None] = []
+        self._lengths = array("f")  # chunk id -> token count, 0 when removed
+        self._by_path: dict[str, list[int]] = {}
+        self._live = 0
+        self._total_length = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._live
+
+    def on_file_changed(self, path: str, text: str | None) -> None:
+        """Listener for ``CodeSearchIndex``: re-chunk or drop a file."""
+        chunks = []
+        if text is not None:
+            for start, end, body in chunk_lines(text):
+                counts = term_counts(body)
+                if counts:
+                    chunks.append((start, end, body, counts))
+        with self._lock:
+            for chunk_id in self._by_path.pop(path, ()):
+                self._remove_chunk(chunk_id)
+            if chunks:
+                self._by_path[path] = [self._add_chunk(path, *chunk) for chunk in chunks]
+            if len(self._chunks) > 1000 and len(self._chunks) > 2 * self._live:
+                self._compact()
+
+    def _term_id(self, term: str) -> int:
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            term_id = self._term_ids[term] = len(self._postings)
+            self._postings.append((array("i"), array("f")))
+            self._df.append(0)
+        return term_id
+
+    def _add_chunk(self, path: str, start: int, end: int, body: str, counts: Counter[str]) -> int:
+        chunk_id = len(self._chunks)
+        terms, tfs = array("i"), array("f")
+        for term, count in counts.items():
+            term_id = self._term_id(term)
+            ids, freqs = self._postings[term_id]
+            ids.append(chunk_id)
+            freqs.append(count)
+            self._df[term_id] += 1
+            terms.append(term_id)
+            tfs.append(count)
+        length = float(sum(counts.values()))
+        self._chunks.append(_Chunk(path, start, end, body, terms, tfs))
+        self._lengths.append(length)
+        self._live += 1
+        self._total_length += length
+        return chunk_id
+
+    def _remove_chunk(self, chunk_id: int) -> None:
+        chunk = self._chunks[chunk_id]
+        if chunk is None:
+            return
+        for term_id in chunk.terms:
+            self._df[term_id] -= 1
+        self._total_length -= self._lengths[chunk_id]
+        self._lengths[chunk_id] = 0.0
+        self._chunks[chunk_id] = None
+        self._live -= 1
+
+    def _compact(self) -> None:
+        """Rebuild postings from live chunks only, renumbering them; term ids are kept."""
+        live = [chunk for chunk in self._chunks if chunk is not None]
+        self._postings = [(array("i"), array("f")) for _ in self._postings]
+        self._chunks = []
+        self._lengths = array("f")
+        self._by_path = {}
+        for chunk in live:
+            chunk_id = len(self._chunks)
+            for term_id, count in zip(chunk.terms, chunk.counts):
+                ids, freqs = self._postings[term_id]
+                ids.append(chunk_id)
+                freqs.append(count)
+            self._chunks.append(chunk)
+            self._lengths.append(float(sum(chunk.counts)))
+            self._by_path.setdefault(chunk.path, []).append(chunk_id)
+
+    def search(self, query: str, k: int = 5, glob: str | None = None) -> list[RetrievalHit]:
+        """Return the ``k`` chunks scoring highest for ``query`` under BM25."""
+        terms = {t for t in tokenize(query) if t not in _STOPWORDS}
+        with self._lock:
+            if not self._live:
+                return []
+            n = self._live
+            avg_length = self._total_length / n
+            weights = []
+            for term in terms:
+                term_id = self._term_ids.get(term)
+                if term_id is None or not self._df[term_id]:
+                    continue
+                df = self._df[term_id]
+                weights.append((term_id, math.log(1 + (n - df + 0.5) / (df + 0.5))))
+            if not weights:
+                return []
+            scorer = self._scores_numpy if np is not None else self._scores_python
+            # With a glob, filtering happens after ranking, so rank everything
+            ranked = scorer(weights, avg_length, k if glob is None else None)
+            hits: list[RetrievalHit] = []
+            for chunk_id, score in ranked:
+                chunk = self._chunks[chunk_id]
+                if chunk is None or (glob and not fnmatch.fnmatch(chunk.path, glob)):
+                    continue
+                hits.append(
+                    RetrievalHit(chunk.path, chunk.start_line, chunk.end_line, score, chunk.text)
+                )
+                if len(hits) >= k:
+                    break
+        return hits
+
+    def _scores_numpy(
+        self, weights: list[tuple[int, float]], avg_length: float, limit: int | None
+    ) -> list[tuple[int, float]]:
+        lengths = np.frombuffer(self._lengths, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+        scores = np.zeros(len(lengths), dtype=np.float32)
+        for term_id, idf in weights:
+            ids, freqs = self._postings[term_id]
+            ids = np.frombuffer(ids, dtype=np.int32)
+            tf = np.frombuffer(freqs, dtype=np.float32)
+            # A term occurs once per chunk in its postings, so plain fancy-index += is safe
+            scores[ids] += idf * tf * (self.k1 + 1) / (tf + norm[ids])
+        scores[lengths == 0] = 0.0
+        candidates = np.flatnonzero(scores)
+        if limit is not None and len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit)[:limit]]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(i), float(scores[i])) for i in order]
+
+    def _scores_python(
+        self, weights: list[tuple[int, float]], avg_length: float, limit: int | None
+    ) -> list[tuple[int, float]]:
+        k1, b, lengths = self.k1, self.b, self._lengths
+        scores: dict[int, float] = {}
+        for term_id, idf in weights:
+            ids, freqs = self._postings[term_id]
+            for chunk_id, tf in zip(ids, freqs):
+                length = lengths[chunk_id]
+                if length:
+                    norm = k1 * (1 - b + b * length / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        if limit is not None:
+            return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return sorted(scores.items(), key=lambda item: -item[1])
+
+
+def format_hits(hits: list[RetrievalHit], token_budget: int = 2000) -> str:
+    """Render hits as ``path:start-end`` headers with their text, within a token budget.
+
+    Tokens are estimated as chars / 4; a chunk that does not fit is cut,
+    and nothing further is added once the budget is spent.
+    """
+    if not hits:
+        return "No relevant code found."
+    budget = token_budget * 4
+    out: list[str] = []
+    for hit in hits:
+        header = f"{hit.path}:{hit.start_line}-{hit.end_line}"
+        room = budget - len(header) - 1
+        if room < 200:
+            break
+        text = hit.text if len(hit.text) <= room else hit.text[:room] + "\n..."
+        out.append(f"{header}\n{text}")
+        budget -= len(header) + len(text) + 1
+    return "\n\n".join(out)
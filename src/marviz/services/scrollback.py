@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import re
+import tempfile
+from array import array
+from collections.abc import Iterable, Iterator
+from typing import BinaryIO
+
+
+class ScrollbackSpill:
+    """Append-only on-disk segment holding lines evicted from a bounded log.
+
+    Lines are stored as UTF-8 records in an anonymous temp file; a byte-offset
+    table keeps random access O(1) so pages can be read back lazily.
+    """
+
+    def __init__(self) -> None:
+        self._file: BinaryIO | None = None
+        self._offsets = array("Q")  # start offset of each line
+        self._end = 0
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def append(self, lines: Iterable[str]) -> None:
+        """Spill lines to the end of the segment."""
+        payload = bytearray()
+        for line in lines:
+            self._offsets.append(self._end + len(payload))
+            payload += line.replace("\n", " ").encode("utf-8") + b"\n"
+        if not payload:
+            return
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix="marviz-scrollback-")
+        self._file.seek(self._end)
+        self._file.write(payload)
+        self._end += len(payload)
+
+    def read(self, start: int, stop: int) -> list[str]:
+        """Read spilled lines in ``[start, stop)``."""
+        start = max(start, 0)
+        stop = min(stop, len(self._offsets))
+        if self._file is None or start >= stop:
+            return []
+        begin = self._offsets[start]
+        end = self._offsets[stop] if stop < len(self._offsets) else self._end
+        self._file.seek(begin)
+        data = self._file.read(end - begin)
+        return data.decode("utf-8").split("\n")[: stop - start]
+
+    def search(self, query: str, *, regex: bool = False) -> Iterator[tuple[int, str]]:
+        """Yield ``(line_number, text)`` for spilled lines matching query (case-insensitive)."""
+        if self._file is None:
+            return
+        pattern = re.compile(query if regex else re.escape(query), re.IGNORECASE)
+        self._file.flush()
+        self._file.seek(0)
+        for number, raw in enumerate(self._file):
+            if number >= len(self._offsets):
+                break
+            text = raw.decode("utf-8").rstrip("\n")
+            if pattern.search(text):
+                yield number, text
+
+    def clear(self) -> None:
+        """Drop all spilled lines."""
+        self._offsets = array("Q")
+        self._end = 0
+        if self._file is not None:
+            self._file.truncate(0)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._offsets = array("Q")
+        self._end = 0
@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import ast
+import fnmatch
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from importlib import import_module
+from pathlib import PurePosixPath
+
+from .languages import EXT_TO_LANGUAGE
+
+try:
+    from tree_sitter import Language, Parser
+except ImportError:  # textual[syntax] not installed
+    Language = Parser = None
+
+# language -> {definition node type: symbol kind}
+_TS_DEFINITIONS: dict[str, dict[str, str]] = {
+    "javascript": {
+        "class_declaration": "class",
+        "function_declaration": "function",
+        "generator_function_declaration": "function",
+        "method_definition": "method",
+    },
+    "rust": {
+        "struct_item": "struct",
+        "enum_item": "enum",
+        "trait_item": "trait",
+        "impl_item": "impl",
+        "mod_item": "module",
+        "function_item": "function",
+        "function_signature_item": "function",
+    },
+    "go": {
+        "type_spec": "type",
+        "function_declaration": "function",
+        "method_declaration": "method",
+    },
+    "bash": {
+        "function_definition": "function",
+    },
+}
+# Kinds whose bodies are not searched for further definitions
+_LEAF_KINDS = {"function", "method"}
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]{2,}")
+
+
+@dataclass(frozen=True)
+class Symbol:
+    """A class, function or other named definition in a source file."""
+
+    name: str
+    kind: str
+    path: str
+    line: int  # 1-based
+    end_line: int
+    signature: str
+    parent: str | None = None
+
+    @property
+    def qualified_name(self) -> str:
+        return f"{self.parent}.{self.name}" if self.parent else self.name
+
+
+def _python_signature(node: ast.AST) -> str:
+    if isinstance(node, ast.ClassDef):
+        bases = ", ".join(ast.unparse(b) for b in node.bases)
+        return f"class {node.name}({bases})" if bases else f"class {node.name}"
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    sig = f"{prefix} {node.name}({ast.unparse(node.args)})"
+    if node.returns is not None:
+        sig += f" -> {ast.unparse(node.returns)}"
+    return sig
+
+
+def parse_python(path: str, text: str) -> list[Symbol]:
+    """Extract top-level classes/functions and class methods with ``ast``."""
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return []
+    symbols: list[Symbol] = []
+
+    def visit(body: list[ast.stmt], parent: str | None) -> None:
+        for node in body:
+            if isinstance(node, ast.ClassDef):
+                kind = "class"
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                kind = "method" if parent else "function"
+            else:
+                continue
+            symbols.append(
+                Symbol(
+                    name=node.name,
+                    kind=kind,
+                    path=path,
+                    line=node.lineno,
+                    end_line=node.end_lineno or node.lineno,
+                    signature=_python_signature(node),
+                    parent=parent,
+                )
+            )
+            if kind == "class":
+                visit(node.body, node.name)
+
+    visit(tree.body, None)
+    return symbols
+
+
+class _TreeSitterParsers:
+    """Lazily loaded tree-sitter parsers for the grammars textual ships."""
+
+    def __init__(self) -> None:
+        self._parsers: dict[str, object | None] = {}
+        self._lock = threading.Lock()
+
+    def get(self, language: str):
+        with self._lock:
+            if language not in self._parsers:
+                self._parsers[language] = self._load(language)
+            return self._parsers[language]
+
+    @staticmethod
+    def _load(language: str):
+        if Parser is None:
+            return None
+        try:
+            module = import_module(f"tree_sitter_{language}")
+            return Parser(Language(module.language()))
+        except (ImportError, AttributeError, OSError, ValueError):
+            return None
+
+
+_PARSERS = _TreeSitterParsers()
+
+
+def parse_tree_sitter(path: str, text: str, language: str) -> list[Symbol]:
+    """Extract definitions with the tree-sitter grammar for ``language``."""
+    definitions = _TS_DEFINITIONS.get(language)
+    parser = _PARSERS.get(language) if definitions else None
+    if parser is None:
+        return []
+    source = text.encode("utf-8")
+    tree = parser.parse(source)
+    symbols: list[Symbol] = []
+
+    def visit(node, parent: str | None) -> None:
+        for child in node.named_children:
+            kind = definitions.get(child.type)
+            if kind is None:
+                visit(child, parent)
+                continue
+            name_node = child.child_by_field_name("name") or child.child_by_field_name("type")
+            if name_node is None:
+                visit(child, parent)
+                continue
+            name = source[name_node.start_byte : name_node.end_byte].decode("utf-8", "replace")
+            # Signature: the header up to the body, limited to its first line
+            body = child.child_by_field_name("body")
+            end = body.start_byte if body is not None else len(source)
+            eol = source.find(b"\n", child.start_byte, end)
+            header = source[child.start_byte : eol if eol >= 0 else end]
+            signature = header.decode("utf-8", "replace").strip()
+            symbols.append(
+                Symbol(
+                    name=name,
+                    kind="method" if kind == "function" and parent else kind,
+                    path=path,
+                    line=child.start_point[0] + 1,
+                    end_line=child.end_point[0] + 1,
+                    signature=signature[:160],
+                    parent=parent,
+                )
+            )
+            if kind not in _LEAF_KINDS:
+                visit(child, name)
+
+    visit(tree.root_node, None)
+    return symbols
+
+
+def extract_symbols(path: str, text: str) -> list[Symbol]:
+    """Extract symbols from a file based on its extension."""
+    language = EXT_TO_LANGUAGE.get(PurePosixPath(path).suffix.lower())
+    if language == "python":
+        return parse_python(path, text)
+    if language:
+        return parse_tree_sitter(path, text, language)
+    return []
+
+
+class SymbolIndex:
+    """Definitions per file plus identifier document frequencies for ranking.
+
+    Fed by ``CodeSearchIndex`` listeners, so it is kept current by the same
+    background build and incremental refresh.
+    """
+
+    def __init__(self) -> None:
+        self._symbols: dict[str, list[Symbol]] = {}
+        self._identifiers: dict[str, frozenset[str]] = {}
+        self._doc_freq: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._version = 0
+        self._map_cache: tuple[int, int, str] | None = None  # (version, budget, map)
+
+    def __len__(self) -> int:
+        return sum(len(s) for s in self._symbols.values())
+
+    def on_file_changed(self, path: str, text: str | None) -> None:
+        """Listener for ``CodeSearchIndex``: re-extract or drop a file."""
+        symbols = extract_symbols(path, text) if text is not None else []
+        identifiers = frozenset(_IDENTIFIER.findall(text)) if symbols else frozenset()
+        with self._lock:
+            self._doc_freq.subtract(self._identifiers.pop(path, ()))
+            self._symbols.pop(path, None)
+            if symbols:
+                self._symbols[path] = symbols
+                self._identifiers[path] = identifiers
+                self._doc_freq.update(identifiers)
+            self._version += 1
+
+    def find(self, query: str, kind: str | None = None, limit: int = 30) -> list[Symbol]:
+        """Find symbols by name, ``Parent.name``, or glob pattern (case-insensitive).
+
+        Exact matches come first, then prefix and substring matches.
+        """
+        q = query.lower()
+        is_glob = any(c in q for c in "*?[")
+        ranked: list[tuple[int, Symbol]] = []
+        with self._lock:
+            for symbols in self._symbols.values():
+                for sym in symbols:
+                    if kind and sym.kind != kind:
+                        continue
+                    name = sym.name.lower()
+                    qualified = sym.qualified_name.lower()
+                    if is_glob:
+                        rank = 0 if fnmatch.fnmatchcase(qualified, q) or fnmatch.fnmatchcase(name, q) else -1
+                    elif q in (name, qualified):
+                        rank = 0
+                    elif name.startswith(q):
+                        rank = 1
+                    elif q in qualified:
+                        rank = 2
+                    else:
+                        rank = -1
+                    if rank >= 0:
+                        ranked.append((rank, sym))
+        ranked.sort(key=lambda item: (item[0], item[1].path, item[1].line))
+        return [sym for _rank, sym in ranked[:limit]]
+
+    def _score(self, sym: Symbol) -> float:
+        # Names referenced from many files matter more; private names matter less.
+        # Methods are capped by their class so common names like close() don't dominate.
+        score = float(self._doc_freq.get(sym.name, 1))
+        if sym.parent:
+            score = min(score, float(self._doc_freq.get(sym.parent, 1))) * 0.5
+        if sym.name.startswith("_"):
+            score *= 0.25
+        return score
+
+    def repo_map(self, token_budget: int = 1024) -> str:
+        """Render a ranked outline of files and signatures within a token budget.
+
+        Files are ordered by the summed reference score of their symbols;
+        symbols within a file keep source order. Tokens are estimated as
+        chars / 4.
+        """
+        with self._lock:
+            cached = self._map_cache
+            if cached and cached[0] == self._version and cached[1] == token_budget:
+                return cached[2]
+            version = self._version
+            files = sorted(
+                self._symbols.items(),
+                key=lambda item: -sum(self._score(s) for s in item[1]),
+            )
+            char_budget = token_budget * 4
+            out: list[str] = []
+            used = 0
+            for path, symbols in files:
+                top = sorted(symbols, key=self._score, reverse=True)[:12]
+                keep = {id(s) for s in top}
+                parents = {s.parent for s in top if s.parent}
+                lines = [f"{path}:"]
+                for sym in symbols:
+                    if id(sym) not in keep and not (not sym.parent and sym.name in parents):
+                        continue
+                    indent = "    " if sym.parent else "  "
+                    lines.append(f"{indent}{sym.signature}  # L{sym.line}")
+                block = "\n".join(lines)
+                if used + len(block) > char_budget:
+                    if used + len(lines[0]) <= char_budget:
+                        out.append(lines[0] + " ...")
+                        used += len(lines[0]) + 4
+                    continue
+                out.append(block)
+                used += len(block)
+        result = "\n".join(out)
+        with self._lock:
+            self._map_cache = (version, token_budget, result)
+        return result
+
+
+def format_symbols(symbols: list[Symbol]) -> str:
+    """Render symbols as ``path:line-end_line  kind  signature``."""
+    if not symbols:
+        return "No matching symbols."
+    return "\n".join(
+        f"{s.path}:{s.line}-{s.end_line}  {s.kind}  {s.signature}"
+        + (f"  (in {s.parent})" if s.parent else "")
+        for s in symbols
+    )
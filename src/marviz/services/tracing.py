@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import itertools
+import json
+import time
+from collections import defaultdict, deque
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .file_edit import atomic_write_text
+
+# Spans kept for clients that attach later and for export
+_KEEP_SPANS = 4000
+# Slack when matching a child's end to its parent's, for clock rounding
+_EPSILON = 1e-4
+
+
+@dataclass
+class Span:
+    """One timed step of a turn; times are seconds since the tracer's epoch."""
+
+    span_id: int
+    name: str
+    cat: str  # turn, stream, tools, tool, delegates, queued, worker, handoff
+    track: str  # lane in the timeline, e.g. "Chat 1" or a worker's name
+    start: float
+    parent_id: int | None = None
+    end: float | None = None
+    args: dict = field(default_factory=dict)
+
+    def to_event(self) -> dict:
+        return {
+            "id": self.span_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "cat": self.cat,
+            "track": self.track,
+            "start": self.start,
+            "end": self.end,
+            "args": self.args,
+        }
+
+
+class Tracer:
+    """Records nested spans of the orchestration and reports each start and end.
+
+    ``listeners`` get the span (as ``Span.to_event()``) when it begins and
+    again when it ends. Finished spans are kept, up to _KEEP_SPANS, so a
+    trace can be replayed or exported later.
+    """
+
+    def __init__(self) -> None:
+        self._origin = time.perf_counter()
+        self._ids = itertools.count(1)
+        self._open: dict[int, Span] = {}
+        self._done: deque[Span] = deque(maxlen=_KEEP_SPANS)
+        self.listeners: list[Callable[[dict], None]] = []
+
+    def now(self) -> float:
+        return time.perf_counter() - self._origin
+
+    def begin(
+        self,
+        name: str,
+        cat: str,
+        track: str,
+        parent: Span | None = None,
+        start: float | None = None,
+        **args,
+    ) -> Span:
+        span = Span(
+            next(self._ids),
+            name,
+            cat,
+            track,
+            self.now() if start is None else start,
+            parent.span_id if parent is not None else None,
+            args=args,
+        )
+        self._open[span.span_id] = span
+        self._notify(span)
+        return span
+
+    def end(self, span: Span | None, **args) -> None:
+        """Finish ``span`` (no-op for None or a span already ended)."""
+        if span is None or span.end is not None:
+            return
+        span.end = self.now()
+        span.args.update(args)
+        self._open.pop(span.span_id, None)
+        self._done.append(span)
+        self._notify(span)
+
+    @contextmanager
+    def span(
+        self, name: str, cat: str, track: str, parent: Span | None = None, **args
+    ) -> Iterator[Span]:
+        span = self.begin(name, cat, track, parent, **args)
+        try:
+            yield span
+        finally:
+            self.end(span)
+
+    def spans(self) -> list[Span]:
+        """Finished spans, then open ones, by start time."""
+        return sorted([*self._done, *self._open.values()], key=lambda s: s.start)
+
+    def _notify(self, span: Span) -> None:
+        event = span.to_event()
+        for listener in list(self.listeners):
+            listener(event)
+
+
+def critical_path(spans: Iterable[dict], root_id: int) -> set[int]:
+    """Ids of the spans on the critical path of ``root_id``'s subtree.
+
+    Walking back from the root's end, the child that finished last is on
+    the path, then the latest child that finished before that one
+    started, and so on; each of them is expanded the same way. Among
+    workers that ran in parallel, only the slowest is on the path.
+    """
+    by_id: dict[int, dict] = {}
+    children: dict[int, list[dict]] = defaultdict(list)
+    for span in spans:
+        by_id[span["id"]] = span
+        if span["parent"] is not None:
+            children[span["parent"]].append(span)
+
+    path: set[int] = set()
+    now = max((s["end"] or s["start"] for s in by_id.values()), default=0.0)
+
+    def end_of(span: dict) -> float:
+        return span["end"] if span["end"] is not None else now  # still running
+
+    def walk(span: dict) -> None:
+        path.add(span["id"])
+        cursor = end_of(span)
+        for child in sorted(children[span["id"]], key=end_of, reverse=True):
+            if end_of(child) <= cursor + _EPSILON:
+                walk(child)
+                cursor = child["start"]
+
+    if root_id in by_id:
+        walk(by_id[root_id])
+    return path
+
+
+def chrome_trace(spans: Iterable[dict]) -> dict:
+    """Spans as a Chrome trace-event document (chrome://tracing, Perfetto).
+
+    Each track becomes a thread of one process; spans are complete ("X")
+    events, and spans still open are cut at the latest time seen.
+    """
+    spans = list(spans)
+    latest = max((s["end"] or s["start"] for s in spans), default=0.0)
+    tracks: dict[str, int] = {}
+    events: list[dict] = []
+    for span in spans:
+        tid = tracks.setdefault(span["track"], len(tracks) + 1)
+        end = span["end"] if span["end"] is not None else latest
+        events.append(
+            {
+                "name": span["name"],
+                "cat": span["cat"],
+                "ph": "X",
+                "ts": round(span["start"] * 1e6),
+                "dur": round((end - span["start"]) * 1e6),
+                "pid": 1,
+                "tid": tid,
+                "args": {**span["args"], "id": span["id"], "parent": span["parent"]},
+            }
+        )
+    meta = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "marviz"}}]
+    meta += [
+        {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": track}}
+        for track, tid in tracks.items()
+    ]
+    return {"traceEvents": meta + events, "displayTimeUnit": "ms"}
+
+
+def write_chrome_trace(path: Path, spans: Iterable[dict]) -> Path:
+    atomic_write_text(path, json.dumps(chrome_trace(spans)))
+    return path
@@ -1,28 +1,19 @@
+from __future__ import annotations
+
 from textual.message import Message
+from textual.widget import Widget
 
 
 class UserMessage(Message):
     """User sent a chat message."""
 
-    def __init__(self, text: str) -> None:
+    def __init__(self, text: str, chat_input: Widget | None = None) -> None:
         super().__init__()
         self.text = text
+        self.chat_input = chat_input
 
+    @property
+    def control(self) -> Widget | None:
+        """The input the message was typed in, which identifies the chat session."""
+        return self.chat_input
 
-class SubAgentSpawned(Message):
-    """A sub-agent was created."""
-
-    def __init__(self, agent_id: str, name: str) -> None:
-        super().__init__()
-        self.agent_id = agent_id
-        self.name = name
-
-
-class SubAgentCompleted(Message):
-    """A sub-agent finished its task."""
-
-    def __init__(self, agent_id: str, tool_call_id: str, result: str) -> None:
-        super().__init__()
-        self.agent_id = agent_id
-        self.tool_call_id = tool_call_id
-        self.result = result
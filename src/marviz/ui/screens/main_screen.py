@@ -1,24 +1,22 @@
 from __future__ import annotations
 
-import uuid
-from pathlib import Path
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 
 from textual.app import ComposeResult
 from textual.containers import Horizontal, Vertical
 from textual.screen import Screen
-from textual import work
 
-from textual.widgets import DirectoryTree
+from textual.widgets import DirectoryTree, TextArea
 
-from ...agents.main_agent import MainAgent
-from ...agents.sub_agent import SubAgent
-from ...agents.types import AccumulatedToolCall
 from ...config import MarvizConfig
-from ...providers.litellm_provider import LiteLLMProvider
-from ..messages import SubAgentCompleted, UserMessage
+from ..messages import UserMessage
 from ..widgets import (
     AgentContainer,
     ChatPanel,
+    ChatSessions,
     CodeEditorPanel,
     FileTreePanel,
     FKeyBar,
@@ -26,13 +24,29 @@ from ..widgets import (
     TerminalPanel,
     TitleBar,
 )
+from ..widgets.chat_panel import ChatInput
+from .trace_screen import TraceScreen
 
-# Tools that are executed immediately (no sub-agent needed)
-_IMMEDIATE_TOOLS = {"write_file", "read_file"}
+# Trace spans kept for the F5 view
+_MAX_SPANS = 5000
+
+
+@dataclass
+class SessionView:
+    """Client-side state of one chat session shown in a tab."""
+
+    session_id: str
+    panel: ChatPanel
+    status: str = "Ready"
+    tokens: int = 0
 
 
 class MainScreen(Screen):
-    """MDIR-style main screen with sub-agent orchestration.
+    """MDIR-style main screen; a view of the agent runtime.
+
+    Sessions, agents and workers live in ``app.runtime`` (in-process or a
+    daemon behind a socket); this screen renders its events and sends the
+    user's commands back.
 
     +===========+==================+===========+
     |           |  Worker-1        | Files     |
@@ -49,264 +63,304 @@ class MainScreen(Screen):
     BINDINGS = [
         ("f1", "help", "Help"),
         ("f2", "focus_chat", "Chat"),
+        ("f5", "show_trace", "Agnt"),
+        ("ctrl+t", "new_session", "New chat"),
+        ("ctrl+f4", "close_session", "Close chat"),
+        ("ctrl+pagedown", "next_session", "Next chat"),
+        ("ctrl+pageup", "previous_session", "Previous chat"),
         ("f7", "focus_terminal", "Term"),
         ("f8", "focus_tree", "Tree"),
         ("f10", "quit", "Quit"),
     ]
 
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.config = MarvizConfig.load()
+
     def compose(self) -> ComposeResult:
+        config = self.config
         yield TitleBar()
         with Vertical(id="app-body"):
             with Horizontal(id="main-area"):
-                yield ChatPanel(id="chat-panel")
-                yield AgentContainer(id="agent-container")
+                yield ChatSessions(max_lines=config.chat_scrollback_lines, id="chat-sessions")
+                yield AgentContainer(
+                    max_lines=config.worker_scrollback_lines, id="agent-container"
+                )
                 with Vertical(id="right-column"):
                     yield FileTreePanel(id="file-tree-panel")
                     yield CodeEditorPanel(id="code-editor-panel")
             with Horizontal(id="bottom-row"):
                 yield StatusBar()
-                yield TerminalPanel(id="terminal-panel")
+                yield TerminalPanel(
+                    max_lines=config.terminal_scrollback_lines, id="terminal-panel"
+                )
         yield FKeyBar()
 
     def on_mount(self) -> None:
-        config = MarvizConfig.load()
-        self._provider = LiteLLMProvider(config.default_model)
-        self.main_agent = MainAgent(self._provider)
-        self._pending_results: dict[str, str] = {}  # tool_call_id -> result
-        self._expected_tool_calls: list[AccumulatedToolCall] = []
+        self._sessions: dict[str, SessionView] = {}
+        self._active_session: SessionView | None = None
+        self._switch_to_new = 1  # switch to the next session(s) this client opens
+        self._events: asyncio.Queue[dict] = asyncio.Queue()
+        self._prewarmed_at = 0.0
+        self._attach_refused = False
+        self._spans: OrderedDict[int, dict] = OrderedDict()
 
         status = self.query_one(StatusBar)
-        status.update_model(config.default_model)
-
-        if not MarvizConfig.has_api_key():
-            chat = self.query_one("#chat-panel", ChatPanel)
-            chat.show_error(
-                "No API key found. Set ANTHROPIC_API_KEY (or other provider key) in .env"
+        status.update_agents(0, self.config.max_sub_agents)
+
+        self.run_worker(self._pump_events(), group="runtime-events")
+        self.runtime = self.app.runtime
+        self.runtime.attach(self._events.put_nowait)
+
+    def on_unmount(self) -> None:
+        self.runtime.detach(self._events.put_nowait)
+
+    # ── Runtime events ──
+
+    async def _pump_events(self) -> None:
+        """Apply runtime events in order; opening a session waits for its panel."""
+        while True:
+            event = await self._events.get()
+            if event["event"] == "session_opened":
+                await self._open_session(event["session"], event["label"])
+            elif event["event"] == "session_closed":
+                await self._close_session(event["session"])
+            else:
+                self._apply_event(event)
+
+    def _apply_event(self, event: dict) -> None:
+        kind = event["event"]
+        if kind.startswith("worker_"):
+            self._apply_worker_event(kind, event)
+            return
+        status = self.query_one(StatusBar)
+        if kind == "model":
+            status.update_model(event["name"])
+        elif kind == "attached":
+            if not event["sessions"]:
+                self.runtime.new_session()
+            else:
+                self._switch_to_new = 0
+        elif kind == "attach_refused":
+            self._attach_refused = True
+            self.notify(event["text"], title="Not attached", severity="error", timeout=30)
+            status.update_status(f"Not attached: daemon works in {event['root']}")
+        elif kind == "agents":
+            status.update_agents(event["active"], event["total"])
+        elif kind == "latency":
+            status.update_latency(
+                event["label"], event["ttft"], event["tokens_per_second"], event["max_gap"]
+            )
+        elif kind == "span":
+            span = event["span"]
+            self._spans[span["id"]] = span
+            if len(self._spans) > _MAX_SPANS:
+                self._spans.popitem(last=False)
+        elif kind == "files_changed":
+            self.query_one("#file-tree-panel", FileTreePanel).refresh_tree()
+        elif kind == "disconnected":
+            if self._attach_refused:
+                return
+            if self._active_session is not None:
+                self._active_session.panel.show_error("Disconnected from the marviz daemon")
+            status.update_status("Disconnected")
+        elif "session" in event:
+            self._apply_session_event(kind, event)
+
+    def _apply_session_event(self, kind: str, event: dict) -> None:
+        session = self._sessions.get(event["session"])
+        if session is None:
+            return
+        chat = session.panel
+        if kind == "user":
+            chat.show_user_message(event["text"])
+        elif kind == "token":
+            chat.append_token(event["text"])
+        elif kind == "finish":
+            chat.finish_response()
+        elif kind == "error":
+            chat.show_error(event["text"])
+        elif kind == "note":
+            chat.show_user_message(event["text"])
+        elif kind == "tool_output":
+            chat.show_tool_output(event["text"])
+        elif kind == "status":
+            self._set_status(session, event["text"])
+        elif kind == "tokens":
+            session.tokens = event["count"]
+            if session is self._active_session:
+                self.query_one(StatusBar).update_tokens(session.tokens)
+        elif kind == "session_label":
+            self.query_one("#chat-sessions", ChatSessions).set_label(
+                session.session_id, event["label"]
             )
 
-    def on_user_message(self, event: UserMessage) -> None:
-        chat = self.query_one("#chat-panel", ChatPanel)
-        chat.show_user_message(event.text)
-        self._run_agent(event.text)
-
-    def on_directory_tree_file_selected(
-        self, event: DirectoryTree.FileSelected
-    ) -> None:
-        """Open the selected file in the editor panel."""
-        editor = self.query_one("#code-editor-panel", CodeEditorPanel)
-        editor.open_file(event.path)
-
-    # ── Main agent ──
+    def _apply_worker_event(self, kind: str, event: dict) -> None:
+        container = self.query_one("#agent-container", AgentContainer)
+        agent_id = event["agent_id"]
+        if kind == "worker_started":
+            container.claim_panel(agent_id, event["name"])
+            return
+        if kind == "worker_released":
+            container.release_panel(agent_id, keep_output=True)
+            return
+        panel = container.get_panel(agent_id)
+        if panel is None:
+            return
+        if kind == "worker_token":
+            panel.append_token(event["text"])
+        elif kind == "worker_tool":
+            panel.show_tool_call(event["name"], event["summary"])
+        elif kind == "worker_output":
+            panel.show_output(event["text"])
+        elif kind == "worker_error":
+            panel.show_error(event["text"])
+        elif kind == "worker_finished":
+            panel.finish_response()
+            panel.set_status("done", label=event["name"])
+        elif kind == "worker_budget":
+            panel.show_budget(event["text"])
+
+    # ── Sessions ──
+
+    async def _open_session(self, session_id: str, label: str) -> None:
+        sessions = self.query_one("#chat-sessions", ChatSessions)
+        panel = await sessions.add_session(session_id, label)
+        view = SessionView(session_id, panel)
+        self._sessions[session_id] = view
+        if self._switch_to_new or self._active_session is None:
+            self._switch_to_new = max(self._switch_to_new - 1, 0)
+            self._switch_session(view)
+        else:
+            sessions.activate(self._active_session.session_id)
 
-    @work(exclusive=True, group="main-agent")
-    async def _run_agent(self, text: str) -> None:
-        chat = self.query_one("#chat-panel", ChatPanel)
+    async def _close_session(self, session_id: str) -> None:
+        view = self._sessions.pop(session_id, None)
+        if view is None:
+            return
+        ids = [*self._sessions, session_id]
+        await self.query_one("#chat-sessions", ChatSessions).remove_session(session_id)
+        if view is self._active_session:
+            self._active_session = None
+            if self._sessions:
+                remaining = list(self._sessions.values())
+                index = min(ids.index(session_id), len(remaining) - 1)
+                self._switch_session(remaining[index])
+
+    def _switch_session(self, session: SessionView) -> None:
+        self._active_session = session
+        self.query_one("#chat-sessions", ChatSessions).activate(session.session_id)
         status = self.query_one(StatusBar)
+        status.update_status(session.status)
+        status.update_tokens(session.tokens)
+        session.panel.query_one("#chat-input").focus()
+
+    def _set_status(self, session: SessionView, text: str) -> None:
+        session.status = text
+        self.query_one("#chat-sessions", ChatSessions).set_busy(
+            session.session_id, text != "Ready"
+        )
+        if session is self._active_session:
+            self.query_one(StatusBar).update_status(text)
+
+    def _session_for(self, panel_child) -> SessionView | None:
+        for node in panel_child.ancestors_with_self:
+            if isinstance(node, ChatPanel):
+                return next((s for s in self._sessions.values() if s.panel is node), None)
+        return None
+
+    def action_new_session(self) -> None:
+        self._switch_to_new += 1
+        self.runtime.new_session()
+
+    def action_close_session(self) -> None:
+        session = self._active_session
+        if session is None or len(self._sessions) == 1:
+            return
+        self.runtime.close_session(session.session_id)
 
-        status.update_status("Thinking...")
-        token_count = 0
+    def _cycle_session(self, step: int) -> None:
+        if self._active_session is None:
+            return
+        ids = list(self._sessions)
+        index = ids.index(self._active_session.session_id)
+        self._switch_session(self._sessions[ids[(index + step) % len(ids)]])
 
-        async for chunk in self.main_agent.send(text):
-            if chunk.type == "text":
-                chat.append_token(chunk.content)
-                token_count += len(chunk.content) // 4
-            elif chunk.type == "error":
-                chat.show_error(chunk.content)
+    def action_next_session(self) -> None:
+        self._cycle_session(1)
 
-        chat.finish_response()
-        status.update_tokens(token_count)
+    def action_previous_session(self) -> None:
+        self._cycle_session(-1)
 
-        if self.main_agent.pending_tool_calls:
-            self._process_pending_tools()
+    def on_user_message(self, event: UserMessage) -> None:
+        session = self._session_for(event.control) or self._active_session
+        if session is None:
             return
+        chat = session.panel
+        if event.text.startswith("/find "):
+            chat.show_search_results(event.text[len("/find "):].strip())
+            return
+        if event.text == "/new":
+            self.action_new_session()
+            return
+        if event.text == "/close":
+            self.action_close_session()
+            return
+        if event.text in ("/profile", "/snapshot"):
+            self._run_diagnostics_command(event.text)
+            return
+        self.runtime.send(session.session_id, event.text)
 
-        status.update_status("Ready")
-
-    # ── Tool processing ──
+    def on_text_area_changed(self, event: TextArea.Changed) -> None:
+        """Typing a message re-opens provider connections that went idle."""
+        if not isinstance(event.control, ChatInput):
+            return
+        now = time.monotonic()
+        if now - self._prewarmed_at > 10.0:
+            self._prewarmed_at = now
+            self.runtime.prewarm()
 
-    def _process_pending_tools(self) -> None:
-        """Route pending tool calls: immediate tools execute now, delegates spawn sub-agents."""
-        tool_calls = list(self.main_agent.pending_tool_calls)
-        chat = self.query_one("#chat-panel", ChatPanel)
-        status = self.query_one(StatusBar)
+    def on_directory_tree_file_selected(
+        self, event: DirectoryTree.FileSelected
+    ) -> None:
+        """Open the selected file in the editor panel."""
+        editor = self.query_one("#code-editor-panel", CodeEditorPanel)
+        editor.open_file(event.path)
 
-        immediate_calls = [tc for tc in tool_calls if tc.name in _IMMEDIATE_TOOLS]
-        delegate_calls = [tc for tc in tool_calls if tc.name == "delegate_task"]
-
-        # Execute immediate tools (file ops) right away
-        wrote_file = False
-        for tc in immediate_calls:
-            result = self._execute_tool(tc)
-            self.main_agent.add_tool_result(tc.id, result)
-            chat.show_user_message(f"[tool] {tc.name}: {self._tool_summary(tc)}")
-            if tc.name == "write_file":
-                wrote_file = True
-
-        if wrote_file:
-            file_tree = self.query_one("#file-tree-panel", FileTreePanel)
-            file_tree.refresh_tree()
-
-        if delegate_calls:
-            status.update_status(f"Delegating {len(delegate_calls)} task(s)...")
-            self._dispatch_sub_agents(delegate_calls)
-            # _continue_agent will be called when all sub-agents finish
+    def _run_diagnostics_command(self, command: str) -> None:
+        if self._active_session is None:
+            return
+        chat = self._active_session.panel
+        diagnostics = self.app.diagnostics
+        if diagnostics is None:
+            chat.show_error("Diagnostics are off. Start with --profile or MARVIZ_PROFILE=1")
+            return
+        if command == "/profile":
+            path = diagnostics.dump_profile()
+            lags = diagnostics.lag_monitor.events
+            worst = max((e.lag for e in lags), default=0.0)
+            chat.show_user_message(
+                f"[profile] {diagnostics.profiler.samples} samples -> {path} "
+                f"({len(lags)} loop stalls, worst {worst * 1000:.0f}ms)"
+            )
         else:
-            # Only immediate tools — continue agent right away
-            self._continue_agent()
-
-    def _execute_tool(self, tc: AccumulatedToolCall) -> str:
-        """Execute a non-delegate tool and return the result string."""
-        if tc.name == "write_file":
-            return self._tool_write_file(tc.arguments)
-        elif tc.name == "read_file":
-            return self._tool_read_file(tc.arguments)
-        return f"Unknown tool: {tc.name}"
-
-    def _tool_write_file(self, args: dict) -> str:
-        path_str = args.get("path", "")
-        content = args.get("content", "")
-        if not path_str:
-            return "Error: path is required"
-        try:
-            p = Path(path_str).expanduser()
-            p.parent.mkdir(parents=True, exist_ok=True)
-            p.write_text(content, encoding="utf-8")
-            return f"Wrote {len(content)} chars to {p}"
-        except Exception as e:
-            return f"Error writing file: {e}"
-
-    def _tool_read_file(self, args: dict) -> str:
-        path_str = args.get("path", "")
-        if not path_str:
-            return "Error: path is required"
-        try:
-            p = Path(path_str).expanduser()
-            text = p.read_text(encoding="utf-8")
-            if len(text) > 10_000:
-                return text[:10_000] + f"\n... (truncated, {len(text)} chars total)"
-            return text
-        except Exception as e:
-            return f"Error reading file: {e}"
-
-    @staticmethod
-    def _tool_summary(tc: AccumulatedToolCall) -> str:
-        if tc.name == "write_file":
-            return tc.arguments.get("path", "?")
-        elif tc.name == "read_file":
-            return tc.arguments.get("path", "?")
-        return str(tc.arguments)[:80]
-
-    # ── Sub-agent delegation ──
-
-    def _dispatch_sub_agents(self, tool_calls: list[AccumulatedToolCall]) -> None:
-        """Spawn sub-agents for each delegate_task tool call."""
-        container = self.query_one("#agent-container", AgentContainer)
-        self._expected_tool_calls = list(tool_calls)
-        self._pending_results.clear()
-
-        for tc in tool_calls:
-            task = tc.arguments.get("task", "")
-            worker_name = tc.arguments.get("worker_name", "Worker")
-            agent_id = f"sub-{uuid.uuid4().hex[:8]}"
-
-            panel_id = container.claim_panel(agent_id, worker_name)
-            if panel_id is None:
-                self.main_agent.add_tool_result(
-                    tc.id, "Error: No free worker panel. Max 3 concurrent agents."
+            path = diagnostics.snapshot_memory()
+            if path is None:
+                chat.show_user_message(
+                    "[snapshot] tracemalloc started; run /snapshot again to see allocations"
                 )
-                self._pending_results[tc.id] = "Error: No free panel"
-                self._check_all_completed()
-                continue
-
-            sub_agent = SubAgent(
-                provider=self._provider,
-                agent_id=agent_id,
-                worker_name=worker_name,
-                task=task,
-            )
-            self._run_sub_agent(sub_agent, tc.id)
-
-    @work(exclusive=False, group="sub-agents")
-    async def _run_sub_agent(self, agent: SubAgent, tool_call_id: str) -> None:
-        """Run a sub-agent and stream output to its panel."""
-        container = self.query_one("#agent-container", AgentContainer)
-        panel = container.get_panel(agent.agent_id)
-        full_response = ""
-
-        try:
-            async for chunk in agent.send(agent.task):
-                if chunk.type == "text":
-                    full_response += chunk.content
-                    if panel:
-                        panel.append_token(chunk.content)
-                elif chunk.type == "error":
-                    if panel:
-                        panel.show_error(chunk.content)
-                    full_response += f"\nERROR: {chunk.content}"
-
-            if panel:
-                panel.finish_response()
-                panel.set_status("done", label=agent.worker_name)
-
-        except Exception as exc:
-            full_response = f"Error: {exc}"
-            if panel:
-                panel.show_error(str(exc))
-
-        self.post_message(
-            SubAgentCompleted(
-                agent_id=agent.agent_id,
-                tool_call_id=tool_call_id,
-                result=full_response or "(no output)",
-            )
-        )
-
-    def on_sub_agent_completed(self, event: SubAgentCompleted) -> None:
-        """Handle sub-agent completion: inject result and check if all done."""
-        self.main_agent.add_tool_result(event.tool_call_id, event.result)
-        self._pending_results[event.tool_call_id] = event.result
-        self._check_all_completed()
-
-    def _check_all_completed(self) -> None:
-        """If all expected delegate calls have results, continue the main agent."""
-        expected_ids = {tc.id for tc in self._expected_tool_calls}
-        if expected_ids and expected_ids <= set(self._pending_results.keys()):
-            self._expected_tool_calls.clear()
-            self._continue_agent()
-
-    # ── Continue after tools ──
-
-    @work(exclusive=True, group="main-agent")
-    async def _continue_agent(self) -> None:
-        """Resume MainAgent after tool results are in."""
-        chat = self.query_one("#chat-panel", ChatPanel)
-        status = self.query_one(StatusBar)
-
-        status.update_status("Synthesizing...")
-        token_count = 0
-
-        async for chunk in self.main_agent.continue_after_tools():
-            if chunk.type == "text":
-                chat.append_token(chunk.content)
-                token_count += len(chunk.content) // 4
-            elif chunk.type == "error":
-                chat.show_error(chunk.content)
-
-        chat.finish_response()
-        status.update_tokens(token_count)
-
-        # Check if the LLM wants more tool calls (e.g. delegate → write_file)
-        if self.main_agent.pending_tool_calls:
-            self._process_pending_tools()
-            return
-
-        status.update_status("Ready")
-        self._pending_results.clear()
+            else:
+                chat.show_user_message(f"[snapshot] {path}")
 
     # ── Keybindings ──
 
     def action_focus_chat(self) -> None:
-        self.query_one("#chat-input").focus()
+        if self._active_session is None:
+            return
+        self._active_session.panel.query_one("#chat-input").focus()
+
+    def action_show_trace(self) -> None:
+        self.app.push_screen(TraceScreen(self._spans, self.config.trace_dir))
 
     def action_focus_terminal(self) -> None:
         self.query_one("#terminal-input").focus()
@@ -315,5 +369,10 @@ class MainScreen(Screen):
         self.query_one("#file-tree").focus()
 
     def action_help(self) -> None:
-        log = self.query_one("#chat-log")
-        log.write("[#ffff55]F1[/]=Help [#ffff55]F2[/]=Chat [#ffff55]F7[/]=Term [#ffff55]F8[/]=Tree [#ffff55]F10[/]=Quit")
+        if self._active_session is None:
+            return
+        log = self._active_session.panel.query_one("#chat-log")
+        log.write("[#ffff55]F1[/]=Help [#ffff55]F2[/]=Chat [#ffff55]F5[/]=Agent trace [#ffff55]F7[/]=Term [#ffff55]F8[/]=Tree [#ffff55]F10[/]=Quit")
+        log.write("[#ffff55]Ctrl+T[/] /new=New chat [#ffff55]Ctrl+F4[/] /close=Close chat [#ffff55]Ctrl+PgUp/PgDn[/]=Switch chat")
+        log.write("[#ffff55]/find[/] text=Search chat history")
+        log.write("[#ffff55]/profile[/]=Dump profiler stacks [#ffff55]/snapshot[/]=tracemalloc snapshot")
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import time
+from pathlib import Path
+
+from rich.markup import escape
+from rich.text import Text
+from textual.app import ComposeResult
+from textual.containers import VerticalScroll
+from textual.screen import Screen
+from textual.widgets import Static
+
+from ...services.tracing import critical_path, write_chrome_trace
+
+_LABEL_WIDTH = 30
+_DURATION_WIDTH = 9
+_REFRESH_INTERVAL = 0.5
+# Bar styles: on the critical path, off it, and still running
+_CRITICAL = "bold #ffff55"
+_NORMAL = "#00aaaa"
+_RUNNING = "#55ff55"
+
+
+def _children(spans: dict[int, dict]) -> dict[int | None, list[dict]]:
+    children: dict[int | None, list[dict]] = {}
+    for span in spans.values():
+        children.setdefault(span["parent"], []).append(span)
+    for siblings in children.values():
+        siblings.sort(key=lambda s: s["start"])
+    return children
+
+
+def _duration(span: dict, now: float) -> float:
+    return (span["end"] if span["end"] is not None else now) - span["start"]
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds:.2f}s" if seconds >= 1 else f"{seconds * 1000:.0f}ms"
+
+
+def latest_time(spans: dict[int, dict]) -> float:
+    """The latest start or end seen, standing in for "now" on a client."""
+    return max((s["end"] or s["start"] for s in spans.values()), default=0.0)
+
+
+def turn_ids(spans: dict[int, dict]) -> list[int]:
+    """Ids of the turn spans, oldest first."""
+    return [s["id"] for s in sorted(spans.values(), key=lambda s: s["start"]) if s["cat"] == "turn"]
+
+
+def _cache_use(children: dict[int | None, list[dict]], turn_id: int) -> str:
+    """File-cache hits and misses of every tool in a turn, workers' included."""
+    hits = misses = saved = 0
+    stack = list(children.get(turn_id, []))
+    while stack:
+        span = stack.pop()
+        hits += span["args"].get("cache_hits", 0)
+        misses += span["args"].get("cache_misses", 0)
+        saved += span["args"].get("cache_saved", 0)
+        stack.extend(children.get(span["id"], []))
+    if not hits and not misses:
+        return ""
+    return f"file cache {hits} hit(s), {misses} miss(es), {saved / 1024:.0f} KB not re-read"
+
+
+def breakdown(spans: dict[int, dict], turn_id: int) -> str:
+    """Where a turn's time went: main streaming, tools, waiting on workers, synthesis.
+
+    Followed by the file-cache hits and misses of the turn's tools, if any.
+    """
+    now = latest_time(spans)
+    children = _children(spans)
+    totals = {"stream": 0.0, "tools": 0.0, "workers": 0.0, "synthesis": 0.0}
+    slowest: dict | None = None
+    for span in children.get(turn_id, []):
+        if span["cat"] == "stream":
+            key = "synthesis" if span["name"] == "synthesize" else "stream"
+            totals[key] += _duration(span, now)
+        elif span["cat"] == "tools":
+            totals["tools"] += _duration(span, now)
+        elif span["cat"] == "delegates":
+            totals["workers"] += _duration(span, now)
+            for worker in children.get(span["id"], []):
+                if worker["cat"] == "worker" and (
+                    slowest is None or _duration(worker, now) > _duration(slowest, now)
+                ):
+                    slowest = worker
+    parts = [
+        f"main streaming {_ms(totals['stream'])}",
+        f"tools {_ms(totals['tools'])}",
+        f"waiting on workers {_ms(totals['workers'])}",
+    ]
+    if slowest is not None:
+        parts[-1] += f" (slowest: {slowest['track']} {_ms(_duration(slowest, now))})"
+    parts.append(f"synthesis {_ms(totals['synthesis'])}")
+    cache = _cache_use(children, turn_id)
+    return " · ".join(parts) + (f"\n{cache}" if cache else "")
+
+
+def render_waterfall(spans: dict[int, dict], turn_id: int, width: int) -> Text:
+    """One row per span of a turn: name indented by depth, a bar on the turn's time axis.
+
+    Bars on the critical path are highlighted; spans still running are
+    drawn up to the latest time seen.
+    """
+    turn = spans.get(turn_id)
+    if turn is None:
+        return Text("No trace for this turn.")
+    now = latest_time(spans)
+    children = _children(spans)
+    critical = critical_path(spans.values(), turn_id)
+    total = max(_duration(turn, now), 1e-6)
+    cols = max(10, width - _LABEL_WIDTH - _DURATION_WIDTH - 2)
+
+    out = Text()
+
+    def row(span: dict, depth: int) -> None:
+        label = ("  " * depth + span["name"])[: _LABEL_WIDTH - 1].ljust(_LABEL_WIDTH)
+        offset = int((span["start"] - turn["start"]) / total * cols)
+        length = max(1, round(_duration(span, now) / total * cols))
+        offset = min(offset, cols - 1)
+        length = min(length, cols - offset)
+        if span["end"] is None:
+            style = _RUNNING
+        elif span["id"] in critical:
+            style = _CRITICAL
+        else:
+            style = _NORMAL
+        out.append(label, style="bold #ffffff" if depth == 0 else "#aaaaaa")
+        out.append(" " * offset + "█" * length + " " * (cols - offset - length), style=style)
+        out.append(f" {_ms(_duration(span, now)):>{_DURATION_WIDTH}}\n", style="#aaaaaa")
+        for child in children.get(span["id"], []):
+            row(child, depth + 1)
+
+    row(turn, 0)
+    return out
+
+
+class TraceScreen(Screen):
+    """F5: a waterfall of one turn's spans — streams, tools, queued and running workers.
+
+    ``spans`` is the main screen's live span table (by id), so the view
+    follows a turn while it runs. Left/Right step through turns; ``e``
+    writes every retained span as a Chrome trace (chrome://tracing, Perfetto).
+    """
+
+    BINDINGS = [
+        ("left", "previous_turn", "Previous turn"),
+        ("right", "next_turn", "Next turn"),
+        ("e", "export", "Export"),
+        ("escape", "app.pop_screen", "Back"),
+        ("f5", "app.pop_screen", "Back"),
+    ]
+
+    DEFAULT_CSS = """
+    TraceScreen #trace-header {
+        height: auto;
+        background: #00aaaa;
+        color: black;
+        padding: 0 1;
+    }
+    TraceScreen #trace-body {
+        height: 1fr;
+        border: double #00aaaa;
+        background: #000080;
+    }
+    TraceScreen #trace-footer {
+        height: auto;
+        color: #aaaaaa;
+        padding: 0 1;
+    }
+    """
+
+    def __init__(self, spans: dict[int, dict], export_dir: Path, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.spans = spans
+        self.export_dir = export_dir
+        self._turn_id: int | None = None  # None follows the latest turn
+
+    def compose(self) -> ComposeResult:
+        yield Static("", id="trace-header")
+        with VerticalScroll(id="trace-body"):
+            yield Static("", id="trace-waterfall")
+        yield Static(
+            "[#ffff55]←/→[/] turn  [#ffff55]e[/] export Chrome trace  [#ffff55]Esc[/] back  "
+            f"[{_CRITICAL}]█[/] critical path  [{_RUNNING}]█[/] running",
+            id="trace-footer",
+        )
+
+    def on_mount(self) -> None:
+        self.refresh_trace()
+        self.set_interval(_REFRESH_INTERVAL, self.refresh_trace)
+
+    def refresh_trace(self) -> None:
+        header = self.query_one("#trace-header", Static)
+        waterfall = self.query_one("#trace-waterfall", Static)
+        turns = turn_ids(self.spans)
+        if self._turn_id not in self.spans:
+            self._turn_id = None
+        turn_id = self._turn_id if self._turn_id is not None else (turns[-1] if turns else None)
+        if turn_id is None:
+            header.update("Agent trace")
+            waterfall.update("No turns yet. Send a message, then come back with F5.")
+            return
+        turn = self.spans[turn_id]
+        header.update(
+            f"Turn {turns.index(turn_id) + 1}/{len(turns)} · {escape(turn['track'])} · "
+            f"{escape(turn['args'].get('text', ''))}\n{escape(breakdown(self.spans, turn_id))}"
+        )
+        waterfall.update(
+            render_waterfall(self.spans, turn_id, self.query_one("#trace-body").size.width)
+        )
+
+    def _step(self, step: int) -> None:
+        turns = turn_ids(self.spans)
+        if not turns:
+            return
+        current = turns.index(self._turn_id) if self._turn_id in turns else len(turns) - 1
+        index = max(0, min(len(turns) - 1, current + step))
+        self._turn_id = None if index == len(turns) - 1 else turns[index]
+        self.refresh_trace()
+
+    def action_previous_turn(self) -> None:
+        self._step(-1)
+
+    def action_next_turn(self) -> None:
+        self._step(1)
+
+    def action_export(self) -> None:
+        path = self.export_dir / f"marviz-trace-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        try:
+            write_chrome_trace(path, list(self.spans.values()))
+        except OSError as exc:
+            self.notify(f"Export failed: {exc}", severity="error")
+            return
+        self.notify(f"Trace written to {path}")
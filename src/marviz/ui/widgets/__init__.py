@@ -1,9 +1,11 @@
 from .agent_container import AgentContainer
 from .agent_panel import AgentPanel
 from .chat_panel import ChatPanel
+from .chat_sessions import ChatSessions
 from .code_editor import CodeEditorPanel
 from .file_tree import FileTreePanel
 from .fkey_bar import FKeyBar
+from .scrollback_log import ScrollbackLog
 from .status_bar import StatusBar
 from .terminal_panel import TerminalPanel
 from .title_bar import TitleBar
@@ -12,9 +14,11 @@ __all__ = [
     "AgentContainer",
     "AgentPanel",
     "ChatPanel",
+    "ChatSessions",
     "CodeEditorPanel",
     "FileTreePanel",
     "FKeyBar",
+    "ScrollbackLog",
     "StatusBar",
     "TerminalPanel",
     "TitleBar",
@@ -14,14 +14,15 @@ class AgentContainer(Vertical):
 
     BORDER_TITLE = " Sub-Agents "
 
-    def __init__(self, **kwargs) -> None:
+    def __init__(self, max_lines: int | None = None, **kwargs) -> None:
         super().__init__(**kwargs)
         self._assignments: dict[str, str] = {}  # agent_id -> panel_id
+        self._max_lines = max_lines
 
     def compose(self) -> ComposeResult:
-        yield AgentPanel("Worker-1", id="sub-agent-1")
-        yield AgentPanel("Worker-2", id="sub-agent-2")
-        yield AgentPanel("Worker-3", id="sub-agent-3")
+        yield AgentPanel("Worker-1", max_lines=self._max_lines, id="sub-agent-1")
+        yield AgentPanel("Worker-2", max_lines=self._max_lines, id="sub-agent-2")
+        yield AgentPanel("Worker-3", max_lines=self._max_lines, id="sub-agent-3")
 
     def claim_panel(self, agent_id: str, name: str) -> str | None:
         """Assign an idle panel to an agent. Returns panel_id or None if full."""
@@ -40,13 +41,15 @@ class AgentContainer(Vertical):
                 return pid
         return None
 
-    def release_panel(self, agent_id: str) -> None:
-        """Release a panel slot back to idle."""
+    def release_panel(self, agent_id: str, keep_output: bool = False) -> None:
+        """Release a panel slot. With keep_output, the finished output stays visible
+        until the slot is claimed again; otherwise the panel returns to idle."""
         pid = self._assignments.pop(agent_id, None)
         if pid:
             panel = self.query_one(f"#{pid}", AgentPanel)
             panel._assigned_agent_id = None
-            panel.set_status("idle")
+            if not keep_output:
+                panel.set_status("idle")
 
     def get_panel(self, agent_id: str) -> AgentPanel | None:
         """Get the panel assigned to an agent."""
@@ -2,10 +2,14 @@ from __future__ import annotations
 
 from typing import Literal
 
+from rich.markup import escape
+from rich.text import Text
 from textual.app import ComposeResult
 from textual.containers import Vertical
 from textual.widgets import RichLog, Static
 
+from .markdown_stream import MarkdownStream
+from .scrollback_log import ScrollbackLog
 
 StatusType = Literal["idle", "working", "done", "error"]
 
@@ -20,15 +24,22 @@ _STATUS_STYLES = {
 class AgentPanel(Vertical):
     """Single sub-agent output panel with streaming and status support."""
 
-    def __init__(self, agent_name: str = "Sub-Agent", **kwargs) -> None:
+    def __init__(
+        self, agent_name: str = "Sub-Agent", max_lines: int | None = None, **kwargs
+    ) -> None:
         super().__init__(**kwargs)
         self._agent_name = agent_name
+        self._max_lines = max_lines
         self._status: StatusType = "idle"
         self._assigned_agent_id: str | None = None
-        self._stream_buffer: str = ""
+        self._label = agent_name
+        self._budget = ""  # usage summary shown in the title
+        self._markdown = MarkdownStream()
 
     def compose(self) -> ComposeResult:
-        yield RichLog(highlight=True, markup=True, id=f"{self.id}-log")
+        yield ScrollbackLog(
+            highlight=True, markup=True, max_lines=self._max_lines, id=f"{self.id}-log"
+        )
         yield Static("", classes="agent-streaming")
 
     def on_mount(self) -> None:
@@ -37,28 +48,54 @@ class AgentPanel(Vertical):
     def set_status(self, status: StatusType, label: str | None = None) -> None:
         self._status = status
         color = _STATUS_STYLES[status]
-        name = label or self._agent_name
-        self.border_title = f" {name} \u2500 {status} "
+        name = self._label = label or self._agent_name
+        if status == "idle":
+            self._budget = ""
+        self._update_title()
         log = self.query_one(RichLog)
         if status == "idle":
             log.clear()
             log.write(f"[{color}]{name} \u2500 idle[/]")
 
+    def show_budget(self, usage: str) -> None:
+        """Show budget usage (tokens, time, steps, cost) after the status in the title."""
+        self._budget = usage
+        self._update_title()
+
+    def _update_title(self) -> None:
+        budget = f"\u2500 {self._budget} " if self._budget else ""
+        self.border_title = f" {self._label} \u2500 {self._status} {budget}"
+
     def append_token(self, token: str) -> None:
-        """Append a streamed token to the streaming buffer."""
-        self._stream_buffer += token
+        """Append a streamed token; finished Markdown blocks move to the log."""
+        frozen = self._markdown.feed(token)
+        if frozen:
+            log = self.query_one(RichLog)
+            for block in frozen:
+                log.write(block)
         static = self.query_one(".agent-streaming", Static)
-        static.update(self._stream_buffer)
+        static.update(self._markdown.render_open())
 
     def finish_response(self) -> None:
-        """Flush streaming buffer to permanent log."""
-        if self._stream_buffer:
+        """Flush the open Markdown block to the permanent log."""
+        frozen = self._markdown.close()
+        if frozen:
             log = self.query_one(RichLog)
-            log.write(self._stream_buffer)
-            self._stream_buffer = ""
+            for block in frozen:
+                log.write(block)
             static = self.query_one(".agent-streaming", Static)
             static.update("")
 
+    def show_tool_call(self, name: str, summary: str) -> None:
+        self.finish_response()
+        log = self.query_one(RichLog)
+        log.write(f"[#00aaaa]\\[tool] {name}: {escape(summary)}[/]")
+
+    def show_output(self, text: str) -> None:
+        """Write a chunk of a command's output (whole lines) as plain text."""
+        log = self.query_one(RichLog)
+        log.write(Text(text.rstrip("\n"), style="#aaaaaa"))
+
     def show_error(self, message: str) -> None:
         self.finish_response()
         log = self.query_one(RichLog)
@@ -67,7 +104,7 @@ class AgentPanel(Vertical):
 
     def reset(self) -> None:
         """Clear all content and return to idle."""
-        self._stream_buffer = ""
+        self._markdown = MarkdownStream()
         self._assigned_agent_id = None
         log = self.query_one(RichLog)
         log.clear()
@@ -1,24 +1,28 @@
+from rich.markup import escape
+from rich.text import Text
 from textual.app import ComposeResult
 from textual.containers import Vertical
 from textual.events import Key
 from textual.widgets import RichLog, Static, TextArea
 
 from ..messages import UserMessage
+from .markdown_stream import MarkdownStream
+from .scrollback_log import ScrollbackLog
 
 
 class ChatInput(TextArea):
     """Chat input with Enter-to-submit, Shift+Enter for newline."""
 
-    def _on_key(self, event: Key) -> None:
+    async def _on_key(self, event: Key) -> None:
         if event.key == "enter":
             event.prevent_default()
             event.stop()
             text = self.text.strip()
             if text:
                 self.clear()
-                self.post_message(UserMessage(text))
+                self.post_message(UserMessage(text, self))
             return
-        super()._on_key(event)
+        await super()._on_key(event)
 
 
 class ChatPanel(Vertical):
@@ -26,12 +30,20 @@ class ChatPanel(Vertical):
 
     BORDER_TITLE = " Main Agent "
 
-    def __init__(self, **kwargs) -> None:
+    def __init__(self, max_lines: int | None = None, **kwargs) -> None:
         super().__init__(**kwargs)
-        self._response_buffer = ""
+        self._markdown = MarkdownStream()
+        self._max_lines = max_lines
 
     def compose(self) -> ComposeResult:
-        yield RichLog(highlight=True, markup=True, wrap=True, min_width=0, id="chat-log")
+        yield ScrollbackLog(
+            highlight=True,
+            markup=True,
+            wrap=True,
+            min_width=0,
+            max_lines=self._max_lines,
+            id="chat-log",
+        )
         yield Static("", id="chat-streaming")
         yield ChatInput(id="chat-input", placeholder="> Message...")
 
@@ -46,20 +58,36 @@ class ChatPanel(Vertical):
         log.write(f"[b #ffff55]> {text}[/]")
 
     def append_token(self, text: str) -> None:
-        """Append a streaming token — renders in real-time via Static."""
-        self._response_buffer += text
+        """Append a streaming token — finished blocks go to the log, the open one to Static."""
+        frozen = self._markdown.feed(text)
+        if frozen:
+            log = self.query_one("#chat-log", RichLog)
+            for block in frozen:
+                log.write(block)
         streaming = self.query_one("#chat-streaming", Static)
-        streaming.update(self._response_buffer)
+        streaming.update(self._markdown.render_open())
+
+    def show_tool_output(self, text: str) -> None:
+        """Write a chunk of a command's output (whole lines) as plain text."""
+        log = self.query_one("#chat-log", RichLog)
+        log.write(Text(text.rstrip("\n"), style="#aaaaaa"))
+
+    def show_search_results(self, query: str, limit: int = 20) -> None:
+        """Search the full chat scrollback, including spilled lines."""
+        log = self.query_one("#chat-log", ScrollbackLog)
+        matches = log.search(query) if query else []
+        log.write(f"[#00aaaa]Search '{escape(query)}': {len(matches)} match(es)[/]")
+        for line_no, text in matches[-limit:]:
+            log.write(f"[#005555]{line_no + 1:>6}[/] {escape(text)}")
 
     def show_error(self, text: str) -> None:
         log = self.query_one("#chat-log", RichLog)
         log.write(f"[b red]Error:[/] {text}")
 
     def finish_response(self) -> None:
-        """Move buffered response into the RichLog and reset."""
-        if self._response_buffer:
-            log = self.query_one("#chat-log", RichLog)
-            log.write(self._response_buffer)
-        self._response_buffer = ""
+        """Move the remaining open block into the RichLog and reset."""
+        log = self.query_one("#chat-log", RichLog)
+        for block in self._markdown.close():
+            log.write(block)
         streaming = self.query_one("#chat-streaming", Static)
         streaming.update("")
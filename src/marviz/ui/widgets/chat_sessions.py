@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from rich.markup import escape
+from textual.widgets import ContentSwitcher
+
+from .chat_panel import ChatPanel
+
+
+class ChatSessions(ContentSwitcher):
+    """Chat panels of all sessions; only the active one is displayed.
+
+    The session list is rendered in the visible panel's border title,
+    with the active session highlighted and busy ones marked with ``*``.
+    """
+
+    def __init__(self, max_lines: int | None = None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._max_lines = max_lines
+        self._labels: dict[str, str] = {}  # session_id -> label, in tab order
+        self._busy: set[str] = set()
+
+    async def add_session(self, session_id: str, label: str) -> ChatPanel:
+        """Mount a chat panel for a new session and switch to it."""
+        panel = ChatPanel(max_lines=self._max_lines, id=f"chat-{session_id}")
+        self._labels[session_id] = label
+        await self.mount(panel)
+        self.activate(session_id)
+        return panel
+
+    async def remove_session(self, session_id: str) -> None:
+        self._labels.pop(session_id, None)
+        self._busy.discard(session_id)
+        await self.get_child_by_id(f"chat-{session_id}").remove()
+        self._update_titles()
+
+    def activate(self, session_id: str) -> None:
+        self.current = f"chat-{session_id}"
+        self._update_titles()
+
+    def set_label(self, session_id: str, label: str) -> None:
+        if session_id in self._labels:
+            self._labels[session_id] = label
+            self._update_titles()
+
+    def set_busy(self, session_id: str, busy: bool) -> None:
+        if busy:
+            self._busy.add(session_id)
+        else:
+            self._busy.discard(session_id)
+        self._update_titles()
+
+    def _update_titles(self) -> None:
+        current = self.current
+        parts = []
+        for n, (session_id, label) in enumerate(self._labels.items(), 1):
+            text = f"{n}:{escape(label)}" + ("*" if session_id in self._busy else "")
+            if f"chat-{session_id}" == current:
+                text = f"[reverse]{text}[/]"
+            parts.append(text)
+        title = " " + " ".join(parts) + " "
+        for panel in self.query_children(ChatPanel):
+            panel.border_title = title
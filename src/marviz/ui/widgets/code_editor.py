@@ -8,6 +8,8 @@ from textual.containers import Vertical
 from textual.widgets import TextArea
 from textual.widgets.text_area import TextAreaTheme
 
+from ...services.languages import EXT_TO_LANGUAGE
+
 _MDIR_THEME = TextAreaTheme(
     name="mdir",
     base_style=Style(color="#aaaaaa", bgcolor="#000080"),
@@ -41,27 +43,6 @@ _MDIR_THEME = TextAreaTheme(
     },
 )
 
-_EXT_TO_LANGUAGE: dict[str, str | None] = {
-    ".py": "python",
-    ".js": "javascript",
-    ".ts": "typescript",
-    ".jsx": "javascript",
-    ".tsx": "typescript",
-    ".html": "html",
-    ".css": "css",
-    ".json": "json",
-    ".md": "markdown",
-    ".yaml": "yaml",
-    ".yml": "yaml",
-    ".toml": "toml",
-    ".rs": "rust",
-    ".go": "go",
-    ".sh": "bash",
-    ".bash": "bash",
-    ".sql": "sql",
-    ".xml": "xml",
-}
-
 
 class CodeEditorPanel(Vertical):
     """Code editor — MDIR style."""
@@ -92,7 +73,7 @@ class CodeEditorPanel(Vertical):
             except Exception as e:
                 content = f"(Cannot read file: {e})"
 
-        lang = _EXT_TO_LANGUAGE.get(path.suffix.lower())
+        lang = EXT_TO_LANGUAGE.get(path.suffix.lower())
         editor.language = lang
         editor.load_text(content)
         self.border_title = f" {path.name} "
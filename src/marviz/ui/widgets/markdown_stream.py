@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import re
+
+from pygments.token import Comment, Generic, Keyword, Name, Number, Operator, String, Token
+from rich.console import RenderableType
+from rich.markdown import Markdown
+from rich.syntax import ANSISyntaxTheme, Syntax
+from rich.text import Text
+from textual.widgets.text_area import TextAreaTheme
+
+from .code_editor import _MDIR_THEME
+
+# Pygments token -> TextAreaTheme capture name
+_TOKEN_TO_CAPTURE = {
+    Token: None,
+    Comment: "comment",
+    Keyword: "keyword",
+    Keyword.Constant: "boolean",
+    Keyword.Type: "type",
+    Operator: "operator",
+    Operator.Word: "keyword",
+    Number: "number",
+    Number.Float: "float",
+    String: "string",
+    String.Doc: "string.documentation",
+    String.Escape: "escape",
+    String.Regex: "regex",
+    Name.Function: "function",
+    Name.Class: "class",
+    Name.Builtin: "type",
+    Name.Decorator: "function",
+    Name.Tag: "tag",
+    Name.Attribute: "attribute",
+    Generic.Heading: "heading",
+    Generic.Subheading: "heading",
+}
+
+_FENCE_OPEN = re.compile(r"^ {0,3}(`{3,}|~{3,})\s*([\w+#.-]*)")
+_HEADING = re.compile(r"^ {0,3}#{1,6}(\s|$)")
+
+
+def syntax_theme_from(theme: TextAreaTheme) -> ANSISyntaxTheme:
+    """Build a Rich syntax theme from a TextArea theme's capture styles."""
+    style_map = {}
+    for token, capture in _TOKEN_TO_CAPTURE.items():
+        style = theme.syntax_styles.get(capture) if capture else None
+        style_map[token] = style or theme.base_style
+    return ANSISyntaxTheme(style_map)
+
+
+_MDIR_SYNTAX_THEME = syntax_theme_from(_MDIR_THEME)
+_CODE_BACKGROUND = _MDIR_THEME.base_style.bgcolor.name if _MDIR_THEME.base_style.bgcolor else None
+
+
+class MarkdownStream:
+    """Incremental Markdown renderer for streamed LLM output.
+
+    Text is scanned line by line as it arrives. Completed blocks (paragraphs,
+    headings, closed code fences) are rendered once and handed back by
+    ``feed``; only the still-open block is re-rendered via ``render_open``.
+    """
+
+    def __init__(self) -> None:
+        self._partial = ""  # text after the last newline
+        self._block: list[str] = []  # completed lines of the open block
+        self._fence: str | None = None  # closing marker while inside a code fence
+        self._language = ""
+        self._spaced = True  # whether a blank separator was already emitted
+
+    def feed(self, text: str) -> list[RenderableType]:
+        """Consume streamed text and return blocks that became final."""
+        frozen: list[RenderableType] = []
+        if "\n" not in text:
+            self._partial += text
+            return frozen
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._feed_line(line, frozen)
+        return frozen
+
+    def close(self) -> list[RenderableType]:
+        """Finish the stream and return all remaining blocks."""
+        frozen: list[RenderableType] = []
+        if self._partial:
+            self._feed_line(self._partial, frozen)
+            self._partial = ""
+        self._freeze(frozen)
+        self._spaced = True
+        return frozen
+
+    def render_open(self) -> RenderableType:
+        """Render the open block including the partial line."""
+        lines = self._block + [self._partial] if self._partial else self._block
+        if self._fence is not None:
+            return self._render_code(lines)
+        if not lines:
+            return ""
+        return self._render_markdown(lines)
+
+    def _feed_line(self, line: str, frozen: list[RenderableType]) -> None:
+        if self._fence is not None:
+            if line.strip().startswith(self._fence) and not line.strip().strip(self._fence[0]):
+                self._freeze(frozen)
+            else:
+                self._block.append(line)
+            return
+
+        fence = _FENCE_OPEN.match(line)
+        if fence:
+            self._freeze(frozen)
+            self._fence = fence.group(1)
+            self._language = fence.group(2)
+        elif not line.strip():
+            self._freeze(frozen)
+            if not self._spaced:
+                frozen.append(Text(""))
+                self._spaced = True
+        elif _HEADING.match(line):
+            self._freeze(frozen)
+            self._block.append(line)
+            self._freeze(frozen)
+        else:
+            self._block.append(line)
+
+    def _freeze(self, frozen: list[RenderableType]) -> None:
+        if self._fence is not None:
+            frozen.append(self._render_code(self._block))
+            self._fence = None
+            self._language = ""
+        elif self._block:
+            frozen.append(self._render_markdown(self._block))
+        else:
+            return
+        self._block = []
+        self._spaced = False
+
+    def _render_code(self, lines: list[str]) -> RenderableType:
+        return Syntax(
+            "\n".join(lines),
+            self._language or "text",
+            theme=_MDIR_SYNTAX_THEME,
+            background_color=_CODE_BACKGROUND,
+            word_wrap=True,
+        )
+
+    @staticmethod
+    def _render_markdown(lines: list[str]) -> RenderableType:
+        return Markdown("\n".join(lines), code_theme=_MDIR_SYNTAX_THEME)
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import re
+
+from rich.segment import Segment
+from rich.style import Style
+from textual.geometry import Size
+from textual.strip import Strip
+from textual.widgets import RichLog
+
+from ...services.scrollback import ScrollbackSpill
+
+_RESTORED_STYLE = Style(color="#00aaaa")
+
+
+class ScrollbackLog(RichLog):
+    """RichLog with a bounded in-memory scrollback that spills evicted lines to disk.
+
+    Scrolling to the top pages spilled lines back in ``page_size`` at a time.
+    Restored lines sit at the head of ``lines`` and are the first to be
+    evicted again, so they are never spilled twice.
+    """
+
+    def __init__(self, *args, page_size: int = 200, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.page_size = page_size
+        self._spill = ScrollbackSpill()
+        self._restored = 0  # leading lines that came back from the spill
+        self._restored_from = 0  # spill index of the first restored line
+
+    def write(self, content, *args, **kwargs):
+        lines = self.lines
+        result = super().write(content, *args, **kwargs)
+        if self.lines is not lines:
+            self._on_evicted(lines[: len(lines) - len(self.lines)])
+        return result
+
+    def _on_evicted(self, evicted: list[Strip]) -> None:
+        already_spilled = min(len(evicted), self._restored)
+        self._restored -= already_spilled
+        self._restored_from += already_spilled
+        fresh = evicted[already_spilled:]
+        if fresh:
+            self._spill.append(strip.text.rstrip() for strip in fresh)
+            self._restored_from = len(self._spill)
+
+    @property
+    def spilled_count(self) -> int:
+        """Number of spilled lines not currently loaded in memory."""
+        return self._restored_from
+
+    def load_older(self) -> int:
+        """Page the previous ``page_size`` spilled lines back in. Returns lines loaded."""
+        if self._restored_from == 0:
+            return 0
+        start = max(0, self._restored_from - self.page_size)
+        texts = self._spill.read(start, self._restored_from)
+        if not texts:
+            return 0
+        strips = [Strip([Segment(text, _RESTORED_STYLE)]) for text in texts]
+        count = len(strips)
+        self.lines[:0] = strips
+        self._restored += count
+        self._restored_from = start
+        self._start_line -= count
+        self._widest_line_width = max(
+            self._widest_line_width, max(strip.cell_length for strip in strips)
+        )
+        self._line_cache.clear()
+        self.virtual_size = Size(self._widest_line_width, len(self.lines))
+        self.scroll_to(y=self.scroll_y + count, animate=False, immediate=True)
+        self.refresh()
+        return count
+
+    def watch_scroll_y(self, old_value: float, new_value: float) -> None:
+        super().watch_scroll_y(old_value, new_value)
+        if new_value <= 0 < old_value and self._restored_from:
+            self.load_older()
+
+    def search(self, query: str, *, regex: bool = False) -> list[tuple[int, str]]:
+        """Find matching lines across spilled and in-memory scrollback.
+
+        Returns ``(line_number, text)`` pairs numbered from the start of the log.
+        """
+        results = list(self._spill.search(query, regex=regex))
+        pattern = re.compile(query if regex else re.escape(query), re.IGNORECASE)
+        base = self._restored_from
+        for offset, strip in enumerate(self.lines[self._restored :]):
+            text = strip.text.rstrip()
+            if pattern.search(text):
+                results.append((base + self._restored + offset, text))
+        return results
+
+    def clear(self):
+        self._spill.clear()
+        self._restored = 0
+        self._restored_from = 0
+        return super().clear()
+
+    def on_unmount(self) -> None:
+        self._spill.close()
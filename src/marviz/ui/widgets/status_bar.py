@@ -12,6 +12,7 @@ class StatusBar(Vertical):
         yield Label("[#ffff55]Model:[/]  -", id="status-model")
         yield Label("[#ffff55]Agents:[/] 0/3", id="status-agents")
         yield Label("[#ffff55]Tokens:[/] 0", id="status-tokens")
+        yield Label("[#ffff55]Stream:[/] -", id="status-latency")
         yield Label("", id="status-info")
         yield Label("[#005555]Marviz v0.1.0[/]", id="status-version")
 
@@ -25,6 +26,22 @@ class StatusBar(Vertical):
             f"[#ffff55]Tokens:[/] ~{count}"
         )
 
+    def update_latency(
+        self,
+        label: str,
+        ttft: float | None,
+        tokens_per_second: float | None = None,
+        max_gap: float | None = None,
+    ) -> None:
+        """Show time-to-first-token, throughput and worst chunk gap of the latest stream."""
+        text = f"[#ffff55]Stream:[/] {label} TTFT "
+        text += f"{ttft * 1000:.0f}ms" if ttft is not None else "-"
+        if tokens_per_second:
+            text += f" {tokens_per_second:.0f} tok/s"
+        if max_gap:
+            text += f" gap {max_gap * 1000:.0f}ms"
+        self.query_one("#status-latency", Label).update(text)
+
     def update_status(self, text: str) -> None:
         self.query_one("#status-info", Label).update(
             f"[#00aaaa]{text}[/]"
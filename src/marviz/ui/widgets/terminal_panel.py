@@ -2,14 +2,22 @@ from textual.app import ComposeResult
 from textual.containers import Vertical
 from textual.widgets import Input, RichLog
 
+from .scrollback_log import ScrollbackLog
+
 
 class TerminalPanel(Vertical):
     """Terminal — MDIR style."""
 
     BORDER_TITLE = " Terminal "
 
+    def __init__(self, max_lines: int | None = None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._max_lines = max_lines
+
     def compose(self) -> ComposeResult:
-        yield RichLog(highlight=True, markup=True, id="terminal-log")
+        yield ScrollbackLog(
+            highlight=True, markup=True, max_lines=self._max_lines, id="terminal-log"
+        )
         yield Input(placeholder="$ ", id="terminal-input")
 
     def on_mount(self) -> None:
@@ -0,0 +1,199 @@
+"""Micro-benchmark harness with JSON baselines and per-benchmark budgets.
+
+Each benchmark times a callable several times and keeps the fastest
+round. Results are compared with ``baselines.json`` after scaling by a
+calibration loop, so a baseline recorded on one machine still applies on
+a faster or slower one. A benchmark fails when it is slower than its
+baseline times its budget (default 1.5, or MARVIZ_BENCH_BUDGET), and by
+more than _MIN_SLACK, so scheduler noise on a short benchmark cannot fail it.
+
+Benchmarks only run when selected (see ``tests/conftest.py``):
+
+    pytest -m benchmark tests/benchmarks                          # check against baselines
+    MARVIZ_BENCH_UPDATE=1 pytest -m benchmark tests/benchmarks    # record new baselines
+
+Every run also writes its results to ``.benchmarks/latest.json``.
+"""
+
+from __future__ import annotations
+
+import gc
+import json
+import os
+import platform
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+BASELINES = Path(__file__).with_name("baselines.json")
+RESULTS = Path(__file__).resolve().parents[2] / ".benchmarks" / "latest.json"
+DEFAULT_BUDGET = float(os.getenv("MARVIZ_BENCH_BUDGET", "1.5"))
+UPDATE = os.getenv("MARVIZ_BENCH_UPDATE", "") not in ("", "0", "false")
+# Seconds a benchmark may always exceed its baseline by, whatever the budget
+_MIN_SLACK = 0.005
+
+
+def _calibrate() -> float:
+    """Seconds for a fixed pure-Python workload; the unit baselines are scaled by."""
+
+    def work() -> None:
+        parts = []
+        for i in range(20_000):
+            parts.append(json.dumps({"i": i, "s": str(i) * 3}))
+        "".join(parts).split("}")
+
+    best = float("inf")
+    for _ in range(7):
+        start = time.perf_counter()
+        work()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@contextmanager
+def _no_gc():
+    """Collect up front and keep the cyclic GC out of the timed region, as timeit does."""
+    gc.collect()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class Bench:
+    """Times benchmarks and checks them against their recorded baselines."""
+
+    def __init__(self, baselines: dict, calibration: float, update: bool) -> None:
+        self.baselines = baselines
+        self.calibration = calibration
+        self.update = update
+        self.results: dict[str, dict] = {}
+
+    @property
+    def scale(self) -> float:
+        """How much slower this machine is than the one baselines were recorded on."""
+        recorded = self.baselines.get("calibration")
+        return self.calibration / recorded if recorded else 1.0
+
+    def __call__(
+        self,
+        name: str,
+        fn: Callable[[], object],
+        *,
+        rounds: int = 9,
+        setup: Callable[[], object] | None = None,
+        budget: float | None = None,
+        unit: int = 1,
+    ) -> float:
+        """Time ``fn`` (after ``setup``, untimed) and check it; returns the best round in seconds.
+
+        ``unit`` is the number of operations one call performs; it is only
+        used to report per-operation times.
+        """
+        if setup is not None:
+            setup()
+        fn()  # warm-up
+        best = float("inf")
+        for _ in range(rounds):
+            if setup is not None:
+                setup()
+            with _no_gc():
+                start = time.perf_counter()
+                fn()
+                best = min(best, time.perf_counter() - start)
+        self._check(name, best, budget, unit)
+        return best
+
+    async def run_async(
+        self,
+        name: str,
+        fn: Callable[[], Awaitable[object]],
+        *,
+        rounds: int = 9,
+        budget: float | None = None,
+        unit: int = 1,
+    ) -> float:
+        """Like calling the bench, for a coroutine function run on the current loop."""
+        await fn()
+        best = float("inf")
+        for _ in range(rounds):
+            with _no_gc():
+                start = time.perf_counter()
+                await fn()
+                best = min(best, time.perf_counter() - start)
+        self._check(name, best, budget, unit)
+        return best
+
+    def _check(self, name: str, seconds: float, budget: float | None, unit: int) -> None:
+        budget = budget or DEFAULT_BUDGET
+        baseline = self.baselines.get("results", {}).get(name)
+        allowed = (
+            max(baseline * self.scale * budget, baseline * self.scale + _MIN_SLACK)
+            if baseline
+            else None
+        )
+        self.results[name] = {
+            "seconds": seconds,
+            "per_op_us": seconds / unit * 1e6,
+            "baseline": baseline,
+            "allowed": allowed,
+        }
+        if self.update or allowed is None:
+            return
+        if seconds > allowed:
+            pytest.fail(
+                f"{name}: {seconds * 1000:.2f} ms exceeds budget {allowed * 1000:.2f} ms "
+                f"(baseline {baseline * 1000:.2f} ms x {self.scale:.2f} machine scale x {budget}, "
+                f"at least +{_MIN_SLACK * 1000:.0f} ms)",
+                pytrace=False,
+            )
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    config.addinivalue_line("markers", "benchmark: micro-benchmark with a performance budget")
+
+
+@pytest.fixture(scope="session")
+def bench():
+    baselines = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+    harness = Bench(baselines, _calibrate(), UPDATE)
+    yield harness
+
+    RESULTS.parent.mkdir(parents=True, exist_ok=True)
+    RESULTS.write_text(
+        json.dumps(
+            {
+                "calibration": harness.calibration,
+                "scale": harness.scale,
+                "python": platform.python_version(),
+                "results": harness.results,
+            },
+            indent=2,
+            sort_keys=True,
+        )
+        + "\n"
+    )
+    if UPDATE:
+        # Baselines not re-run this time are carried over in the new machine's units
+        results = {
+            name: seconds * harness.scale
+            for name, seconds in baselines.get("results", {}).items()
+        }
+        results.update({name: r["seconds"] for name, r in harness.results.items()})
+        BASELINES.write_text(
+            json.dumps(
+                {
+                    "calibration": harness.calibration,
+                    "python": platform.python_version(),
+                    "results": dict(sorted(results.items())),
+                },
+                indent=2,
+            )
+            + "\n"
+        )
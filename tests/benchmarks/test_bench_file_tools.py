@@ -0,0 +1,103 @@
+"""File editing and writing on large files."""
+
+from __future__ import annotations
+
+import pytest
+
+from marviz.services.code_search import CodeSearchIndex
+from marviz.services.file_edit import (
+    Hunk,
+    StagedFile,
+    apply_hunks,
+    atomic_write_text,
+    edit_file,
+    parse_unified_diff,
+)
+
+pytestmark = pytest.mark.benchmark
+
+_LINES = 100_000
+# Disk-bound benchmarks vary more from run to run than CPU-bound ones
+_IO_BUDGET = 2.5
+_TEXT = "".join(f"    value_{i} = compute({i}, factor=2)\n" for i in range(_LINES))  # ~4 MB
+
+
+def _hunk(i: int) -> Hunk:
+    return Hunk(
+        f"    value_{i} = compute({i}, factor=2)\n    value_{i + 1} = compute({i + 1}, factor=2)",
+        f"    value_{i} = compute({i}, factor=3)\n    value_{i + 1} = compute({i + 1}, factor=3)",
+    )
+
+
+def test_edit_file_search_replace(bench, tmp_path):
+    path = tmp_path / "big.py"
+    hunks = [_hunk(10), _hunk(_LINES // 2), _hunk(_LINES - 10)]
+
+    def run() -> None:
+        result = edit_file(path, hunks)
+        assert result.added == 6
+
+    bench(
+        "file.edit_search_replace", run, setup=lambda: path.write_text(_TEXT), budget=_IO_BUDGET
+    )
+
+
+def test_apply_unified_diff(bench):
+    start = _LINES - 500
+    diff = "\n".join(
+        [
+            "--- a/big.py",
+            "+++ b/big.py",
+            f"@@ -{start + 1},3 +{start + 1},3 @@",
+            f"     value_{start} = compute({start}, factor=2)",
+            f"-    value_{start + 1} = compute({start + 1}, factor=2)",
+            f"+    value_{start + 1} = compute({start + 1}, factor=5)",
+            f"     value_{start + 2} = compute({start + 2}, factor=2)",
+        ]
+    )
+
+    def run() -> None:
+        result = apply_hunks(_TEXT, parse_unified_diff(diff))
+        assert "factor=5" in result.text
+
+    bench("file.apply_diff", run)
+
+
+def test_atomic_write(bench, tmp_path):
+    path = tmp_path / "out.py"
+    bench("file.atomic_write", lambda: atomic_write_text(path, _TEXT), budget=_IO_BUDGET)
+
+
+def test_staged_write_in_fragments(bench, tmp_path):
+    fragments = [_TEXT[i : i + 256] for i in range(0, len(_TEXT), 256)]
+    path = tmp_path / "out.py"
+
+    def run() -> None:
+        staged = StagedFile(tmp_path)
+        for fragment in fragments:
+            staged.write(fragment)
+        staged.commit(path)
+
+    bench("file.staged_write", run, unit=len(fragments), budget=_IO_BUDGET)
+
+
+def test_read_large_file(bench, tmp_path):
+    path = tmp_path / "big.py"
+    path.write_text(_TEXT)
+    bench("file.read", lambda: path.read_bytes().decode("utf-8"), budget=_IO_BUDGET)
+
+
+def test_search_code_across_large_files(bench, tmp_path):
+    # Files over MAX_FILE_BYTES are not indexed, so split the text into ~800 KB files
+    lines = _TEXT.splitlines(keepends=True)
+    step = _LINES // 5
+    for n, start in enumerate(range(0, _LINES, step)):
+        (tmp_path / f"big_{n}.py").write_text("".join(lines[start : start + step]))
+    index = CodeSearchIndex(tmp_path)
+    index.build()
+
+    def run() -> None:
+        assert len(index.search(f"value_{_LINES - 1} =")) == 1
+        assert len(index.search(r"value_\d+7 = compute", regex=True, max_results=20_000)) > 1000
+
+    bench("file.search_code", run)
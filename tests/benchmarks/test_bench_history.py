@@ -0,0 +1,77 @@
+"""Cost of bookkeeping as a conversation history grows."""
+
+from __future__ import annotations
+
+import pytest
+
+from marviz.agents.base import BaseAgent
+from marviz.agents.types import StreamChunk
+from marviz.providers.base import BaseProvider
+
+pytestmark = pytest.mark.benchmark
+
+_FILE = "\n".join(f"def function_{i}(x):\n    return x + {i}\n" for i in range(1500))  # ~45 KB
+
+
+class _ReadProvider(BaseProvider):
+    """Every turn asks to read the same file again."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def stream(self, messages, tools=None):
+        self.calls += 1
+        yield StreamChunk(
+            "tool_call",
+            tool_name="read_file",
+            tool_call_id=f"call_{self.calls}",
+            tool_call_index=0,
+            tool_args='{"path": "src/module.py"}',
+        )
+
+
+async def _reread_turns(turns: int) -> BaseAgent:
+    agent = BaseAgent(_ReadProvider(), "system")
+    async for _chunk in agent.send("read it"):
+        pass
+    for _ in range(turns):
+        for tc in agent.pending_tool_calls:
+            agent.add_tool_result(tc.id, _FILE)
+        async for _chunk in agent.continue_after_tools():
+            pass
+    return agent
+
+
+@pytest.mark.asyncio
+async def test_repeated_reads_of_one_file(bench):
+    turns = 300
+
+    async def run() -> None:
+        agent = await _reread_turns(turns)
+        # Only the latest copy is kept in full; earlier reads refer to it
+        kept = [m for m in agent.history if m["role"] == "tool" and m["content"] == _FILE]
+        assert kept == [agent.history[-2]]
+
+    await bench.run_async("history.repeated_reads", run, rounds=3, unit=turns)
+
+
+@pytest.mark.asyncio
+async def test_turn_with_long_history(bench):
+    earlier: list[dict] = []
+    for i in range(2000):
+        earlier.append({"role": "user", "content": f"message {i} " * 20})
+        earlier.append({"role": "assistant", "content": f"reply {i} " * 40})
+    turns = 50
+
+    async def run() -> None:
+        agent = BaseAgent(_ReadProvider(), "system")
+        agent.history.extend(earlier)
+        async for _chunk in agent.send("read it"):
+            pass
+        for _ in range(turns):
+            for tc in agent.pending_tool_calls:
+                agent.add_tool_result(tc.id, _FILE)
+            async for _chunk in agent.continue_after_tools():
+                pass
+
+    await bench.run_async("history.long_history_turns", run, rounds=3, unit=turns)
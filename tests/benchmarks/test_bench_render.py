@@ -0,0 +1,42 @@
+"""Chat panel rendering of streamed tokens."""
+
+from __future__ import annotations
+
+import pytest
+from textual.app import App, ComposeResult
+
+from marviz.ui.widgets.chat_panel import ChatPanel
+
+pytestmark = pytest.mark.benchmark
+
+_REPLY = (
+    "## Plan\n\nFirst read the **config** module, then update `load()` so that it\n"
+    "falls back to defaults.\n\n"
+    "```python\ndef load(path):\n    with open(path) as f:\n        return parse(f.read())\n```\n\n"
+    "- keep the old signature\n- add a test\n\n"
+) * 40
+
+
+def _tokens(text: str, size: int = 4) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+class _PanelApp(App):
+    def compose(self) -> ComposeResult:
+        yield ChatPanel(id="chat")
+
+
+@pytest.mark.asyncio
+async def test_append_token_and_finish(bench):
+    tokens = _tokens(_REPLY)
+    app = _PanelApp()
+    async with app.run_test(size=(120, 40)) as pilot:
+        panel = app.query_one(ChatPanel)
+
+        async def run() -> None:
+            for token in tokens:
+                panel.append_token(token)
+            panel.finish_response()
+
+        await bench.run_async("render.append_token", run, unit=len(tokens))
+        await pilot.pause()
@@ -0,0 +1,121 @@
+"""Tool-call accumulation and agent streaming throughput."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from marviz.agents.base import BaseAgent
+from marviz.agents.types import StreamChunk, ToolCallAccumulator
+from marviz.providers.base import BaseProvider
+from marviz.services.file_edit import StagedFile
+
+pytestmark = pytest.mark.benchmark
+
+
+def _fragments(text: str, size: int) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def _write_file_chunks(content: str, fragment: int = 24) -> list[StreamChunk]:
+    args = json.dumps({"path": "big.txt", "content": content})
+    chunks = [StreamChunk("tool_call", tool_name="write_file", tool_call_id="call_0", tool_call_index=0)]
+    chunks += [StreamChunk("tool_call", tool_args=f, tool_call_index=0) for f in _fragments(args, fragment)]
+    return chunks
+
+
+_BIG_CONTENT = "".join(f'line {i}: "quoted" \\ tab\there\n' for i in range(60_000))  # ~2 MB
+
+
+def test_accumulate_large_arguments(bench):
+    chunks = _write_file_chunks(_BIG_CONTENT)
+
+    def run() -> None:
+        acc = ToolCallAccumulator()
+        for chunk in chunks:
+            acc.feed(chunk)
+        (call,) = acc.finalize()
+        assert len(call.arguments["content"]) == len(_BIG_CONTENT)
+
+    bench("accumulate.large_args", run, unit=len(chunks))
+
+
+def test_accumulate_large_arguments_streamed_to_disk(bench, tmp_path):
+    chunks = _write_file_chunks(_BIG_CONTENT)
+    streamed = {"write_file": ("content", lambda fields: StagedFile(tmp_path))}
+
+    def run() -> None:
+        acc = ToolCallAccumulator(streamed)
+        for chunk in chunks:
+            acc.feed(chunk)
+        (call,) = acc.finalize()
+        assert call.sink is not None
+        call.sink.discard()
+
+    bench("accumulate.large_args_streamed", run, unit=len(chunks))
+
+
+def test_accumulate_many_interleaved_calls(bench):
+    calls = 64
+    per_call = [
+        _fragments(json.dumps({"path": f"src/file_{i}.py", "query": "x" * 2000}), 16)
+        for i in range(calls)
+    ]
+    chunks = [
+        StreamChunk("tool_call", tool_name="read_file", tool_call_id=f"call_{i}", tool_call_index=i)
+        for i in range(calls)
+    ]
+    for step in range(max(len(f) for f in per_call)):
+        for i, fragments in enumerate(per_call):
+            if step < len(fragments):
+                chunks.append(StreamChunk("tool_call", tool_args=fragments[step], tool_call_index=i))
+
+    def run() -> None:
+        acc = ToolCallAccumulator()
+        for chunk in chunks:
+            acc.feed(chunk)
+        assert len(acc.finalize()) == calls
+
+    bench("accumulate.many_indices", run, unit=len(chunks))
+
+
+class _ReplayProvider(BaseProvider):
+    """Yields a fixed list of chunks without any network or sleeps."""
+
+    def __init__(self, chunks: list[StreamChunk]) -> None:
+        self.chunks = chunks
+
+    async def stream(self, messages, tools=None):
+        for chunk in self.chunks:
+            yield chunk
+
+
+@pytest.mark.asyncio
+async def test_agent_send_text_throughput(bench):
+    n = 20_000
+    provider = _ReplayProvider([StreamChunk("text", content=f"tok{i} ") for i in range(n)])
+
+    async def run() -> None:
+        agent = BaseAgent(provider, "system")
+        async for _chunk in agent.send("go"):
+            pass
+        assert agent.history[-1]["role"] == "assistant"
+
+    await bench.run_async("agent.send_text", run, unit=n)
+
+
+@pytest.mark.asyncio
+async def test_agent_send_tool_call_throughput(bench):
+    chunks = [StreamChunk("text", content="Writing the file.")] + _write_file_chunks(
+        _BIG_CONTENT[:500_000]
+    )
+    provider = _ReplayProvider(chunks)
+
+    async def run() -> None:
+        agent = BaseAgent(provider, "system")
+        async for _chunk in agent.send("go"):
+            pass
+        assert agent.pending_tool_calls[0].name == "write_file"
+
+    await bench.run_async("agent.send_tool_call", run, unit=len(chunks))
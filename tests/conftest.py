@@ -0,0 +1,28 @@
+"""Benchmarks and load tests measure wall-clock time, so a plain run skips them.
+
+Select them with their marker (``pytest -m benchmark``, ``pytest -m load``)
+or set MARVIZ_PERF_TESTS=1 to run them with everything else.
+"""
+
+from __future__ import annotations
+
+import os
+
+import pytest
+
+_PERF_MARKERS = ("benchmark", "load")
+_ENABLED = os.getenv("MARVIZ_PERF_TESTS", "") not in ("", "0", "false")
+
+
+def pytest_collection_modifyitems(config: pytest.Config, items: list[pytest.Item]) -> None:
+    if _ENABLED:
+        return
+    selected = config.getoption("markexpr") or ""
+    for item in items:
+        for marker in _PERF_MARKERS:
+            if item.get_closest_marker(marker) and marker not in selected:
+                item.add_marker(
+                    pytest.mark.skip(
+                        reason=f"{marker} test; run with -m {marker} or MARVIZ_PERF_TESTS=1"
+                    )
+                )
@@ -0,0 +1,311 @@
+"""Headless end-to-end load test of the TUI with a stub provider.
+
+``MarvizApp`` runs under Textual's ``run_test`` with an in-process
+``AgentRuntime`` whose provider is a stub: the user's turn fans out to N
+``delegate_task`` calls and every worker streams tokens at a fixed rate.
+While the workers stream, keys are typed into ``ChatInput`` and the run
+records
+
+- frame time: each screen update (layout + compositor render),
+- input echo latency: key posted until the first frame showing it,
+- event-loop lag: how late a 10 ms heartbeat wakes up,
+- peak RSS and the deepest backlog of runtime events awaiting the UI.
+
+Run a sweep to see how the UI degrades as workers and token rate go up:
+
+    python -m tests.load.harness --workers 1,4,8,16 --rates 20,100,400
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+
+from textual import events
+from textual.screen import Screen
+
+from marviz.agents.types import StreamChunk
+from marviz.app import MarvizApp
+from marviz.config import MarvizConfig
+from marviz.providers.base import BaseProvider
+from marviz.runtime import AgentRuntime
+from marviz.ui.widgets.chat_panel import ChatInput
+from marviz.ui.widgets.chat_sessions import ChatSessions
+
+_HEARTBEAT = 0.01
+# Worker output cycles through prose, a list and a code fence so every Markdown path renders
+_WORKER_TEXT = (
+    "Looking at the **module** now: the `load()` helper reads the file and\n"
+    "parses it twice, which explains the slowdown.\n\n"
+    "- cache the parsed result\n- keep the signature\n\n"
+    "```python\ndef load(path):\n    return parse(Path(path).read_text())\n```\n\n"
+).split(" ")
+
+
+@dataclass(frozen=True)
+class LoadScenario:
+    workers: int = 4
+    tokens_per_second: float = 100.0  # per worker
+    tokens_per_worker: int = 300
+    keystroke_interval: float = 0.05  # seconds between typed keys while workers stream
+    size: tuple[int, int] = (160, 50)
+    timeout: float = 120.0
+
+
+@dataclass
+class LoadReport:
+    scenario: LoadScenario
+    seconds: float = 0.0
+    frames: list[float] = field(default_factory=list)  # ms
+    echoes: list[float] = field(default_factory=list)  # ms
+    lags: list[float] = field(default_factory=list)  # ms
+    peak_rss_mb: float = 0.0
+    max_event_backlog: int = 0
+    worker_tokens: int = 0
+
+    @property
+    def fps(self) -> float:
+        return len(self.frames) / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "workers": self.scenario.workers,
+            "tokens_per_second": self.scenario.tokens_per_second,
+            "seconds": round(self.seconds, 2),
+            "worker_tokens": self.worker_tokens,
+            "fps": round(self.fps, 1),
+            "frame_ms_p50": _percentile(self.frames, 50),
+            "frame_ms_p95": _percentile(self.frames, 95),
+            "frame_ms_max": _percentile(self.frames, 100),
+            "echo_ms_p50": _percentile(self.echoes, 50),
+            "echo_ms_p95": _percentile(self.echoes, 95),
+            "echo_ms_max": _percentile(self.echoes, 100),
+            "lag_ms_p95": _percentile(self.lags, 95),
+            "lag_ms_max": _percentile(self.lags, 100),
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            "max_event_backlog": self.max_event_backlog,
+        }
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return round(ordered[index], 2)
+
+
+def _rss_mb() -> float:
+    """Current resident set size; the peak since process start where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+class StubProvider(BaseProvider):
+    """Fans the user's turn out to ``workers`` delegates that stream at a fixed rate."""
+
+    model = "stub"
+
+    def __init__(self, scenario: LoadScenario) -> None:
+        self.scenario = scenario
+
+    async def stream(self, messages, tools=None):
+        tool_names = {t["function"]["name"] for t in tools or ()}
+        if "delegate_task" not in tool_names:
+            async for chunk in self._worker_stream():
+                yield chunk
+        elif messages[-1]["role"] == "user":
+            for i in range(self.scenario.workers):
+                args = {"task": f"Investigate part {i}", "worker_name": f"Worker {i}"}
+                yield StreamChunk(
+                    "tool_call",
+                    tool_name="delegate_task",
+                    tool_args=json.dumps(args),
+                    tool_call_id=f"delegate_{i}",
+                    tool_call_index=i,
+                )
+        else:
+            yield StreamChunk("text", content="All workers reported back.")
+
+    async def _worker_stream(self):
+        interval = 1.0 / self.scenario.tokens_per_second
+        start = time.perf_counter()
+        for i in range(self.scenario.tokens_per_worker):
+            # Sleep until this token is due; a late loop gets a burst, as from a real API
+            delay = start + i * interval - time.perf_counter()
+            await asyncio.sleep(max(delay, 0))
+            yield StreamChunk("text", content=_WORKER_TEXT[i % len(_WORKER_TEXT)] + " ")
+
+
+class _Probe:
+    """Frame, echo, lag and memory measurements for one run."""
+
+    def __init__(self, report: LoadReport) -> None:
+        self.report = report
+        self.recording = False
+        self.chat_input: ChatInput | None = None
+        self.echo: tuple[float, int] | None = None  # (posted at, text length to wait for)
+        self.echoed = asyncio.Event()
+
+    def on_frame(self, seconds: float) -> None:
+        if not self.recording:
+            return
+        self.report.frames.append(seconds * 1000)
+        if self.echo is not None and self.chat_input is not None:
+            posted, length = self.echo
+            if len(self.chat_input.text) >= length:
+                self.report.echoes.append((time.perf_counter() - posted) * 1000)
+                self.echo = None
+                self.echoed.set()
+
+    async def heartbeat(self) -> None:
+        expected = time.perf_counter() + _HEARTBEAT
+        while True:
+            await asyncio.sleep(_HEARTBEAT)
+            now = time.perf_counter()
+            if self.recording:
+                self.report.lags.append(max(now - expected, 0) * 1000)
+                self.report.peak_rss_mb = max(self.report.peak_rss_mb, _rss_mb())
+            expected = now + _HEARTBEAT
+
+
+@contextmanager
+def _timed_frames(probe: _Probe):
+    """Time every screen update (the update timer only runs when something is dirty).
+
+    The screen's update timer binds ``_on_timer_update`` when it is first
+    created, so this has to be in place before the app starts.
+    """
+    original = Screen._on_timer_update
+
+    def on_timer_update(screen: Screen) -> None:
+        start = time.perf_counter()
+        original(screen)
+        probe.on_frame(time.perf_counter() - start)
+
+    Screen._on_timer_update = on_timer_update
+    try:
+        yield
+    finally:
+        Screen._on_timer_update = original
+
+
+async def _wait_for(predicate, timeout: float, pilot) -> None:
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("load scenario did not reach the expected state")
+        await pilot.pause(0.02)
+
+
+async def run_scenario(scenario: LoadScenario) -> LoadReport:
+    """Drive one user turn through the headless app and measure it."""
+    report = LoadReport(scenario)
+    probe = _Probe(report)
+    counts = {"worker_finished": 0, "finish": 0, "worker_token": 0}
+
+    def count(event: dict) -> None:
+        if event["event"] in counts:
+            counts[event["event"]] += 1
+
+    with tempfile.TemporaryDirectory() as workdir, _timed_frames(probe):
+        config = replace(
+            MarvizConfig.load(),
+            working_dir=Path(workdir),
+            max_sub_agents=scenario.workers,
+            http_pool=False,
+            metrics_file=None,
+            repo_map_tokens=0,
+            retrieval_tokens=0,
+            profile=False,
+        )
+        runtime = AgentRuntime(config, provider=StubProvider(scenario))
+        runtime.listeners.append(count)
+        app = MarvizApp(runtime=runtime)
+        async with app.run_test(size=scenario.size) as pilot:
+            screen = app.screen
+
+            def active_input() -> ChatInput | None:
+                panel = screen.query_one(ChatSessions).active_panel
+                return panel.query_one(ChatInput) if panel is not None else None
+
+            await _wait_for(lambda: active_input() is not None, 10.0, pilot)
+            chat_input = probe.chat_input = active_input()
+            chat_input.focus()
+            chat_input.text = "Fan this out"
+
+            heartbeat = asyncio.create_task(probe.heartbeat())
+            probe.recording = True
+            start = time.perf_counter()
+            deadline = start + scenario.timeout
+            app.post_message(events.Key("enter", None))
+            await _wait_for(lambda: not chat_input.text, 10.0, pilot)
+            while counts["worker_finished"] < scenario.workers or counts["finish"] < 2:
+                if time.perf_counter() > deadline:
+                    raise TimeoutError(f"workers did not finish within {scenario.timeout}s")
+                probe.echoed.clear()
+                probe.echo = (time.perf_counter(), len(chat_input.text) + 1)
+                app.post_message(events.Key("x", "x"))
+                try:
+                    await asyncio.wait_for(probe.echoed.wait(), 5.0)
+                except asyncio.TimeoutError:
+                    report.echoes.append(5000.0)
+                    probe.echo = None
+                report.max_event_backlog = max(report.max_event_backlog, screen._events.qsize())
+                await asyncio.sleep(scenario.keystroke_interval)
+            report.seconds = time.perf_counter() - start
+            probe.recording = False
+            heartbeat.cancel()
+            report.worker_tokens = counts["worker_token"]
+    return report
+
+
+def _format_table(reports: list[LoadReport]) -> str:
+    rows = [r.summary() for r in reports]
+    columns = list(rows[0])
+    widths = [max(len(c), *(len(str(row[c])) for row in rows)) for c in columns]
+    lines = ["  ".join(c.rjust(w) for c, w in zip(columns, widths))]
+    lines += ["  ".join(str(row[c]).rjust(w) for c, w in zip(columns, widths)) for row in rows]
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", default="1,4,8", help="comma-separated worker counts")
+    parser.add_argument("--rates", default="20,100,400", help="comma-separated tokens/s per worker")
+    parser.add_argument("--tokens", type=int, default=300, help="tokens each worker streams")
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    reports = []
+    for workers in (int(w) for w in args.workers.split(",")):
+        for rate in (float(r) for r in args.rates.split(",")):
+            scenario = LoadScenario(workers, rate, args.tokens)
+            reports.append(asyncio.run(run_scenario(scenario)))
+            print(f"  {workers} workers x {rate:g} tok/s done", file=sys.stderr)
+    print(_format_table(reports))
+    if args.json:
+        args.json.write_text(
+            json.dumps(
+                [{"scenario": asdict(r.scenario), **r.summary()} for r in reports], indent=2
+            )
+            + "\n"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""The TUI stays responsive while several workers stream at once."""
+
+from __future__ import annotations
+
+import pytest
+
+from .harness import LoadScenario, run_scenario
+
+pytestmark = pytest.mark.load
+
+# Well above what a developer machine measures, so only real regressions fail
+FRAME_P95_MS = 150.0
+ECHO_P95_MS = 300.0
+LAG_P95_MS = 150.0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("workers,rate", [(1, 100.0), (4, 100.0)])
+async def test_ui_under_streaming_workers(workers, rate):
+    scenario = LoadScenario(workers=workers, tokens_per_second=rate, tokens_per_worker=400)
+    report = await run_scenario(scenario)
+    summary = report.summary()
+
+    assert report.worker_tokens == workers * scenario.tokens_per_worker
+    assert report.frames and report.echoes, summary
+    assert summary["frame_ms_p95"] < FRAME_P95_MS, summary
+    assert summary["echo_ms_p95"] < ECHO_P95_MS, summary
+    assert summary["lag_ms_p95"] < LAG_P95_MS, summary
@@ -0,0 +1,177 @@
+"""Session bookkeeping of AgentRuntime with a stub provider."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from dataclasses import replace
+
+import pytest
+
+from marviz.agents.types import AccumulatedToolCall, StreamChunk
+from marviz.config import MarvizConfig
+from marviz.providers.base import BaseProvider
+from marviz.runtime import AgentRuntime
+from marviz.runtime.agent_runtime import _CANCELLED_RESULT
+
+
+class _DelegatingProvider(BaseProvider):
+    """The message "delegate" fans out to two workers that never finish; others are answered."""
+
+    model = "stub"
+
+    def __init__(self) -> None:
+        self.workers_started = 0
+
+    async def stream(self, messages, tools=None):
+        if "delegate_task" not in {t["function"]["name"] for t in tools or ()}:
+            self.workers_started += 1
+            await asyncio.sleep(3600)
+            return
+        if messages[-1] == {"role": "user", "content": "delegate"}:
+            for i in range(2):
+                yield StreamChunk(
+                    "tool_call",
+                    tool_name="delegate_task",
+                    tool_args=json.dumps({"task": f"part {i}", "worker_name": f"Worker {i}"}),
+                    tool_call_id=f"delegate_{i}",
+                    tool_call_index=i,
+                )
+            return
+        yield StreamChunk("text", content="ok")
+
+
+def _runtime(tmp_path, provider: BaseProvider) -> AgentRuntime:
+    config = replace(
+        MarvizConfig.load(),
+        working_dir=tmp_path,
+        max_sub_agents=1,
+        http_pool=False,
+        metrics_file=None,
+        repo_map_tokens=0,
+        retrieval_tokens=0,
+    )
+    return AgentRuntime(config, provider=provider)
+
+
+async def _settle(condition, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_new_message_cancels_outstanding_delegates(tmp_path):
+    provider = _DelegatingProvider()
+    runtime = _runtime(tmp_path, provider)
+    events: list[dict] = []
+    runtime.listeners.append(events.append)
+    sid = runtime.new_session()
+    session = runtime._sessions[sid]
+
+    runtime.send(sid, "delegate")
+    # One worker runs, the other is queued behind max_sub_agents=1
+    await _settle(lambda: provider.workers_started == 1)
+    assert session.task_graph is not None and len(runtime._delegate_queue) == 1
+
+    runtime.send(sid, "never mind")
+    await _settle(lambda: session.task is not None and session.task.done() and not runtime._workers)
+    await asyncio.sleep(0.05)
+
+    history = session.agent.history
+    answered = {m["tool_call_id"]: m["content"] for m in history if m["role"] == "tool"}
+    assert answered == {"delegate_0": _CANCELLED_RESULT, "delegate_1": _CANCELLED_RESULT}
+    # The results come before the new message, and the new turn was answered
+    user = history.index({"role": "user", "content": "never mind"})
+    assert all(history.index(m) < user for m in history if m["role"] == "tool")
+    assert history[-1] == {"role": "assistant", "content": "ok"}
+    assert session.task_graph is None and not session.expected_tool_calls
+    assert not runtime._delegate_queue and not session.workers
+    assert provider.workers_started == 1
+    assert any(e["event"] == "worker_released" for e in events)
+    await runtime.stop()
+
+
+class _CommandWorkerProvider(BaseProvider):
+    """The main agent delegates once; the worker tries run_command, then answers."""
+
+    model = "stub"
+
+    def __init__(self) -> None:
+        self.worker_results: list[str] = []
+
+    async def stream(self, messages, tools=None):
+        if "delegate_task" in {t["function"]["name"] for t in tools or ()}:
+            if messages[-1]["role"] == "user":
+                yield StreamChunk(
+                    "tool_call",
+                    tool_name="delegate_task",
+                    tool_args=json.dumps({"task": "check", "worker_name": "Checker"}),
+                    tool_call_id="delegate_0",
+                    tool_call_index=0,
+                )
+            else:
+                yield StreamChunk("text", content="done")
+            return
+        if messages[-1]["role"] == "tool":
+            self.worker_results.append(messages[-1]["content"])
+            yield StreamChunk("text", content="could not run it")
+            return
+        yield StreamChunk(
+            "tool_call",
+            tool_name="run_command",
+            tool_args=json.dumps({"command": "touch marker"}),
+            tool_call_id="run_0",
+            tool_call_index=0,
+        )
+
+
+@pytest.mark.asyncio
+async def test_worker_cannot_run_commands(tmp_path):
+    provider = _CommandWorkerProvider()
+    runtime = _runtime(tmp_path, provider)
+    sid = runtime.new_session()
+    session = runtime._sessions[sid]
+
+    runtime.send(sid, "go")
+    await _settle(lambda: session.agent.history[-1] == {"role": "assistant", "content": "done"})
+
+    assert provider.worker_results == ["Error: run_command is not available to workers"]
+    assert not (tmp_path / "marker").exists()
+    await runtime.stop()
+
+
+@pytest.mark.asyncio
+async def test_run_command_drops_cached_workspace_state(tmp_path):
+    runtime = _runtime(tmp_path, _DelegatingProvider())
+    (tmp_path / "a.txt").write_text("one\n")
+    runtime._files.read(tmp_path / "a.txt")
+    runtime._git._cache[("log",), ()] = "stale"
+    assert len(runtime._files) == 1
+
+    result = await runtime._tool_run_command({"command": "echo two > a.txt"})
+
+    assert "exit code 0" in result
+    assert (tmp_path / "a.txt").read_text() == "two\n"
+    assert len(runtime._files) == 0 and not runtime._git._cache
+    await runtime.stop()
+
+
+@pytest.mark.asyncio
+async def test_file_tools_resolve_relative_paths_in_the_working_dir(tmp_path, monkeypatch):
+    runtime = _runtime(tmp_path / "work", _DelegatingProvider())
+    (tmp_path / "work").mkdir()
+    monkeypatch.chdir(tmp_path)
+
+    async def call(name: str, **arguments) -> str:
+        return await runtime._run_tool(AccumulatedToolCall("call", name, arguments))
+
+    assert (await call("write_file", path="src/a.txt", content="one\n")).startswith("Wrote")
+    assert (tmp_path / "work" / "src" / "a.txt").read_text() == "one\n"
+    edits = [{"search": "one", "replace": "two"}]
+    assert (await call("edit_file", path="src/a.txt", edits=edits)).startswith("Edited")
+    assert await call("read_file", path="src/a.txt") == "two\n"
+    assert "two" in await call("read_files", paths=["src/a.txt"])
+    assert not (tmp_path / "src").exists()
+    await runtime.stop()
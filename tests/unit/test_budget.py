@@ -0,0 +1,48 @@
+"""Budget limits and BudgetMeter accounting."""
+
+from __future__ import annotations
+
+from marviz.runtime.budget import Budget, BudgetMeter
+
+
+def test_narrowed_only_tightens_and_ignores_malformed_limits():
+    budget = Budget(max_tokens=4000, max_seconds=0.0, max_tool_steps=8)
+    narrowed = budget.narrowed(
+        {"max_tokens": 9000, "max_seconds": 30, "max_tool_steps": 3, "max_dollars": True}
+    )
+    assert narrowed == Budget(max_tokens=4000, max_seconds=30.0, max_tool_steps=3)
+    assert budget.narrowed("not a dict") is budget
+
+
+def test_input_is_estimated_from_message_text_and_priced():
+    meter = BudgetMeter(Budget(max_dollars=1.0), price=(0.001, 0.002))
+    history = [
+        {"role": "user", "content": "x" * 400},
+        {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{"id": "1", "function": {"name": "read_file", "arguments": "y" * 40}}],
+        },
+    ]
+    meter.start_call(history)
+    meter.add_output("z" * 400)
+    assert meter.dollars == 110 * 0.001 + 100 * 0.002
+    assert meter.exceeded() is None
+
+    meter.add_output("z" * 4000 * 100)
+    assert meter.exceeded() == "cost budget of $1.00 reached"
+
+
+def test_input_is_not_counted_without_prices():
+    meter = BudgetMeter(Budget(max_dollars=1.0))
+    meter.start_call([{"role": "user", "content": "x" * 4000}])
+    assert meter.dollars == 0.0 and meter.exceeded() is None
+
+
+def test_output_and_tool_step_limits():
+    meter = BudgetMeter(Budget(max_tokens=10, max_tool_steps=2))
+    meter.add_output("a" * 39)
+    assert meter.exceeded() is None
+    meter.add_output("a")
+    assert meter.exceeded() == "output budget of 10 tokens reached"
+    assert [meter.tool_step() for _ in range(3)] == [0, 0, 1]
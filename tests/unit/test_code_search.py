@@ -0,0 +1,48 @@
+"""CodeSearchIndex queries and their locking."""
+
+from __future__ import annotations
+
+import re
+
+import pytest
+
+from marviz.services import code_search
+from marviz.services.code_search import CodeSearchIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    (tmp_path / "a.py").write_text("def alpha():\n    return compute(1)\n")
+    (tmp_path / "b.txt").write_text("alpha beta\ngamma\nalpha again\n")
+    index = CodeSearchIndex(tmp_path)
+    index.build()
+    return index
+
+
+def test_literal_search_reports_line_and_context(index):
+    [match] = index.search("compute(1)")
+    assert (match.path, match.line, match.text) == ("a.py", 2, "    return compute(1)")
+    assert match.before == ["def alpha():"]
+
+
+def test_regex_glob_and_max_results(index):
+    assert [m.path for m in index.search(r"alph\w", regex=True)] == ["a.py", "b.txt", "b.txt"]
+    assert [m.line for m in index.search("alpha", glob="*.txt")] == [1, 3]
+    assert len(index.search("alpha", max_results=2)) == 2
+
+
+def test_scan_runs_without_the_index_lock(index, monkeypatch):
+    locked_during_scan: list[bool] = []
+
+    class _Pattern:
+        def __init__(self, pattern: re.Pattern) -> None:
+            self._pattern = pattern
+
+        def finditer(self, text: str):
+            locked_during_scan.append(index._lock.locked())
+            return self._pattern.finditer(text)
+
+    real_compile = re.compile
+    monkeypatch.setattr(code_search.re, "compile", lambda *args: _Pattern(real_compile(*args)))
+    assert len(index.search("alpha")) == 3
+    assert locked_during_scan == [False, False]
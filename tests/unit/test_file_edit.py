@@ -0,0 +1,101 @@
+"""Search/replace hunks, unified diffs and atomic file edits."""
+
+from __future__ import annotations
+
+import pytest
+
+from marviz.services.file_edit import EditError, Hunk, apply_hunks, edit_file, parse_unified_diff
+
+
+def test_exact_hunk_replaces_lines():
+    result = apply_hunks("a\nb\nc\n", [Hunk("b\n", "B\nB2\n")])
+    assert result.text == "a\nB\nB2\nc\n"
+    assert (result.added, result.removed, result.fuzzy) == (2, 1, [])
+
+
+def test_pure_insertion_into_an_empty_file():
+    diff = "--- /dev/null\n+++ b/new.py\n@@ -0,0 +1,2 @@\n+import os\n+print(os.sep)\n"
+    assert apply_hunks("", parse_unified_diff(diff)).text == "import os\nprint(os.sep)\n"
+
+
+def test_insertion_without_context_goes_after_the_header_line():
+    text = "one\ntwo\nthree\n"
+    assert apply_hunks(text, parse_unified_diff("@@ -3,0 +4,1 @@\n+four\n")).text == (
+        "one\ntwo\nthree\nfour\n"
+    )
+    assert apply_hunks(text, parse_unified_diff("@@ -1,0 +2 @@\n+one and a half\n")).text == (
+        "one\none and a half\ntwo\nthree\n"
+    )
+
+
+def test_insertion_without_a_line_number_needs_context():
+    with pytest.raises(EditError, match="search block is empty"):
+        apply_hunks("a\n", [Hunk("", "b\n")])
+    assert apply_hunks("", [Hunk("", "b\n")]).text == "b\n"
+
+
+def test_unified_diff_with_context_and_removal():
+    diff = (
+        "--- a/x.py\n+++ b/x.py\n"
+        "@@ -1,3 +1,3 @@\n def f():\n-    return 1\n+    return 2\n \n"
+    )
+    assert apply_hunks("def f():\n    return 1\n\nrest\n", parse_unified_diff(diff)).text == (
+        "def f():\n    return 2\n\nrest\n"
+    )
+
+
+def test_blank_lines_at_hunk_edges_are_kept():
+    assert apply_hunks("a\n\nb\n", parse_unified_diff("@@ -1,2 +1,1 @@\n a\n-\n")).text == "a\nb\n"
+    assert apply_hunks("a\nb\n", [Hunk("a\n", "a\n\n")]).text == "a\n\nb\n"
+
+
+def test_edit_that_changes_nothing_is_an_error():
+    with pytest.raises(EditError, match="unchanged"):
+        apply_hunks("a  \nb\n", [Hunk("a\n", "a  \n")])
+
+
+def test_ambiguous_match_is_an_error_without_a_hint():
+    text = "x = 1\ny = 2\nx = 1\n"
+    with pytest.raises(EditError, match="matches 2 places"):
+        apply_hunks(text, [Hunk("x = 1\n", "x = 3\n")])
+    assert apply_hunks(text, [Hunk("x = 1\n", "x = 3\n", hint=2)]).text == "x = 1\ny = 2\nx = 3\n"
+
+
+def test_indentation_and_fuzzy_matches_are_reported():
+    text = "class A:\n    def f(self):\n        return 1\n"
+    hunk = Hunk("def f(self):\n    return 1\n", "def f(self):\n    return 2\n")
+    result = apply_hunks(text, [hunk])
+    assert result.text == "class A:\n    def f(self):\n        return 2\n"
+    assert "ignored indentation" in result.fuzzy[0]
+
+    text = "def total(items):\n    return sum(item.price for item in items)\n"
+    typo = "def total(items):\n    return sum(item.prize for item in items)\n"
+    result = apply_hunks(text, [Hunk(typo, "def total(items):\n    return 0\n")])
+    assert result.text == "def total(items):\n    return 0\n"
+    assert "fuzzy match" in result.fuzzy[0]
+
+
+def test_search_block_not_found():
+    with pytest.raises(EditError, match="hunk 1: search block not found"):
+        apply_hunks("alpha\nbeta\n", [Hunk("something else entirely\n", "x\n")])
+
+
+def test_overlapping_hunks_are_rejected():
+    with pytest.raises(EditError, match="overlap"):
+        apply_hunks("a\nb\nc\n", [Hunk("a\nb\n", "x\n"), Hunk("b\nc\n", "y\n")])
+
+
+def test_edit_file_keeps_crlf_line_endings(tmp_path):
+    path = tmp_path / "win.txt"
+    path.write_bytes(b"one\r\ntwo\r\nthree\r\n")
+    result = edit_file(path, parse_unified_diff("@@ -2,1 +2,2 @@\n-two\n+two\n+two and a half\n"))
+    assert result.added == 2
+    assert path.read_bytes() == b"one\r\ntwo\r\ntwo and a half\r\nthree\r\n"
+
+
+def test_failed_edit_leaves_the_file_alone(tmp_path):
+    path = tmp_path / "f.txt"
+    path.write_text("a\nb\n")
+    with pytest.raises(EditError):
+        edit_file(path, [Hunk("a\n", "A\n"), Hunk("missing line\n", "x\n")])
+    assert path.read_text() == "a\nb\n"
@@ -0,0 +1,59 @@
+"""GitTools result caching against a scratch repository."""
+
+from __future__ import annotations
+
+import shutil
+import subprocess
+
+import pytest
+
+from marviz.services.git_tools import GitTools
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+@pytest.fixture
+def repo(tmp_path):
+    def git(*args: str) -> None:
+        subprocess.run(["git", *args], cwd=tmp_path, check=True, capture_output=True)
+
+    git("init", "-q")
+    git("config", "user.email", "dev@example.com")
+    git("config", "user.name", "dev")
+    (tmp_path / "a.txt").write_text("one\n")
+    git("add", "a.txt")
+    git("commit", "-q", "-m", "init")
+    return tmp_path
+
+
+@pytest.mark.asyncio
+async def test_diff_sees_changes_made_outside_the_tools(repo):
+    git = GitTools(repo)
+    assert await git.diff() == "No differences."
+    (repo / "a.txt").write_text("two\n")
+    assert "+two" in await git.diff()
+    # Edited again: same status line, new content
+    (repo / "a.txt").write_text("three\n")
+    diff = await git.diff()
+    assert "+three" in diff and "+two" not in diff
+    (repo / "b.txt").write_text("new\n")
+    assert "?? b.txt" in await git.status()
+
+
+@pytest.mark.asyncio
+async def test_unchanged_repository_reuses_cached_results(repo, monkeypatch):
+    git = GitTools(repo)
+    first = await git.log()
+    calls = []
+    run = git._run
+
+    async def counting_run(*args):
+        calls.append(args[0])
+        return await run(*args)
+
+    monkeypatch.setattr(git, "_run", counting_run)
+    assert await git.log() == first
+    assert calls == []
+    await git.blame_range("a.txt", 1, 1)
+    await git.blame_range("a.txt", 1, 1)
+    assert calls == ["blame"]
@@ -0,0 +1,177 @@
+"""File payload deduplication in agent histories."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from marviz.agents.base import BaseAgent
+from marviz.agents.history import FilePayloadTracker
+from marviz.agents.types import StreamChunk
+from marviz.providers.base import BaseProvider
+from marviz.services.file_edit import StagedFile
+
+V1 = "def f():\n    return 1\n" * 50
+V2 = "def f():\n    return 2\n" * 50
+
+
+def _call(name: str, call_id: str, **args) -> list[StreamChunk]:
+    return [
+        StreamChunk(
+            "tool_call",
+            tool_name=name,
+            tool_call_id=call_id,
+            tool_call_index=0,
+            tool_args=json.dumps(args),
+        )
+    ]
+
+
+class _ScriptedProvider(BaseProvider):
+    """Answers each request with the next scripted list of chunks (text "done" when out)."""
+
+    def __init__(self, *replies: list[StreamChunk]) -> None:
+        self.replies = list(replies)
+
+    async def stream(self, messages, tools=None):
+        for chunk in self.replies.pop(0) if self.replies else [StreamChunk("text", "done")]:
+            yield chunk
+
+
+async def _drain(stream) -> None:
+    async for _chunk in stream:
+        pass
+
+
+async def _answer(agent: BaseAgent, *results: str) -> None:
+    """Answer the pending tool calls with ``results`` and let the agent continue."""
+    for tc, result in zip(agent.pending_tool_calls, results, strict=True):
+        agent.add_tool_result(tc.id, result)
+    await _drain(agent.continue_after_tools())
+
+
+def _tool_message(agent: BaseAgent, call_id: str) -> dict:
+    return next(m for m in agent.history if m.get("tool_call_id") == call_id)
+
+
+def _write_content(agent: BaseAgent, call_id: str) -> str:
+    for msg in agent.history:
+        for call in msg.get("tool_calls") or ():
+            if call["id"] == call_id:
+                return json.loads(call["function"]["arguments"])["content"]
+    raise KeyError(call_id)
+
+
+@pytest.mark.asyncio
+async def test_unchanged_reread_keeps_only_the_latest_copy():
+    provider = _ScriptedProvider(
+        _call("read_file", "r1", path="a.py"), _call("read_file", "r2", path="a.py")
+    )
+    agent = BaseAgent(provider, "system")
+    await _drain(agent.send("read a.py twice"))
+    await _answer(agent, V1)
+    await _answer(agent, V1)
+
+    latest = _tool_message(agent, "r2")
+    assert latest["content"] == V1
+    first = _tool_message(agent, "r1")["content"]
+    assert first.startswith("[a.py: ") and "unchanged" in first
+    assert f"full copy in message {agent.history.index(latest)}" in first
+    assert agent.file_payloads.saved_chars == len(V1) - len(first)
+
+
+@pytest.mark.asyncio
+async def test_read_after_a_change_supersedes_the_earlier_read():
+    provider = _ScriptedProvider(
+        _call("read_file", "r1", path="a.py"), _call("read_file", "r2", path="a.py")
+    )
+    agent = BaseAgent(provider, "system")
+    await _drain(agent.send("read a.py twice"))
+    await _answer(agent, V1)
+    await _answer(agent, V2)
+
+    latest = _tool_message(agent, "r2")
+    assert latest["content"] == V2
+    first = _tool_message(agent, "r1")["content"]
+    assert f"superseded, see message {agent.history.index(latest)}" in first
+
+
+@pytest.mark.asyncio
+async def test_read_write_read_keeps_the_final_read_in_full():
+    agent = BaseAgent(
+        _ScriptedProvider(
+            _call("read_file", "r1", path="a.py"),
+            _call("write_file", "w1", path="a.py", content=V2),
+            _call("read_file", "r2", path="a.py"),
+        ),
+        "system",
+    )
+    await _drain(agent.send("rewrite a.py"))
+    await _answer(agent, V1)
+    write_index = len(agent.history) - 1
+    assert _write_content(agent, "w1") == V2
+    assert f"superseded, see message {write_index}" in _tool_message(agent, "r1")["content"]
+
+    await _answer(agent, "Wrote 1 chars to a.py")
+    await _answer(agent, V2)
+    latest = _tool_message(agent, "r2")
+    assert latest["content"] == V2
+    written = _write_content(agent, "w1")
+    assert written.startswith("[written, ")
+    assert f"unchanged, full copy in message {agent.history.index(latest)}" in written
+
+
+@pytest.mark.asyncio
+async def test_copies_before_the_latest_user_message_wait_for_the_next_turn():
+    agent = BaseAgent(
+        _ScriptedProvider(
+            _call("read_file", "r1", path="a.py"),
+            [StreamChunk("text", "read it")],
+            _call("read_file", "r2", path="a.py"),
+        ),
+        "system",
+    )
+    await _drain(agent.send("read a.py"))
+    await _answer(agent, V1)
+    await _drain(agent.send("read it again"))
+    await _answer(agent, V2)
+    # The first read is part of the cached prompt prefix during this turn
+    assert _tool_message(agent, "r1")["content"] == V1
+
+    await _drain(agent.send("thanks"))
+    assert "superseded" in _tool_message(agent, "r1")["content"]
+    assert _tool_message(agent, "r2")["content"] == V2
+
+
+@pytest.mark.asyncio
+async def test_streamed_write_supersedes_earlier_reads_once_committed(tmp_path):
+    target = tmp_path / "a.py"
+    agent = BaseAgent(
+        _ScriptedProvider(
+            _call("read_file", "r1", path=str(target)),
+            _call("write_file", "w1", path=str(target), content=V2),
+        ),
+        "system",
+    )
+    agent.streamed_arguments["write_file"] = ("content", lambda fields: StagedFile(tmp_path))
+    await _drain(agent.send("rewrite a.py"))
+    await _answer(agent, V1)
+    (tc,) = agent.pending_tool_calls
+    assert tc.sink is not None
+    # Nothing is superseded until the staged content is committed
+    assert _tool_message(agent, "r1")["content"] == V1
+
+    tc.sink.commit(target)
+    await _answer(agent, f"Wrote {len(V2)} chars to {target}")
+    assert "superseded, see message" in _tool_message(agent, "r1")["content"]
+    assert target.read_text() == V2
+
+
+def test_failed_reads_are_not_tracked():
+    history = [{"role": "system", "content": "s"}, {"role": "tool", "content": V1}]
+    tracker = FilePayloadTracker(history)
+    tracker.track_read(1, "a.py", V1)
+    history.append({"role": "tool", "content": "Error reading file: gone"})
+    tracker.track_read(2, "a.py", history[2]["content"])
+    assert history[1]["content"] == V1
@@ -0,0 +1,173 @@
+"""Connection reuse through the shared pool, against a local TLS HTTP/2 server."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import shutil
+import ssl
+import subprocess
+
+import litellm
+import pytest
+
+from marviz.providers.http_pool import HTTP2_AVAILABLE, ConnectionPool
+from marviz.providers.litellm_provider import LiteLLMProvider
+
+pytestmark = [
+    pytest.mark.skipif(not HTTP2_AVAILABLE, reason="h2 is not installed"),
+    pytest.mark.skipif(shutil.which("openssl") is None, reason="openssl makes the certificate"),
+]
+
+_WORDS = ["Hello", " from", " the", " stub"]
+
+
+def _sse(words: list[str]) -> bytes:
+    def event(delta: dict, finish: str | None = None) -> str:
+        chunk = {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "stub",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+        }
+        return f"data: {json.dumps(chunk)}\n\n"
+
+    events = [event({"role": "assistant", "content": words[0]})]
+    events += [event({"content": word}) for word in words[1:]]
+    events.append(event({}, "stop"))
+    events.append("data: [DONE]\n\n")
+    return "".join(events).encode()
+
+
+class _H2Stub:
+    """Answers HEAD with 200 and every other request with a streamed chat completion."""
+
+    def __init__(self, context: ssl.SSLContext) -> None:
+        self.context = context
+        self.connections = 0
+        self.requests: list[str] = []
+        self.port = 0
+        self._server: asyncio.AbstractServer | None = None
+
+    async def __aenter__(self) -> _H2Stub:
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0, ssl=self.context)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._server.close()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        import h2.config
+        import h2.connection
+        import h2.events
+
+        self.connections += 1
+        conn = h2.connection.H2Connection(
+            h2.config.H2Configuration(client_side=False, header_encoding="utf-8")
+        )
+        conn.initiate_connection()
+        writer.write(conn.data_to_send())
+        methods: dict[int, str] = {}
+        try:
+            while data := await reader.read(65536):
+                for event in conn.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        methods[event.stream_id] = dict(event.headers)[":method"]
+                    elif isinstance(event, h2.events.DataReceived):
+                        conn.acknowledge_received_data(
+                            event.flow_controlled_length, event.stream_id
+                        )
+                    elif isinstance(event, h2.events.StreamEnded):
+                        method = methods.pop(event.stream_id)
+                        self.requests.append(method)
+                        if method == "HEAD":
+                            conn.send_headers(
+                                event.stream_id, [(":status", "200")], end_stream=True
+                            )
+                            continue
+                        conn.send_headers(
+                            event.stream_id,
+                            [(":status", "200"), ("content-type", "text/event-stream")],
+                        )
+                        conn.send_data(event.stream_id, _sse(_WORDS), end_stream=True)
+                writer.write(conn.data_to_send())
+                await writer.drain()
+        except (ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+
+@pytest.fixture(scope="module")
+def certificate(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("tls")
+    cert, key = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-keyout", str(key), "-out", str(cert), "-subj", "/CN=localhost",
+            "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return cert, key
+
+
+@pytest.fixture
+def server_context(certificate, monkeypatch):
+    cert, key = certificate
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    context.set_alpn_protocols(["h2"])
+    monkeypatch.setenv("SSL_CERT_FILE", str(cert))  # trusted by the pool's httpx clients
+    return context
+
+
+async def _text(provider: LiteLLMProvider) -> str:
+    parts = []
+    async for chunk in provider.stream([{"role": "user", "content": "hi"}]):
+        assert chunk.type == "text", chunk.content
+        parts.append(chunk.content)
+    return "".join(parts)
+
+
+@pytest.mark.asyncio
+async def test_prewarmed_connection_serves_every_streamed_request(server_context):
+    async with _H2Stub(server_context) as server:
+        pool = ConnectionPool(max_connections=4)
+        provider = LiteLLMProvider(
+            "openai/stub-model", api_base=f"https://localhost:{server.port}/v1", pool=pool
+        )
+        try:
+            assert await provider.prewarm(3) == 1
+            assert server.connections == 1 and server.requests == ["HEAD"]
+            assert await provider.prewarm(3) == 0  # still warm
+
+            texts = await asyncio.gather(*(_text(provider) for _ in range(5)))
+            assert texts == ["".join(_WORDS)] * 5
+            assert await _text(provider) == "".join(_WORDS)
+            assert server.requests.count("POST") == 6
+            assert server.connections == 1
+            # The pooled client is passed per request, not installed globally
+            assert litellm.aclient_session is None
+        finally:
+            await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_providers_keep_their_own_pools(server_context):
+    async with _H2Stub(server_context) as server:
+        base = f"https://localhost:{server.port}/v1"
+        pools = [ConnectionPool(), ConnectionPool()]
+        providers = [LiteLLMProvider("openai/stub-model", api_base=base, pool=p) for p in pools]
+        try:
+            for provider in providers:
+                assert await _text(provider) == "".join(_WORDS)
+            await _text(providers[0])
+            assert server.connections == 2
+        finally:
+            for pool in pools:
+                await pool.aclose()
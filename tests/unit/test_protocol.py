@@ -0,0 +1,39 @@
+"""NDJSON framing of the daemon protocol."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from marviz.runtime.protocol import MAX_LINE, decode, encode
+
+
+def test_encode_is_one_compact_line_that_decodes_back():
+    message = {"event": "token", "session": "1", "text": "line one\nline two é  "}
+    line = encode(message)
+    assert line.endswith(b"\n") and line.count(b"\n") == 1
+    assert b": " not in line and "é".encode() in line
+    assert decode(line) == message
+    assert decode(line.rstrip(b"\n")) == message
+
+
+@pytest.mark.parametrize(
+    "line", [b"", b"not json\n", b"[1, 2]\n", b'"text"\n', b'{"op": "sen\n', b"\xff\xfe\n"]
+)
+def test_decode_drops_lines_that_are_not_json_objects(line):
+    assert decode(line) is None
+
+
+@pytest.mark.asyncio
+async def test_messages_survive_a_stream_split_at_any_byte():
+    messages = [{"op": "send", "session": "1", "text": "x" * 5000}, {"op": "prewarm"}]
+    data = b"".join(encode(m) for m in messages)
+    reader = asyncio.StreamReader(limit=MAX_LINE)
+    for i in range(0, len(data), 7):
+        reader.feed_data(data[i : i + 7])
+    reader.feed_eof()
+    received = []
+    while line := await reader.readline():
+        received.append(decode(line))
+    assert received == messages
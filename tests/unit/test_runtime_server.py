@@ -0,0 +1,58 @@
+"""Attaching RuntimeClient to a RuntimeServer over a Unix socket."""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import replace
+
+import pytest
+import pytest_asyncio
+
+from marviz.config import MarvizConfig
+from marviz.runtime import AgentRuntime, RuntimeClient
+from marviz.runtime.server import RuntimeServer
+
+
+@pytest_asyncio.fixture
+async def server(tmp_path):
+    workspace = tmp_path / "workspace"
+    workspace.mkdir()
+    config = replace(MarvizConfig.load(), working_dir=workspace, metrics_file=None)
+    server = RuntimeServer(AgentRuntime(config), tmp_path / "marviz.sock")
+    await server.start()
+    yield server
+    await server.stop()
+
+
+async def _attach(server: RuntimeServer, root) -> list[dict]:
+    """Events a client working in ``root`` receives until attached or disconnected."""
+    client = RuntimeClient(server.path, root)
+    events: list[dict] = []
+    done = asyncio.Event()
+
+    def listener(event: dict) -> None:
+        events.append(event)
+        if event["event"] in ("attached", "disconnected"):
+            done.set()
+
+    await client.connect()
+    client.attach(listener)
+    await asyncio.wait_for(done.wait(), 5)
+    await client.stop()
+    return events
+
+
+@pytest.mark.asyncio
+async def test_attach_from_the_daemons_directory_reports_its_root(server):
+    workspace = server.runtime.config.working_dir
+    events = await _attach(server, workspace)
+    assert events[-1] == {"event": "attached", "sessions": 0, "root": str(workspace)}
+
+
+@pytest.mark.asyncio
+async def test_attach_from_another_directory_is_refused(server, tmp_path):
+    events = await _attach(server, tmp_path)
+    assert [e["event"] for e in events] == ["attach_refused", "disconnected"]
+    assert events[0]["root"] == str(server.runtime.config.working_dir.resolve())
+    assert "--local" in events[0]["text"]
+    assert not server.runtime.listeners
@@ -0,0 +1,162 @@
+"""Incremental decoding of a streamed tool-call argument."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+
+import pytest
+
+from marviz.agents.streaming_args import StreamingArgumentDecoder
+from marviz.agents.types import StreamChunk, ToolCallAccumulator
+
+
+class _MemorySink:
+    def __init__(self, fields: dict[str, str]) -> None:
+        self.fields = fields
+        self.parts: list[str] = []
+        self.size = 0
+        self.closed = False
+        self.discarded = False
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def write(self, text: str) -> None:
+        self.parts.append(text)
+        self.size += len(text.encode("utf-8"))
+
+    def close(self) -> None:
+        self.closed = True
+
+    def discard(self) -> None:
+        self.discarded = True
+
+    def hexdigest(self) -> str:
+        return hashlib.sha256(self.text.encode("utf-8")).hexdigest()
+
+
+def _decode(fragments: list[str], field: str = "content") -> StreamingArgumentDecoder:
+    decoder = StreamingArgumentDecoder(field, _MemorySink)
+    for fragment in fragments:
+        decoder.feed(fragment)
+    return decoder
+
+
+def _split(text: str, size: int) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+_CONTENTS = [
+    "plain text",
+    'quotes " and backslashes \\ and \\n literally',
+    "tabs\tnewlines\ncarriage\r\nreturns and \x00 \x1f controls",
+    "accents é ü, CJK 漢字, emoji 😀🎉 and a \u2028 line separator",
+    "",
+]
+
+
+@pytest.mark.parametrize("content", _CONTENTS)
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_every_split_decodes_to_the_original(content, ensure_ascii):
+    args = json.dumps({"path": "a.txt", "content": content}, ensure_ascii=ensure_ascii)
+    for size in (1, 2, 3, 5, 7, len(args)):
+        decoder = _decode(_split(args, size))
+        assert decoder.complete
+        assert decoder.sink.text == content, size
+        assert json.loads(decoder.remainder()) == {"path": "a.txt", "content": ""}
+
+
+def test_backslash_at_the_end_of_a_fragment():
+    decoder = _decode(['{"content": "a\\', 'nb\\', '\\c\\', '"d"}'])
+    assert decoder.sink.text == 'a\nb\\c"d'
+
+
+def test_surrogate_pair_split_across_fragments():
+    args = '{"content": "x\\ud83d\\ude00y"}'
+    for cut in range(len('{"content": "x'), len(args)):
+        decoder = _decode([args[:cut], args[cut:]])
+        assert decoder.sink.text == "x\U0001F600y", cut
+    decoder = _decode(['{"content": "\\uD8', '3D', "\\u", 'DE00"}'])
+    assert decoder.sink.text == "\U0001F600"
+
+
+def test_lone_surrogates_become_replacement_characters():
+    assert _decode(['{"content": "a\\ud83db"}']).sink.text == "a�b"
+    assert _decode(['{"content": "a\\ude00b"}']).sink.text == "a�b"
+    assert _decode(['{"content": "\\ud83d\\ud83d\\ude00"}']).sink.text == "�\U0001F600"
+
+
+def test_fields_before_the_content_are_known_when_the_sink_opens():
+    decoder = _decode(['{"path": "dir/\\u00e9.txt", "mode": "w", "con', 'tent": "x"}'])
+    assert decoder.sink.fields == {"path": "dir/é.txt", "mode": "w"}
+
+
+def test_keys_after_the_content_are_kept_in_the_remainder():
+    args = json.dumps({"content": "body", "path": "late.txt", "options": {"content": "nested"}})
+    decoder = _decode(_split(args, 4))
+    assert decoder.sink.text == "body"
+    assert decoder.fields["path"] == "late.txt"
+    assert json.loads(decoder.remainder()) == {
+        "content": "",
+        "path": "late.txt",
+        "options": {"content": "nested"},
+    }
+
+
+def test_only_the_top_level_field_is_streamed():
+    args = json.dumps({"path": "content", "meta": {"content": "inner"}, "content": "outer"})
+    decoder = _decode(_split(args, 3))
+    assert decoder.sink.text == "outer"
+    assert json.loads(decoder.remainder())["meta"] == {"content": "inner"}
+
+
+def _accumulate(args: str) -> tuple[list, list[_MemorySink]]:
+    sinks: list[_MemorySink] = []
+
+    def open_sink(fields: dict[str, str]) -> _MemorySink:
+        sinks.append(_MemorySink(fields))
+        return sinks[-1]
+
+    accumulator = ToolCallAccumulator({"write_file": ("content", open_sink)})
+    accumulator.feed(StreamChunk("tool_call", tool_name="write_file", tool_call_id="c1"))
+    for fragment in _split(args, 5):
+        accumulator.feed(StreamChunk("tool_call", tool_args=fragment))
+    return accumulator.finalize(), sinks
+
+
+def test_accumulator_replaces_the_streamed_argument_with_a_reference():
+    (call,), (sink,) = _accumulate(json.dumps({"path": "a.txt", "content": "x" * 2048}))
+    assert call.sink is sink and sink.closed and not sink.discarded
+    assert call.arguments["path"] == "a.txt"
+    assert call.arguments["content"].startswith("[streamed to disk, 2.0 KB, sha ")
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        '{"path": "a.txt", "content": "never closed',  # cut off mid-value
+        '{"path": "a.txt", "content": "done"',  # object never closed
+        '{"path": "a.txt", "content": "done"}}',  # trailing garbage
+    ],
+)
+def test_malformed_arguments_fall_back_to_the_raw_buffer(args):
+    (call,), (sink,) = _accumulate(args)
+    assert sink.discarded and call.sink is None
+    assert "_raw" in call.arguments
+
+
+def test_discard_drops_a_partial_stream():
+    sinks: list[_MemorySink] = []
+    accumulator = ToolCallAccumulator(
+        {"write_file": ("content", lambda fields: sinks.append(_MemorySink(fields)) or sinks[-1])}
+    )
+    assert not accumulator.has_calls
+    accumulator.feed(
+        StreamChunk("tool_call", tool_name="write_file", tool_args='{"content": "par')
+    )
+    assert accumulator.has_calls
+    accumulator.discard()
+    assert sinks[0].discarded and not accumulator.has_calls
+    assert accumulator.finalize() == []
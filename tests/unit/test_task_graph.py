@@ -0,0 +1,81 @@
+"""TaskGraph scheduling of one turn's delegate_task calls."""
+
+from __future__ import annotations
+
+import pytest
+
+from marviz.agents.types import AccumulatedToolCall
+from marviz.runtime.task_graph import TaskGraph, TaskGraphError
+
+
+def _call(call_id: str, task_id: str | None = None, depends_on=None) -> AccumulatedToolCall:
+    arguments = {"task": f"do {call_id}", "worker_name": call_id.title()}
+    if task_id is not None:
+        arguments["task_id"] = task_id
+    if depends_on is not None:
+        arguments["depends_on"] = depends_on
+    return AccumulatedToolCall(call_id, "delegate_task", arguments)
+
+
+def _names(nodes) -> list[str]:
+    return [node.name for node in nodes]
+
+
+def test_independent_calls_are_all_ready_at_once():
+    graph = TaskGraph([_call("a"), _call("b")])
+    assert _names(graph.ready()) == ["a", "b"]
+    assert graph.ready() == []
+
+
+def test_a_task_starts_when_its_dependencies_succeed_and_gets_their_results():
+    graph = TaskGraph(
+        [_call("c1", "scan"), _call("c2", "audit"), _call("c3", "report", ["scan", "audit"])]
+    )
+    assert _names(graph.ready()) == ["scan", "audit"]
+    graph.complete("c1", "found 3 files")
+    assert graph.ready() == []
+    graph.complete("c2", "no issues")
+    [report] = graph.ready()
+    assert report.name == "report"
+    prompt = graph.prompt(report)
+    assert prompt.startswith("do c3\n")
+    assert "### scan (C1)\nfound 3 files" in prompt and "### audit (C2)\nno issues" in prompt
+    # Consumed results are not repeated to the main agent
+    assert graph.handoff(graph.node("c1")) == "(intermediate result, passed to report)"
+    graph.complete("c3", "all good")
+    assert graph.handoff(report) == "all good"
+
+
+def test_a_failure_skips_every_transitive_dependent():
+    graph = TaskGraph(
+        [_call("c1", "a"), _call("c2", "b", "a"), _call("c3", "c", ["b"]), _call("c4", "d")]
+    )
+    assert _names(graph.ready()) == ["a", "d"]
+    skipped = graph.complete("c1", "Error: boom", failed=True)
+    assert _names(skipped) == ["b", "c"]
+    assert graph.node("c3").result == "Error: not run because task 'b' failed"
+    assert graph.ready() == []
+    assert graph.handoff(graph.node("c1")) == "Error: boom"
+
+
+def test_long_upstream_results_are_cut_in_the_prompt():
+    graph = TaskGraph([_call("c1", "a"), _call("c2", "b", ["a"])])
+    graph.ready()
+    graph.complete("c1", "x" * 30_000)
+    [b] = graph.ready()
+    assert graph.prompt(b).endswith("x\n... (truncated)")
+    assert len(graph.prompt(b)) < 21_000
+
+
+@pytest.mark.parametrize(
+    "calls, message",
+    [
+        ([_call("c1", "a"), _call("c2", "a")], "duplicate task_id 'a'"),
+        ([_call("c1", "a", ["missing"])], "unknown task_id 'missing'"),
+        ([_call("c1", "a", ["a"])], "depends on itself"),
+        ([_call("c1", "a", ["b"]), _call("c2", "b", ["a"])], "dependency cycle among tasks a, b"),
+    ],
+)
+def test_invalid_graphs_are_rejected(calls, message):
+    with pytest.raises(TaskGraphError, match=message):
+        TaskGraph(calls)